@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for mingctl hot paths.
+
+Builds synthetic stores (N cases, M archive events, K-byte captured outputs) in a
+temporary directory, measures the CLI end to end and the parsers in process, and
+writes the results as JSON. `--compare` checks them against an earlier run.
+
+  python benchmarks/bench.py --out before.json
+  python benchmarks/bench.py --compare before.json --threshold 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MINGCTL = REPO_ROOT / "skills" / "great-ming" / "scripts" / "mingctl.py"
+
+ROUTE_SAMPLES = [
+    "修复登录报错",
+    "线上宕机，立即回滚 production",
+    "依礼题本：重构支付模块并补测试",
+    "免礼，直说：为什么 CI 挂了",
+    "deploy the new release after tests pass",
+    "把 README 的安装步骤写清楚",
+]
+RESCRIPT_SAMPLES = ["如拟", "览", "该部知道：兵部、工部", "留中", "再议", "廷议", "照准，但先跑测试"]
+
+
+def eprint(*args: Any) -> None:
+    print(*args, file=sys.stderr)
+
+
+def load_mingctl() -> Any:
+    sys.path.insert(0, str(MINGCTL.parent))
+    import mingctl  # noqa: E402
+
+    return mingctl
+
+
+def run_cli(root: Path, *args: str, env: dict[str, str]) -> float:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(MINGCTL), "--root", str(root), *args],
+        cwd=root,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise SystemExit(f"mingctl {' '.join(args)} failed: {proc.stderr.decode(errors='replace').strip()}")
+    return elapsed * 1000
+
+
+def median_ms(fn: Callable[[], float], repeat: int) -> float:
+    return round(statistics.median(fn() for _ in range(repeat)), 3)
+
+
+def throughput(fn: Callable[[], None], seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return round(count / (time.perf_counter() - started), 1)
+
+
+def generate_store(mingctl: Any, root: Path, *, backend: str, cases: int, events: int, output_bytes: int) -> None:
+    """
+    Synthetic store: `cases` cases (a tenth closed) listed in todo.md, and `events` archive
+    events of which every tenth is an exec with an `output_bytes` captured snippet.
+    """
+
+    root.mkdir(parents=True)
+    subprocess.run(["git", "init", "-q", str(root)], check=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mingctl.main(["--root", str(root), "init", "--backend", backend])
+    store = mingctl.get_store(root)
+
+    case_records = []
+    with store.transaction():
+        for i in range(cases):
+            case = {
+                "id": f"20250101-{i:06d}-bench-case-{i}",
+                "title": f"bench case {i}",
+                "created_at": "2025-01-01T00:00:00Z",
+                "updated_at": "2025-01-01T00:00:00Z",
+                "status": "closed" if i % 10 == 0 else "open",
+                "last_rescript": {"category": "approve", "departments": ["works", "war"]},
+            }
+            store.save_case(case)
+            case_records.append(case)
+    mingctl.todo_path(root).write_text(mingctl.render_todo(case_records), encoding="utf-8")
+
+    snippet = ("x" * 79 + "\n") * (output_bytes // 80)
+    with store.transaction():
+        for i in range(events):
+            case_id = case_records[i % cases]["id"] if cases else None
+            if i % 10 == 0:
+                data = mingctl.exec_event(
+                    kind="evidence",
+                    dept="war",
+                    command=["npm", "test"],
+                    exit_code=1 if i % 7 == 0 else 0,
+                    duration_ms=1200,
+                    forced=False,
+                    captured=True,
+                    output_snippet=snippet,
+                )
+                mingctl.record_event(root, "exec", data, case_id=case_id)
+            else:
+                mingctl.record_event(root, "record", {"kind": "note", "message": f"bench event {i}"}, case_id=case_id)
+    mingctl.close_archives()
+
+
+def bench_startup(root: Path, env: dict[str, str], repeat: int) -> dict[str, Any]:
+    return {
+        "startup_ms": median_ms(lambda: run_cli(root, "which-root", env=env), repeat),
+    }
+
+
+def bench_parsers(mingctl: Any, seconds: float) -> dict[str, Any]:
+    routes = iter(ROUTE_SAMPLES * 1000000)
+    rescripts = iter(RESCRIPT_SAMPLES * 1000000)
+    return {
+        "route_parse_per_s": throughput(lambda: mingctl.parse_route(next(routes), default_formality="balanced"), seconds),
+        "rescript_parse_per_s": throughput(lambda: mingctl.parse_rescript(next(rescripts)), seconds),
+    }
+
+
+def bench_store(root: Path, env: dict[str, str], repeat: int) -> dict[str, Any]:
+    results = {
+        "case_list_ms": median_ms(lambda: run_cli(root, "case", "list", env=env), repeat),
+        "morning_tail_ms": median_ms(lambda: run_cli(root, "prompt", "morning-audience", "--tail", "10", env=env), repeat),
+    }
+    counter = iter(range(1000000))
+    results["case_open_ms"] = median_ms(lambda: run_cli(root, "case", "open", f"bench open {next(counter)}", env=env), repeat)
+    return results
+
+
+def bench_exec(root: Path, env: dict[str, str], repeat: int, output_bytes: int) -> dict[str, Any]:
+    command = [sys.executable, "-c", f"print('x' * {output_bytes})"]
+
+    def bare() -> float:
+        started = time.perf_counter()
+        subprocess.run(command, cwd=root, stdout=subprocess.DEVNULL, check=True)
+        return (time.perf_counter() - started) * 1000
+
+    direct = median_ms(bare, repeat)
+    wrapped = median_ms(lambda: run_cli(root, "exec", "--dept", "justice", "--capture", "--", *command, env=env), repeat)
+    return {"exec_capture_ms": wrapped, "exec_capture_overhead_ms": round(wrapped - direct, 3)}
+
+
+def bench_append(mingctl: Any, root: Path, seconds: float) -> dict[str, Any]:
+    results = {}
+    for batch in (1, 64):
+        os.environ[mingctl.ARCHIVE_BATCH_ENV] = str(batch)
+        mingctl.close_archives()
+        rate = throughput(lambda: mingctl.record_event(root, "record", {"kind": "note", "message": "append"}, case_id=None), seconds)
+        mingctl.close_archives()
+        results[f"append_batch{batch}_per_s"] = rate
+    os.environ.pop(mingctl.ARCHIVE_BATCH_ENV, None)
+    return results
+
+
+METRIC_DIRECTIONS = {
+    "startup_ms": "lower",
+    "route_parse_per_s": "higher",
+    "rescript_parse_per_s": "higher",
+    "case_list_ms": "lower",
+    "case_open_ms": "lower",
+    "morning_tail_ms": "lower",
+    "exec_capture_ms": "lower",
+    "exec_capture_overhead_ms": "lower",
+    "append_batch1_per_s": "higher",
+    "append_batch64_per_s": "higher",
+}
+SUITES = ("startup", "parse", "store", "exec", "append")
+
+
+def git_commit() -> Optional[str]:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    regressions = []
+    print(f"{'metric':<28}{'baseline':>14}{'current':>14}{'change':>9}")
+    for name, value in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not isinstance(old, (int, float)) or old == 0:
+            continue
+        change = (value - old) / abs(old)
+        worse = change > threshold if METRIC_DIRECTIONS.get(name) == "lower" else change < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:<28}{old:>14.3f}{value:>14.3f}{change:>+8.0%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list[str]) -> int:
+    p = argparse.ArgumentParser(prog="bench", description="Benchmark mingctl hot paths")
+    p.add_argument("--cases", type=int, default=2000, help="Synthetic cases (N)")
+    p.add_argument("--events", type=int, default=50000, help="Synthetic archive events (M)")
+    p.add_argument("--output-bytes", type=int, default=4096, help="Captured output per exec event (K)")
+    p.add_argument("--backend", choices=("files", "sqlite"), default="files", help="Store backend to generate")
+    p.add_argument("--repeat", type=int, default=7, help="Runs per CLI measurement (median is reported)")
+    p.add_argument("--seconds", type=float, default=1.0, help="Duration of each throughput measurement")
+    p.add_argument("--only", help=f"Comma-separated suites: {', '.join(SUITES)}")
+    p.add_argument("--out", help="Write results JSON here")
+    p.add_argument("--compare", help="Baseline results JSON to check against")
+    p.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown before failing")
+    p.add_argument("--keep", action="store_true", help="Keep the generated store and print its path")
+    args = p.parse_args(argv)
+
+    suites = [s.strip() for s in (args.only or ",".join(SUITES)).split(",") if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        raise SystemExit(f"Unknown suite(s): {', '.join(unknown)}")
+
+    tmp = Path(tempfile.mkdtemp(prefix="ming-bench-"))
+    # Keep generated projects out of the user's registry and root cache.
+    os.environ["MING_HOME"] = str(tmp / "home")
+    env = dict(os.environ)
+    mingctl = load_mingctl()
+    results: dict[str, Any] = {}
+    try:
+        root = tmp / "project"
+        started = time.perf_counter()
+        generate_store(mingctl, root, backend=args.backend, cases=args.cases, events=args.events, output_bytes=args.output_bytes)
+        eprint(f"[BENCH] generated {args.cases} cases / {args.events} events in {time.perf_counter() - started:.1f}s")
+
+        if "startup" in suites:
+            results.update(bench_startup(root, env, args.repeat))
+        if "parse" in suites:
+            results.update(bench_parsers(mingctl, args.seconds))
+        if "store" in suites:
+            results.update(bench_store(root, env, args.repeat))
+        if "exec" in suites:
+            results.update(bench_exec(root, env, args.repeat, args.output_bytes))
+        if "append" in suites:
+            append_root = tmp / "append"
+            generate_store(mingctl, append_root, backend=args.backend, cases=0, events=0, output_bytes=0)
+            results.update(bench_append(mingctl, append_root, args.seconds))
+    finally:
+        mingctl.close_archives()
+        if args.keep:
+            eprint(f"[BENCH] kept {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "version": 1,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "cases": args.cases,
+            "events": args.events,
+            "output_bytes": args.output_bytes,
+            "backend": args.backend,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if baseline.get("params") != report["params"]:
+            eprint("[WARN] baseline was generated with different parameters")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            eprint(f"[FAIL] {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
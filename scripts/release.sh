@@ -28,7 +28,7 @@ Commands:
     Build dist/great-ming.zip from skills/great-ming/ (default).
 
   bump <version>
-    Replace version strings in README.md, README-en.md, LICENSE, then build.
+    Replace version strings in README.md, README-en.md, LICENSE, mingctl.py, then build.
 
   publish <version> [--yes]
     bump + build + git commit/tag/push + gh release create (uploads dist/great-ming.zip).
@@ -51,7 +51,7 @@ import sys
 
 root = pathlib.Path(sys.argv[1])
 text = (root / "README.md").read_text(encoding="utf-8")
-match = re.search(r"永乐_(\\d+\\.\\d+\\.\\d+)", text)
+match = re.search(r"永乐_(\d+\.\d+\.\d+)", text)
 if not match:
     raise SystemExit("Error: cannot find current version in README.md (pattern: 永乐_X.Y.Z)")
 print(match.group(1))
@@ -72,9 +72,10 @@ root = pathlib.Path(sys.argv[1])
 new_version = sys.argv[2]
 
 targets = [
-    ("README.md", re.compile(r"永乐_(\\d+\\.\\d+\\.\\d+)")),
-    ("README-en.md", re.compile(r"Yongle_(\\d+\\.\\d+\\.\\d+)")),
-    ("LICENSE", re.compile(r"Version (\\d+\\.\\d+\\.\\d+)")),
+    ("README.md", re.compile(r"永乐_(\d+\.\d+\.\d+)")),
+    ("README-en.md", re.compile(r"Yongle_(\d+\.\d+\.\d+)")),
+    ("LICENSE", re.compile(r"Version (\d+\.\d+\.\d+)")),
+    ("skills/great-ming/scripts/mingctl.py", re.compile(r'MINGCTL_VERSION = "(\d+\.\d+\.\d+)"')),
 ]
 
 found_versions: dict[str, str] = {}
@@ -169,7 +170,7 @@ publish_release() {
   fi
   git -C "$ROOT" remote get-url origin >/dev/null 2>&1 || die "Missing git remote: origin"
 
-  git -C "$ROOT" add README.md README-en.md LICENSE dist/great-ming.zip
+  git -C "$ROOT" add README.md README-en.md LICENSE skills/great-ming/scripts/mingctl.py dist/great-ming.zip
   git -C "$ROOT" commit -m "chore(release): $tag"
   git -C "$ROOT" tag -a "$tag" -m "$tag"
 
@@ -2,29 +2,122 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import contextlib
+import hashlib
 import json
 import os
 import re
 import shutil
+import signal
 import subprocess
 import sys
+import threading
 import time
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+# Fallback for the profiler's startup span where the process start time is unknown.
+_MODULE_STARTED = time.perf_counter()
+
+try:
+    import fcntl
+except ImportError:  # Windows: archive appends are not serialized across processes.
+    fcntl = None  # type: ignore[assignment]
+
+
+MINGCTL_VERSION = "3.1.4"
 
 STORE_DIRNAME = ".great-ming"
+SQLITE_STORE_FILENAME = "ming.sqlite3"
+STORE_BACKENDS = ("files", "sqlite")
 STATE_FILENAME = "state.json"
 ARCHIVE_FILENAME = "archives.ndjson"
 CASES_DIRNAME = "cases"
 TODO_FILENAME = "todo.md"
 INSTALLED_SCRIPT_NAME = "mingctl.py"
+EXT_MODULE_NAME = "mingctl_ext"  # mingctl_ext.py, always installed beside the script
+TODO_HEADER = "# 邸报（Great Ming）\n\n## 在办\n\n"
 
 FORMALITY_VALUES = ("full_ceremonial", "balanced", "pragmatic")
 DEPARTMENTS = ("works", "war", "rites", "justice", "personnel", "revenue")
 
+# User-level state (root cache, registry, shared script); MING_HOME overrides ~/.great-ming.
+USER_DIR_ENV = "MING_HOME"
+ROOT_CACHE_FILENAME = "roots.json"
+ROOT_CACHE_MAX_ENTRIES = 256
+ROOT_CACHE_DISABLE_ENV = "MING_NO_ROOT_CACHE"
+REGISTRY_FILENAME = "registry"
+
+# Installed copies: a sidecar stamp records version and sha256; `install --link` points
+# projects at one shared copy under ~/.great-ming/bin.
+INSTALL_STAMP_SUFFIX = ".stamp.json"
+INSTALL_LINK_MODES = ("hard", "sym")
+SHARED_SCRIPT_DIRNAME = "bin"
+SCRIPT_CHECK_DISABLE_ENV = "MING_NO_SCRIPT_CHECK"
+
+# Archive group commit: write once per N events or T ms, optionally fsync each write.
+ARCHIVE_BATCH_ENV = "MING_ARCHIVE_BATCH"
+ARCHIVE_FLUSH_MS_ENV = "MING_ARCHIVE_FLUSH_MS"
+ARCHIVE_FSYNC_ENV = "MING_ARCHIVE_FSYNC"
+
+# Archive hash chain (opt-in via `archive chain on`).
+CHAIN_GENESIS = "0" * 64
+CHAIN_CHECKPOINT_EVERY = 256
+VERIFY_STATE_FILENAME = "archive.verify.json"
+
+# Retention (`compact`); overridable per project via state["retention"] or flags.
+RETENTION_DEFAULTS = {"full_days": 30, "pack_closed_days": 90, "temp_budget_mb": 256}
+PACKED_CASES_FILENAME = "cases.packed.ndjson"
+COMPACT_TMP_SUFFIX = ".compact.tmp"
+
+# Full-text search (SQLite FTS5); kept up to date at record time once created.
+SEARCH_INDEX_FILENAME = "search.sqlite3"
+SEARCH_TEXT_FIELDS = ("title", "input", "message", "raw", "command_str", "output_snippet")
+
+# Per-project digest (open cases, recent failures, exec stats) read by `court`.
+DIGEST_FILENAME = "digest.json"
+DIGEST_RECENT_FAILURES = 20
+
+# Derived state (digest, metrics) buffers listener batches this long before writing.
+FOLD_FLUSH_MS = 1000
+
+# Monitoring counters (`metrics` / `serve`), rendered in Prometheus text format.
+METRICS_STATE_FILENAME = "metrics.json"
+METRICS_TEXT_FILENAME = "metrics.prom"
+METRICS_TEXTFILE_DIR_ENV = "MING_METRICS_TEXTFILE_DIR"
+METRICS_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+METRICS_DEFAULT_PORT = 9464
+
+# Exec job queue (`exec --enqueue` / `worker`).
+JOBS_DIRNAME = "jobs"
+JOB_PRIORITIES = ("urgent", "normal")
+JOB_PREEMPT_MODES = ("none", "pause", "renice")
+JOB_RENICE = 10
+
+# Case pipelines (`pipeline add/run`).
+PIPELINE_LOGS_DIRNAME = "pipeline"
+PIPELINE_STEP_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+PIPELINE_FAILURE_TAIL = 20
+
+# Self-profiling (MING_PROFILE / --profile).
+PROFILE_ENV = "MING_PROFILE"
+PROFILE_DIR_ENV = "MING_PROFILE_DIR"
+PROFILE_MODES = ("summary", "trace", "cprofile", "chrome")
+PROFILE_DIRNAME = "profiles"
+
+# Resource reads (`resources list/show`).
+RESOURCE_CACHE_FILENAME = "resources.cache.json"
+SECTIONS_CACHE_DIRNAME = "sections"
+MARKDOWN_HEADING_RE = re.compile(rb"^(#{1,6})[ \t]+(.*?)[ \t#]*\r?\n?$")
+
+
+# Called with ([(pos, record), ...], end, generation) after events are committed.
+EventListener = Callable[[List[Tuple[int, Dict[str, Any]]], int, int], None]
+
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
@@ -34,10 +127,236 @@ def eprint(*args: Any) -> None:
     print(*args, file=sys.stderr)
 
 
+def env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise SystemExit(f"Invalid integer for {name}: {raw}")
+
+
+def env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def ext_module() -> Any:
+    """
+    The rarely used subsystems in mingctl_ext.py beside this script, imported on first use.
+
+    Run as __main__, this script is recompiled on every call; keeping the bulk of the
+    code in an imported module means it is compiled once and loaded from its .pyc.
+    """
+
+    module = sys.modules.get(EXT_MODULE_NAME)
+    if module is not None:
+        return module
+    # The module imports its helpers from `mingctl`; make that this very module, not a
+    # second copy, when we run as a script.
+    sys.modules.setdefault("mingctl", sys.modules[__name__])
+    import importlib.util
+
+    path = Path(__file__).resolve().with_name(EXT_MODULE_NAME + ".py")
+    if not path.is_file():
+        raise SystemExit(f"{path} is missing; reinstall with `python <skill>/scripts/mingctl.py install`")
+    spec = importlib.util.spec_from_file_location(EXT_MODULE_NAME, str(path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[EXT_MODULE_NAME] = module
+    try:
+        with span("ext_import"):
+            spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[EXT_MODULE_NAME]
+        raise
+    return module
+
+
+def ext_command(name: str) -> Callable[[argparse.Namespace], int]:
+    def handler(args: argparse.Namespace) -> int:
+        return getattr(ext_module(), name)(args)
+
+    return handler
+
+
+def ext_listener(cls_name: str, root: Path) -> EventListener:
+    """A fold or index listener that imports mingctl_ext only once events arrive."""
+    listener: Optional[EventListener] = None
+
+    def on_flush(entries: list[tuple[int, dict[str, Any]]], end: int, generation: int) -> None:
+        nonlocal listener
+        if listener is None:
+            listener = getattr(ext_module(), cls_name).listener(root)
+        listener(entries, end, generation)
+
+    return on_flush
+
+
 def dump_json(data: Any) -> str:
     return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=False)
 
 
+_PROFILER: Optional["Profiler"] = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name: str) -> Any:
+    """
+    Context manager timing one phase of the current command while profiling is on; a
+    shared no-op otherwise, so instrumented code pays one global lookup.
+    """
+
+    if _PROFILER is None:
+        return _NO_SPAN
+    return _PROFILER.span(name)
+
+
+def parse_profile_modes(raw: Optional[str]) -> set[str]:
+    modes: set[str] = set()
+    for item in (raw or "").split(","):
+        item = item.strip().lower()
+        if not item or item in ("0", "off", "false", "no"):
+            continue
+        if item in ("1", "on", "true", "yes"):
+            modes.add("summary")
+        elif item == "all":
+            modes.update(PROFILE_MODES)
+        elif item in PROFILE_MODES:
+            modes.add(item)
+        else:
+            eprint(f"[WARN] Unknown profile mode: {item} (choose from {', '.join(PROFILE_MODES)}, all)")
+    return modes
+
+
+class Profiler:
+    """
+    Spans of one mingctl invocation: root resolution, store setup, JSON and archive I/O,
+    git and child processes. Reported on stderr, as a `trace` archive event, or as
+    cProfile / Chrome-trace files (see PROFILE_MODES).
+    """
+
+    def __init__(self, modes: set[str], command: str) -> None:
+        self.modes = modes
+        self.command = command
+        self.root: Optional[Path] = None
+        self.spans: list[tuple[str, float, float, int, int]] = []
+        self._depth = threading.local()
+        self._profile: Any = None
+        # Times are relative to process start; the `startup` span covers interpreter
+        # startup, compiling this script and argument parsing up to here.
+        self.started = process_started()
+        self.spans.append(("startup", self.started, time.perf_counter(), 0, threading.get_ident()))
+        if "cprofile" in modes:
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        depth = getattr(self._depth, "value", 0)
+        self._depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth.value = depth
+            self.spans.append((name, start, time.perf_counter(), depth, threading.get_ident()))
+
+    def summary(self, total_ms: float) -> str:
+        totals: dict[str, list[float]] = {}
+        for name, start, end, _depth, _tid in self.spans:
+            entry = totals.setdefault(name, [0.0, 0])
+            entry[0] += (end - start) * 1000
+            entry[1] += 1
+        parts = [f"{self.command} {total_ms:.1f} ms"]
+        for name, (ms, count) in sorted(totals.items(), key=lambda kv: -kv[1][0]):
+            parts.append(f"{name} {ms:.1f} ms" + (f" x{int(count)}" if count > 1 else ""))
+        return "[PROFILE] " + " | ".join(parts)
+
+    def output_dir(self) -> Path:
+        if os.environ.get(PROFILE_DIR_ENV):
+            return Path(os.environ[PROFILE_DIR_ENV])
+        if self.root is not None and store_dir(self.root).is_dir():
+            return store_dir(self.root) / PROFILE_DIRNAME
+        return Path.cwd()
+
+    def finish(self, exit_code: Optional[int]) -> None:
+        global _PROFILER
+        _PROFILER = None  # the trace event below must not record spans of its own
+        total_ms = (time.perf_counter() - self.started) * 1000
+        if self._profile is not None:
+            self._profile.disable()
+
+        stem = f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}-{slugify(self.command, fallback='mingctl')}-{os.getpid()}"
+        written = []
+        if self._profile is not None or "chrome" in self.modes:
+            out_dir = self.output_dir()
+            out_dir.mkdir(parents=True, exist_ok=True)
+            if self._profile is not None:
+                self._profile.dump_stats(str(out_dir / f"{stem}.prof"))
+                written.append(out_dir / f"{stem}.prof")
+            if "chrome" in self.modes:
+                events = [
+                    {"name": self.command, "cat": "mingctl", "ph": "X", "ts": 0, "dur": round(total_ms * 1000), "pid": os.getpid(), "tid": threading.main_thread().ident}
+                ]
+                for name, start, end, _depth, tid in self.spans:
+                    events.append(
+                        {
+                            "name": name,
+                            "cat": "mingctl",
+                            "ph": "X",
+                            "ts": round((start - self.started) * 1e6),
+                            "dur": round((end - start) * 1e6),
+                            "pid": os.getpid(),
+                            "tid": tid,
+                        }
+                    )
+                (out_dir / f"{stem}.trace.json").write_text(json.dumps({"traceEvents": events}), encoding="utf-8")
+                written.append(out_dir / f"{stem}.trace.json")
+
+        if "trace" in self.modes and self.root is not None and store_dir(self.root).is_dir():
+            data = {
+                "command": self.command,
+                "exit_code": exit_code,
+                "total_ms": round(total_ms, 3),
+                "spans": [
+                    {"name": name, "start_ms": round((start - self.started) * 1000, 3), "ms": round((end - start) * 1000, 3), "depth": depth}
+                    for name, start, end, depth, _tid in self.spans
+                ],
+            }
+            try:
+                record_event(self.root, "trace", data, case_id=None)
+            except (OSError, SystemExit):
+                pass
+        if "summary" in self.modes:
+            eprint(self.summary(total_ms))
+        for path in written:
+            eprint(f"[PROFILE] wrote {path}")
+
+
+def process_started() -> float:
+    """
+    perf_counter() value at process start: /proc/self/stat starttime on Linux, else
+    the time this module began executing (after interpreter startup and compile).
+    """
+
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        # starttime is field 22; fields[0] is field 3 (state), after "pid (comm)".
+        since_start = time.clock_gettime(time.CLOCK_BOOTTIME) - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, AttributeError, IndexError, ValueError):
+        return _MODULE_STARTED
+    return min(time.perf_counter() - max(since_start, 0.0), _MODULE_STARTED)
+
+
+def start_profiler(modes: set[str], command: str) -> Profiler:
+    global _PROFILER
+    _PROFILER = Profiler(modes, command)
+    return _PROFILER
+
+
 def slugify(text: str, *, fallback: str = "case") -> str:
     ascii_text = text.lower()
     ascii_text = re.sub(r"[^a-z0-9]+", "-", ascii_text)
@@ -46,13 +365,46 @@ def slugify(text: str, *, fallback: str = "case") -> str:
 
 
 def find_project_root(start: Path) -> Path:
+    return walk_project_root(start)[0]
+
+
+ROOT_MARKERS = (STORE_DIRNAME, ".git")
+
+
+def walk_project_root(start: Path) -> tuple[Path, Optional[str]]:
     start = start.resolve()
     for candidate in [start, *start.parents]:
-        if (candidate / STORE_DIRNAME).exists():
-            return candidate
-        if (candidate / ".git").exists():
-            return candidate
-    return start
+        for marker in ROOT_MARKERS:
+            if (candidate / marker).exists():
+                return candidate, marker
+    return start, None
+
+
+def passed_dirs(start: Path, root: Path, marker: Optional[str]) -> list[str]:
+    """Directories the walk from `start` checked without finding a marker."""
+    start = start.resolve()
+    candidates = [start, *start.parents]
+    if marker is not None:
+        candidates = candidates[: candidates.index(root)]
+    return [str(c) for c in candidates]
+
+
+def dir_mtimes(dirs: list[str]) -> dict[str, int]:
+    """mtime_ns of each directory; creating a marker inside one changes it."""
+    mtimes = {}
+    for d in dirs:
+        try:
+            mtimes[d] = os.stat(d).st_mtime_ns
+        except OSError:
+            pass
+    return mtimes
+
+
+def changed_dir(mtimes: dict[str, int]) -> Optional[str]:
+    for d, mtime in mtimes.items():
+        if os.stat(d).st_mtime_ns != mtime:
+            return d
+    return None
 
 
 def infer_root_from_script_path() -> Optional[Path]:
@@ -61,22 +413,131 @@ def infer_root_from_script_path() -> Optional[Path]:
     regardless of current working directory.
     """
 
-    script_path = Path(__file__).resolve()
+    # abspath, not resolve(): a symlinked install must still point at its own project.
+    script_path = Path(os.path.abspath(__file__))
     if script_path.parent.name == STORE_DIRNAME:
         return script_path.parent.parent
     return None
 
 
-def get_root(explicit_root: Optional[str]) -> Path:
+def user_dir() -> Path:
+    return Path(os.environ.get(USER_DIR_ENV) or Path.home() / STORE_DIRNAME).expanduser()
+
+
+def shared_script_path() -> Path:
+    return user_dir() / SHARED_SCRIPT_DIRNAME / INSTALLED_SCRIPT_NAME
+
+
+def script_stamp_path(script: Path) -> Path:
+    return script.with_name(script.name + INSTALL_STAMP_SUFFIX)
+
+
+def root_cache_path() -> Path:
+    return user_dir() / ROOT_CACHE_FILENAME
+
+
+def read_root_cache() -> dict[str, Any]:
+    try:
+        return read_json(root_cache_path())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_root_cache(cache: dict[str, Any]) -> None:
+    while len(cache) > ROOT_CACHE_MAX_ENTRIES:
+        cache.pop(next(iter(cache)))
+    path = root_cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        os.replace(str(tmp), str(path))
+    except OSError:
+        pass  # a read-only home only costs us the cache
+
+
+def resolve_root(explicit_root: Optional[str], *, refresh: bool = False) -> tuple[Path, dict[str, Any]]:
+    """
+    Resolve the project root and report how it was chosen.
+
+    Auto-detection walks parent directories looking for .great-ming/.git; the result is
+    cached per cwd in ~/.great-ming/roots.json together with the (dev, inode) of the
+    marker found and the mtime of each directory the walk passed. A hit costs one stat
+    of that marker plus one per passed directory, never more than the walk it replaces.
+    """
+
+    started = time.perf_counter()
+    info: dict[str, Any] = {"source": None, "root": None, "marker": None}
+
+    def done(root: Path, source: str) -> tuple[Path, dict[str, Any]]:
+        info.update(
+            {"source": source, "root": str(root), "elapsed_us": int((time.perf_counter() - started) * 1_000_000)}
+        )
+        return root, info
+
     env_root = os.environ.get("MING_ROOT")
     if env_root:
-        return Path(env_root).expanduser().resolve()
+        return done(Path(env_root).expanduser().resolve(), "env:MING_ROOT")
     if explicit_root:
-        return Path(explicit_root).expanduser().resolve()
+        return done(Path(explicit_root).expanduser().resolve(), "flag:--root")
     inferred = infer_root_from_script_path()
     if inferred:
-        return inferred
-    return find_project_root(Path.cwd())
+        return done(inferred, "script-location")
+
+    cwd = os.getcwd()
+    info["cwd"] = cwd
+    use_cache = not env_flag(ROOT_CACHE_DISABLE_ENV)
+    cache = read_root_cache() if use_cache else {}
+    entry = cache.get(cwd)
+    if entry and not refresh:
+        try:
+            st = os.stat(os.path.join(entry["root"], entry["marker"] or ""))
+            if (st.st_dev, st.st_ino) != (entry["dev"], entry["ino"]):
+                info["cache_miss"] = "root changed (dev/inode mismatch)"
+            else:
+                changed = changed_dir(entry["passed"])
+                if changed is None:
+                    info["marker"] = entry["marker"]
+                    return done(Path(entry["root"]), "cache")
+                info["cache_miss"] = f"directory changed since the walk: {changed}"
+        except (OSError, KeyError, TypeError, AttributeError):
+            info["cache_miss"] = "cached root is gone"
+
+    # mtimes are taken before walking, so a marker created during the walk still shows.
+    mtimes = dir_mtimes(passed_dirs(Path(cwd), Path(cwd), None)) if use_cache else {}
+    root, marker = walk_project_root(Path(cwd))
+    info["marker"] = marker
+    if use_cache:
+        st = os.stat(os.path.join(str(root), marker or ""))
+        passed = passed_dirs(Path(cwd), root, marker)
+        cache.pop(cwd, None)
+        cache[cwd] = {
+            "root": str(root),
+            "dev": st.st_dev,
+            "ino": st.st_ino,
+            "marker": marker,
+            "passed": {d: mtimes[d] for d in passed if d in mtimes},
+        }
+        write_root_cache(cache)
+    return done(root, "walk")
+
+
+_SCRIPT_CHECKED = False
+
+
+def get_root(explicit_root: Optional[str], *, check_script: bool = True) -> Path:
+    global _SCRIPT_CHECKED
+    with span("root"):
+        root = resolve_root(explicit_root)[0]
+    if _PROFILER is not None:
+        _PROFILER.root = root
+    if check_script and not _SCRIPT_CHECKED and not env_flag(SCRIPT_CHECK_DISABLE_ENV):
+        _SCRIPT_CHECKED = True
+        with span("script_check"):
+            warning = installed_script_warning(root)
+        if warning:
+            eprint(f"[WARN] {warning}")
+    return root
 
 
 def store_dir(root: Path) -> Path:
@@ -91,6 +552,50 @@ def archive_path(root: Path) -> Path:
     return store_dir(root) / ARCHIVE_FILENAME
 
 
+def verify_state_path(root: Path) -> Path:
+    return store_dir(root) / VERIFY_STATE_FILENAME
+
+
+def packed_cases_path(root: Path) -> Path:
+    return store_dir(root) / PACKED_CASES_FILENAME
+
+
+def search_index_path(root: Path) -> Path:
+    return store_dir(root) / SEARCH_INDEX_FILENAME
+
+
+def sqlite_store_path(root: Path) -> Path:
+    return store_dir(root) / SQLITE_STORE_FILENAME
+
+
+def digest_path(root: Path) -> Path:
+    return store_dir(root) / DIGEST_FILENAME
+
+
+def metrics_state_path(root: Path) -> Path:
+    return store_dir(root) / METRICS_STATE_FILENAME
+
+
+def metrics_text_path(root: Path) -> Path:
+    return store_dir(root) / METRICS_TEXT_FILENAME
+
+
+def jobs_dir(root: Path) -> Path:
+    return store_dir(root) / JOBS_DIRNAME
+
+
+def pipeline_logs_dir(root: Path) -> Path:
+    return store_dir(root) / PIPELINE_LOGS_DIRNAME
+
+
+def resource_cache_path(root: Path) -> Path:
+    return store_dir(root) / RESOURCE_CACHE_FILENAME
+
+
+def sections_cache_path(root: Path, resource: Path) -> Path:
+    return store_dir(root) / SECTIONS_CACHE_DIRNAME / f"{hash_line(str(resource).encode('utf-8'))[:16]}.json"
+
+
 def cases_dir(root: Path) -> Path:
     return store_dir(root) / CASES_DIRNAME
 
@@ -100,11 +605,13 @@ def todo_path(root: Path) -> Path:
 
 
 def read_json(path: Path) -> dict[str, Any]:
-    return json.loads(path.read_text(encoding="utf-8"))
+    with span("json.read"):
+        return json.loads(path.read_text(encoding="utf-8"))
 
 
 def write_json(path: Path, data: dict[str, Any]) -> None:
-    path.write_text(dump_json(data) + "\n", encoding="utf-8")
+    with span("json.write"):
+        path.write_text(dump_json(data) + "\n", encoding="utf-8")
 
 
 def append_ndjson(path: Path, record: dict[str, Any]) -> None:
@@ -112,25 +619,601 @@ def append_ndjson(path: Path, record: dict[str, Any]) -> None:
         f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
 
-def ensure_store(root: Path) -> None:
-    store_dir(root).mkdir(parents=True, exist_ok=True)
-    cases_dir(root).mkdir(parents=True, exist_ok=True)
+class ArchiveWriter:
+    """
+    Process-lifetime appender for archives.ndjson with group commit.
+
+    The file descriptor stays open until exit. Events are buffered and written with a
+    single write() once `batch_size` events are pending or `flush_ms` has elapsed since
+    the first pending event; `fsync` optionally follows each write.
+
+    While the chain is on, from the `archive_chain` event that enables it through the one
+    that disables it, every event carries `seq` and `prev` (sha256 of the previous
+    archive line), and a `checkpoint` record is added every CHAIN_CHECKPOINT_EVERY events.
+    Whether it is on is read from the archive tail under the lock whenever another
+    process wrote since our last batch, so `archive chain on/off` elsewhere applies to
+    the very next batch of a long-lived process.
+
+    `listeners` are called after each write with [(offset, record), ...], the end
+    offset and the archive inode, so derived indexes can follow without rescanning.
+    """
 
-    if not state_path(root).exists():
-        write_json(
-            state_path(root),
-            {"version": 1, "formality": "balanced", "current_case_id": None},
+    def __init__(
+        self,
+        path: Path,
+        *,
+        batch_size: int = 1,
+        flush_ms: int = 0,
+        fsync: bool = False,
+    ) -> None:
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_ms = max(0, flush_ms)
+        self.fsync = fsync
+        self._fd: Optional[int] = None
+        self._pending: list[dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self.listeners: list[EventListener] = []
+        # (file size, last line, last seq, chain on) after our own most recent write.
+        self._head: Optional[tuple[int, bytes, int, bool]] = None
+
+    def append(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self.flush_ms and self._timer is None:
+                self._timer = threading.Timer(self.flush_ms / 1000.0, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            with flushing(), span("archive.flush"):
+                self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        # Detach the batch before writing so nothing can write it a second time.
+        pending, self._pending = self._pending, []
+        fd = self._lock_current()
+        try:
+            start = os.fstat(fd).st_size
+            lines = self._encode(start, pending)
+            write_all(fd, b"".join(line + b"\n" for _, line in lines))
+            if self.fsync:
+                os.fsync(fd)
+            inode = os.fstat(fd).st_ino
+        finally:
+            unlock_fd(fd)
+        if self.listeners:
+            entries: list[tuple[int, dict[str, Any]]] = []
+            offset = start
+            for rec, line in lines:
+                entries.append((offset, rec))
+                offset += len(line) + 1
+            with span("archive.listeners"):
+                for listener in self.listeners:
+                    listener(entries, offset, inode)
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _lock_current(self) -> int:
+        """
+        Lock the archive fd, reopening first if `compact` swapped in a new file.
+        """
+
+        while True:
+            fd = self._open()
+            lock_fd(fd)
+            try:
+                current = os.stat(str(self.path))
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(fd)
+            if current is not None and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                return fd
+            unlock_fd(fd)
+            os.close(fd)
+            self._fd = None
+            self._head = None
+
+    def _encode(self, size: int, pending: list[dict[str, Any]]) -> list[tuple[dict[str, Any], bytes]]:
+        if self._head is not None and self._head[0] == size:
+            _, last, seq, chain = self._head
+        else:
+            # First write, or another process appended since ours: re-read the tail.
+            last, seq, chain = chain_tail(self.path)
+        prev: Optional[str] = None  # hash of `last`, computed only once chaining needs it
+        lines: list[tuple[dict[str, Any], bytes]] = []
+        for record in pending:
+            if record.get("type") == "archive_chain" and (record.get("data") or {}).get("enabled"):
+                chain = True
+            if not chain:
+                last = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                prev = None
+                lines.append((record, last))
+                continue
+            if prev is None:
+                prev = hash_line(last) if last else CHAIN_GENESIS
+            for rec in self._with_checkpoint(record, seq, prev):
+                seq += 1
+                rec["seq"] = seq
+                rec["prev"] = prev
+                last = json.dumps(rec, ensure_ascii=False).encode("utf-8")
+                prev = hash_line(last)
+                lines.append((rec, last))
+            chain = not ends_chain(record)
+        self._head = (size + sum(len(line) + 1 for _, line in lines), last, seq, chain)
+        return lines
+
+    @staticmethod
+    def _with_checkpoint(record: dict[str, Any], seq: int, prev: str) -> list[dict[str, Any]]:
+        if seq and seq % CHAIN_CHECKPOINT_EVERY == 0:
+            checkpoint = {"ts": now_iso(), "type": "checkpoint", "case": None, "data": {"events": seq, "head": prev}}
+            return [checkpoint, dict(record)]
+        return [dict(record)]
+
+
+_ARCHIVE_WRITERS: dict[str, ArchiveWriter] = {}
+_EXIT_HOOKS_INSTALLED = False
+_PREVIOUS_SIGNAL_HANDLERS: dict[int, Any] = {}
+# Main-thread flush depth, and SIGTERM/SIGHUP that arrived during a flush.
+_FLUSH_STATE = threading.local()
+_DEFERRED_SIGNALS: list[int] = []
+
+
+@contextlib.contextmanager
+def flushing() -> Iterator[None]:
+    """
+    Mark an archive or derived-state write in progress. A signal arriving meanwhile is
+    handled once the outermost write finishes instead of re-entering it.
+    """
+
+    _FLUSH_STATE.depth = getattr(_FLUSH_STATE, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _FLUSH_STATE.depth -= 1
+        if not _FLUSH_STATE.depth and _DEFERRED_SIGNALS and threading.current_thread() is threading.main_thread():
+            _flush_on_signal(_DEFERRED_SIGNALS.pop(0), None)
+
+
+def lock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def hash_line(line: bytes) -> str:
+    return hashlib.sha256(line).hexdigest()
+
+
+def read_last_line(path: Path) -> tuple[int, bytes]:
+    """
+    Return (start offset, bytes) of the last complete line, reading backwards in blocks.
+    """
+
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end == 0:
+            return 0, b""
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            end -= 1
+        pos = end
+        buf = b""
+        while pos > 0:
+            step = min(8192, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            nl = buf.rfind(b"\n")
+            if nl != -1:
+                return pos + nl + 1, buf[nl + 1 :]
+        return 0, buf
+
+
+def tail_offset(path: Path, n: int) -> int:
+    """
+    Return the offset where the last `n` lines start, reading backwards in blocks.
+    """
+
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        if pos == 0 or n <= 0:
+            return pos
+        f.seek(pos - 1)
+        # A trailing newline terminates the last line rather than starting a new one.
+        remaining = n + 1 if f.read(1) == b"\n" else n
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            idx = len(block)
+            while True:
+                idx = block.rfind(b"\n", 0, idx)
+                if idx == -1:
+                    break
+                remaining -= 1
+                if remaining == 0:
+                    return pos + idx + 1
+        return 0
+
+
+def ends_chain(rec: dict[str, Any]) -> bool:
+    return rec.get("type") == "archive_chain" and not (rec.get("data") or {}).get("enabled")
+
+
+def chain_tail(path: Path) -> tuple[bytes, int, bool]:
+    """
+    Return (last archive line, its seq, whether the chain is on after it) for the next
+    event: the chain is on after any chained line but the one that disabled it.
+    """
+
+    if not path.exists():
+        return b"", 0, False
+    _, line = read_last_line(path)
+    if not line:
+        return b"", 0, False
+    try:
+        rec = json.loads(line)
+    except ValueError:
+        return line, 0, False
+    if not isinstance(rec, dict):
+        return line, 0, False
+    try:
+        seq = int(rec.get("seq") or 0)
+    except (TypeError, ValueError):
+        seq = 0
+    return line, seq, "prev" in rec and not ends_chain(rec)
+
+
+def write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def flush_archives() -> None:
+    for writer in list(_ARCHIVE_WRITERS.values()):
+        writer.flush()
+    for store in list(_STORES.values()):
+        store.flush()
+
+
+def close_archives() -> None:
+    for writer in list(_ARCHIVE_WRITERS.values()):
+        writer.close()
+    _ARCHIVE_WRITERS.clear()
+    for store in list(_STORES.values()):
+        store.flush()
+    if EXT_MODULE_NAME in sys.modules:  # fold buffers only exist once it is loaded
+        sys.modules[EXT_MODULE_NAME].flush_folds()
+
+
+def _flush_on_signal(signum: int, frame: Any) -> None:
+    if getattr(_FLUSH_STATE, "depth", 0):
+        _DEFERRED_SIGNALS.append(signum)
+        return
+    previous = _PREVIOUS_SIGNAL_HANDLERS.get(signum, signal.SIG_DFL)
+    close_archives()
+    if callable(previous):
+        previous(signum, frame)
+        return
+    signal.signal(signum, previous)
+    os.kill(os.getpid(), signum)
+
+
+def install_exit_hooks() -> None:
+    """
+    Guarantee buffered archive events and derived state reach disk on normal exit and on
+    SIGTERM/SIGHUP.
+
+    SIGINT already unwinds through KeyboardInterrupt, so atexit covers it.
+    """
+
+    global _EXIT_HOOKS_INSTALLED
+    if _EXIT_HOOKS_INSTALLED:
+        return
+    _EXIT_HOOKS_INSTALLED = True
+    atexit.register(close_archives)
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for name in ("SIGTERM", "SIGHUP"):
+        signum = getattr(signal, name, None)
+        if signum is None:
+            continue
+        previous = signal.getsignal(signum)
+        if previous in (signal.SIG_IGN, None):
+            continue
+        _PREVIOUS_SIGNAL_HANDLERS[signum] = previous
+        signal.signal(signum, _flush_on_signal)
+
+
+def get_archive_writer(root: Path) -> ArchiveWriter:
+    key = str(root)
+    writer = _ARCHIVE_WRITERS.get(key)
+    if writer is None:
+        writer = ArchiveWriter(
+            archive_path(root),
+            batch_size=env_int(ARCHIVE_BATCH_ENV, 1),
+            flush_ms=env_int(ARCHIVE_FLUSH_MS_ENV, 0),
+            fsync=env_flag(ARCHIVE_FSYNC_ENV),
         )
+        writer.listeners = get_store(root).listeners
+        _ARCHIVE_WRITERS[key] = writer
+        install_exit_hooks()
+    return writer
 
-    archive_path(root).touch(exist_ok=True)
 
-    if not todo_path(root).exists():
-        todo_path(root).write_text("# 邸报（Great Ming）\n\n## 在办\n\n", encoding="utf-8")
+def default_state() -> dict[str, Any]:
+    return {"version": 1, "formality": "balanced", "current_case_id": None}
+
+
+class Store(ABC):
+    """
+    Storage backend interface behind ensure_store/load_state/load_case/save_case/record_event.
+
+    Events are addressed by an integer cursor (`pos`, `end` = position of the next
+    event) that only grows within one `generation()`; a new generation (archive swapped
+    by `compact`, store migrated) tells derived indexes to rebuild. `listeners` receive
+    every committed batch as [(pos, record), ...], end and generation.
+    """
+
+    name = ""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.listeners: list[EventListener] = []
+
+    @abstractmethod
+    def ensure(self) -> None:
+        ...
+
+    @abstractmethod
+    def load_state(self) -> dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def save_state(self, state: dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def load_case(self, case_id: str) -> Optional[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_case(self, case: dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def list_cases(self) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_packed_cases(self) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update_todo(self, *, case_id: str, title: str, done: bool) -> None:
+        ...
+
+    @abstractmethod
+    def append_event(self, record: dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def tail_events(self, n: int) -> list[str]:
+        ...
+
+    @abstractmethod
+    def tail_cursor(self, n: int) -> int:
+        """Cursor of the n-th last event (the end cursor for n=0)."""
+
+    @abstractmethod
+    def iter_lines(self, start: int) -> Iterator[tuple[int, int, bytes]]:
+        ...
+
+    @abstractmethod
+    def generation(self) -> int:
+        ...
+
+    @abstractmethod
+    def compact_events(self, *, cutoff: str, budget_bytes: int, dry_run: bool) -> dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def pack_closed_cases(self, *, cutoff: str, dry_run: bool) -> list[str]:
+        ...
+
+    def iter_events(self, start: int) -> Iterator[tuple[int, int, dict[str, Any]]]:
+        for pos, end, line in self.iter_lines(start):
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict):
+                yield pos, end, rec
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        yield
+
+    def flush(self) -> None:
+        """Commit events this store buffers itself (FileStore's go through ArchiveWriter)."""
+
+    def close(self) -> None:
+        pass
+
+
+class FileStore(Store):
+    """
+    Default backend: state.json, cases/<id>.json, archives.ndjson and todo.md.
+
+    Cursors are byte offsets into archives.ndjson; the generation is its inode.
+    """
+
+    name = "files"
+
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self._ensured = False
+
+    def ensure(self) -> None:
+        # The layout only ever grows, so one check per process is enough.
+        if self._ensured:
+            return
+        with span("ensure_store"):
+            root = self.root
+            store_dir(root).mkdir(parents=True, exist_ok=True)
+            cases_dir(root).mkdir(parents=True, exist_ok=True)
+
+            if not state_path(root).exists():
+                write_json(state_path(root), default_state())
+
+            archive_path(root).touch(exist_ok=True)
+
+            if not todo_path(root).exists():
+                todo_path(root).write_text(TODO_HEADER, encoding="utf-8")
+        self._ensured = True
+
+    def load_state(self) -> dict[str, Any]:
+        self.ensure()
+        return read_json(state_path(self.root))
+
+    def save_state(self, state: dict[str, Any]) -> None:
+        self.ensure()
+        write_json(state_path(self.root), state)
+
+    def load_case(self, case_id: str) -> Optional[dict[str, Any]]:
+        path = cases_dir(self.root) / f"{case_id}.json"
+        if not path.exists():
+            return find_packed_case(self.root, case_id)
+        return read_json(path)
+
+    def save_case(self, case: dict[str, Any]) -> None:
+        write_json(cases_dir(self.root) / f"{case['id']}.json", case)
+
+    def list_cases(self) -> list[dict[str, Any]]:
+        self.ensure()
+        cases: list[dict[str, Any]] = []
+        for p in sorted(cases_dir(self.root).glob("*.json")):
+            try:
+                cases.append(read_json(p))
+            except Exception:
+                continue
+        return cases
+
+    def list_packed_cases(self) -> list[dict[str, Any]]:
+        path = packed_cases_path(self.root)
+        if not path.exists():
+            return []
+        with path.open("r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def update_todo(self, *, case_id: str, title: str, done: bool) -> None:
+        self.ensure()
+        path = todo_path(self.root)
+        line_open = f"- [ ] {case_id} {title}\n"
+        line_done = f"- [x] {case_id} {title}\n"
+        todo = path.read_text(encoding="utf-8").splitlines(keepends=True)
+        found = False
+        for i, line in enumerate(todo):
+            if line.startswith(f"- [ ] {case_id} ") or line.startswith(f"- [x] {case_id} "):
+                todo[i] = line_done if done else line_open
+                found = True
+                break
+        if not found and not done:
+            todo.append(line_open)
+        path.write_text("".join(todo), encoding="utf-8")
+
+    def append_event(self, record: dict[str, Any]) -> None:
+        self.ensure()
+        get_archive_writer(self.root).append(record)
+
+    def tail_events(self, n: int) -> list[str]:
+        return tail_lines(archive_path(self.root), n)
+
+    def tail_cursor(self, n: int) -> int:
+        flush_archives()
+        return tail_offset(archive_path(self.root), n)
+
+    def iter_lines(self, start: int) -> Iterator[tuple[int, int, bytes]]:
+        flush_archives()
+        with archive_path(self.root).open("rb") as f:
+            f.seek(start)
+            pos = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # append in flight
+                yield pos, pos + len(line), line[:-1]
+                pos += len(line)
+
+    def generation(self) -> int:
+        return os.stat(str(archive_path(self.root))).st_ino
+
+    def compact_events(self, *, cutoff: str, budget_bytes: int, dry_run: bool) -> dict[str, Any]:
+        return ext_module().compact_archive(self.root, cutoff=cutoff, budget_bytes=budget_bytes, dry_run=dry_run)
+
+    def pack_closed_cases(self, *, cutoff: str, dry_run: bool) -> list[str]:
+        return ext_module().pack_closed_cases(self.root, cutoff=cutoff, dry_run=dry_run)
+
+
+_STORES: dict[str, Store] = {}
+
+
+def get_store(root: Path) -> Store:
+    key = str(root)
+    store = _STORES.get(key)
+    if store is None:
+        store = ext_module().SqliteStore(root) if sqlite_store_path(root).exists() else FileStore(root)
+        register_store(store)
+    return store
+
+
+def register_store(store: Store) -> None:
+    old = _STORES.pop(str(store.root), None)
+    if old is not None:
+        old.close()
+    if search_index_path(store.root).exists():
+        store.listeners.append(ext_listener("SearchIndex", store.root))
+    if digest_path(store.root).exists():
+        store.listeners.append(ext_listener("Digest", store.root))
+    if metrics_state_path(store.root).exists():
+        store.listeners.append(ext_listener("Metrics", store.root))
+    _STORES[str(store.root)] = store
+
+
+def ensure_store(root: Path) -> None:
+    get_store(root).ensure()
 
 
 def load_state(root: Path) -> dict[str, Any]:
-    ensure_store(root)
-    state = read_json(state_path(root))
+    state = get_store(root).load_state()
     if state.get("version") != 1:
         raise SystemExit(f"Unsupported state version: {state.get('version')}")
     if state.get("formality") not in FORMALITY_VALUES:
@@ -139,44 +1222,40 @@ def load_state(root: Path) -> dict[str, Any]:
 
 
 def save_state(root: Path, state: dict[str, Any]) -> None:
-    ensure_store(root)
-    write_json(state_path(root), state)
+    get_store(root).save_state(state)
 
 
 def record_event(root: Path, event_type: str, data: dict[str, Any], *, case_id: Optional[str]) -> None:
-    ensure_store(root)
-    append_ndjson(
-        archive_path(root),
-        {"ts": now_iso(), "type": event_type, "case": case_id, "data": data},
-    )
+    get_store(root).append_event({"ts": now_iso(), "type": event_type, "case": case_id, "data": data})
 
 
 def load_case(root: Path, case_id: str) -> dict[str, Any]:
-    path = cases_dir(root) / f"{case_id}.json"
-    if not path.exists():
+    case = get_store(root).load_case(case_id)
+    if case is None:
         raise SystemExit(f"Case not found: {case_id}")
-    return read_json(path)
+    return case
+
+
+def find_packed_case(root: Path, case_id: str) -> Optional[dict[str, Any]]:
+    path = packed_cases_path(root)
+    if not path.exists():
+        return None
+    needle = json.dumps(case_id, ensure_ascii=False)
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if needle in line:
+                case = json.loads(line)
+                if case.get("id") == case_id:
+                    return case
+    return None
 
 
 def save_case(root: Path, case: dict[str, Any]) -> None:
-    path = cases_dir(root) / f"{case['id']}.json"
-    write_json(path, case)
+    get_store(root).save_case(case)
 
 
 def update_todo(root: Path, *, case_id: str, title: str, done: bool) -> None:
-    ensure_store(root)
-    line_open = f"- [ ] {case_id} {title}\n"
-    line_done = f"- [x] {case_id} {title}\n"
-    todo = todo_path(root).read_text(encoding="utf-8").splitlines(keepends=True)
-    found = False
-    for i, line in enumerate(todo):
-        if line.startswith(f"- [ ] {case_id} ") or line.startswith(f"- [x] {case_id} "):
-            todo[i] = line_done if done else line_open
-            found = True
-            break
-    if not found and not done:
-        todo.append(line_open)
-    todo_path(root).write_text("".join(todo), encoding="utf-8")
+    get_store(root).update_todo(case_id=case_id, title=title, done=done)
 
 
 def new_case_id(title: str) -> str:
@@ -185,30 +1264,194 @@ def new_case_id(title: str) -> str:
     return f"{ts}-{slug}"
 
 
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def script_files(script: Path) -> list[Path]:
+    """The script and the module it imports lazily, which always sits beside it."""
+    return [script, script.with_name(EXT_MODULE_NAME + ".py")]
+
+
+def script_sha256(script: Path) -> str:
+    """One hash over the script and its module: an install is current only if both are."""
+    h = hashlib.sha256()
+    for path in script_files(script):
+        h.update(file_sha256(path).encode("ascii"))
+    return h.hexdigest()
+
+
+def script_signature(script: Path) -> list[list[int]]:
+    return [[st.st_size, st.st_mtime_ns] for st in (os.stat(str(p)) for p in script_files(script))]
+
+
+def script_stamp(src: Path, digest: str, *, link: str, target: Optional[Path] = None) -> dict[str, Any]:
+    stamp = {
+        "version": MINGCTL_VERSION,
+        "sha256": digest,
+        "source": str(src),
+        "link": link,
+        "installed_at": now_iso(),
+        # Last seen (size, mtime) of the source files and their hash, so the staleness
+        # check only rehashes after the source changes.
+        "source_seen": {"files": script_signature(src), "sha256": digest},
+    }
+    if target is not None:
+        stamp["target"] = str(target)
+    return stamp
+
+
+def read_script_stamp(script: Path) -> dict[str, Any]:
+    try:
+        return read_json(script_stamp_path(script))
+    except (OSError, ValueError):
+        return {}
+
+
+def installed_script_warning(root: Path) -> Optional[str]:
+    """
+    Message when the project's installed script no longer matches the source it was
+    installed from. Costs a stat of the source script and its module plus the stamp
+    read; they are rehashed only when a size or mtime moved.
+    """
+
+    script = store_dir(root) / INSTALLED_SCRIPT_NAME
+    stamp = read_script_stamp(script)
+    link = stamp.get("link")
+    if link in INSTALL_LINK_MODES:
+        script = Path(stamp.get("target") or shared_script_path())
+        stamp = read_script_stamp(script)
+    source = stamp.get("source")
+    if not source:
+        return None
+    try:
+        signature = script_signature(Path(source))
+    except OSError:
+        return None
+    seen = stamp.get("source_seen") or {}
+    if seen.get("files") != signature:
+        try:
+            seen = {"files": signature, "sha256": script_sha256(Path(source))}
+            stamp["source_seen"] = seen
+            write_json_atomic(script_stamp_path(script), stamp)
+        except OSError:
+            return None
+    if seen.get("sha256") == stamp.get("sha256"):
+        return None
+    flag = f" --link {link}" if link in INSTALL_LINK_MODES else ""
+    return f"{script} ({stamp.get('version')}) is out of date with {source}; run `python {source} install{flag}` to update"
+
+
+def install_shared_script(src: Path, digest: str) -> Path:
+    """
+    Refresh the user-level copy that `install --link` points projects at. It is
+    rewritten in place, so hard links made earlier see the new content as well.
+    """
+
+    dst = shared_script_path()
+    if dst.exists() and (os.path.samefile(str(src), str(dst)) or read_script_stamp(dst).get("sha256") == digest):
+        return dst
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    for src_file, dst_file in zip(script_files(src), script_files(dst)):
+        fd = os.open(str(dst_file), os.O_WRONLY | os.O_CREAT, 0o755)
+        try:
+            data = src_file.read_bytes()
+            write_all(fd, data)
+            os.ftruncate(fd, len(data))
+        finally:
+            os.close(fd)
+    write_json_atomic(script_stamp_path(dst), script_stamp(src, digest, link="copy"))
+    eprint(f"[OK] Updated shared copy: {dst}")
+    return dst
+
+
+def installed_script_matches(dst: Path, target: Path, link: str, digest: str) -> bool:
+    pairs = list(zip(script_files(dst), script_files(target)))
+    try:
+        if link == "sym":
+            return all(d.is_symlink() and os.readlink(str(d)) == str(t) for d, t in pairs)
+        if link == "hard":
+            return all(not d.is_symlink() and os.path.samefile(str(d), str(t)) for d, t in pairs)
+        return not any(d.is_symlink() for d, _ in pairs) and script_sha256(dst) == digest
+    except OSError:
+        return False
+
+
+def place_script(target: Path, dst: Path, link: str) -> None:
+    # The module goes first, so a call starting in between never finds a new script
+    # without the module it imports.
+    for target_file, dst_file in reversed(list(zip(script_files(target), script_files(dst)))):
+        tmp = dst_file.with_name(f"{dst_file.name}.{os.getpid()}.tmp")
+        if os.path.lexists(str(tmp)):
+            os.unlink(str(tmp))
+        if link == "sym":
+            os.symlink(str(target_file), str(tmp))
+        elif link == "hard":
+            try:
+                os.link(str(target_file), str(tmp))
+            except OSError as e:
+                raise SystemExit(f"Cannot hard-link {target_file} into {dst.parent}: {e} (try --link sym)")
+        else:
+            shutil.copyfile(target_file, tmp)
+        os.replace(str(tmp), str(dst_file))
+
+
 def cmd_install(args: argparse.Namespace) -> int:
-    root = get_root(args.root)
+    root = get_root(args.root, check_script=False)
     ensure_store(root)
+    ext_module().register_project(root)
 
     src = Path(__file__).resolve()
+    digest = script_sha256(src)
+    link = args.link or "copy"
+    target = install_shared_script(src, digest) if args.link else src
     dst = store_dir(root) / INSTALLED_SCRIPT_NAME
-    if dst.exists() and not args.force:
-        eprint(f"[SKIP] Already installed: {dst}")
+    changed = args.force or not installed_script_matches(dst, target, link, digest)
+    if changed:
+        place_script(target, dst, link)
+        via = f", {link} link to {target}" if args.link else ""
+        eprint(f"[OK] Installed: {dst} ({MINGCTL_VERSION}, {digest[:12]}{via})")
     else:
-        shutil.copyfile(src, dst)
-        eprint(f"[OK] Installed: {dst}")
+        eprint(f"[SKIP] Up to date: {dst} ({MINGCTL_VERSION}, {digest[:12]})")
+
+    old = read_script_stamp(dst)
+    if changed or (old.get("sha256"), old.get("link"), old.get("version")) != (digest, link, MINGCTL_VERSION):
+        write_json_atomic(script_stamp_path(dst), script_stamp(src, digest, link=link, target=target if args.link else None))
 
     record_event(
         root,
         "install",
-        {"installed_script": str(dst), "source": str(src)},
+        {
+            "installed_script": str(dst),
+            "source": str(src),
+            "version": MINGCTL_VERSION,
+            "sha256": digest,
+            "link": link,
+            "changed": changed,
+        },
         case_id=None,
     )
     return 0
 
 
+def cmd_which_root(args: argparse.Namespace) -> int:
+    _, info = resolve_root(args.root, refresh=args.refresh)
+    if args.json:
+        print(dump_json(info))
+    else:
+        marker = f" marker={info['marker']}" if info.get("marker") else ""
+        print(f"{info['root']} (source={info['source']}{marker}, {info['elapsed_us']}us)")
+    return 0
+
+
 def cmd_init(args: argparse.Namespace) -> int:
     root = get_root(args.root)
+    if args.backend == "sqlite" and not sqlite_store_path(root).exists():
+        if state_path(root).exists():
+            raise SystemExit("Store already uses the files backend; use `storage migrate --to sqlite`")
+        register_store(ext_module().SqliteStore(root))
     ensure_store(root)
+    ext_module().register_project(root)
     record_event(root, "init", {"store": str(store_dir(root))}, case_id=None)
     if args.json:
         print(dump_json({"ok": True, "root": str(root), "store": str(store_dir(root))}))
@@ -352,7 +1595,15 @@ def cmd_route(args: argparse.Namespace) -> int:
     decision = parse_route(args.text, default_formality=state["formality"])
     if args.record:
         case_id = args.case or state.get("current_case_id")
-        record_event(root, "route", decision, case_id=case_id)
+        with get_store(root).transaction():
+            record_event(root, "route", decision, case_id=case_id)
+            if case_id and decision["urgency"] == "urgent":
+                # Urgency only escalates: queued jobs of this case jump the line (see `worker`).
+                case = get_store(root).load_case(case_id)
+                if case is not None and case.get("urgency") != "urgent":
+                    case["urgency"] = "urgent"
+                    case["updated_at"] = now_iso()
+                    save_case(root, case)
 
     if args.json:
         print(dump_json(decision))
@@ -484,13 +1735,14 @@ def cmd_case_open(args: argparse.Namespace) -> int:
         "status": "open",
         "last_rescript": None,
     }
-    save_case(root, case)
-    update_todo(root, case_id=case_id, title=args.title, done=False)
-    record_event(root, "case_open", {"title": args.title}, case_id=case_id)
+    with get_store(root).transaction():
+        save_case(root, case)
+        update_todo(root, case_id=case_id, title=args.title, done=False)
+        record_event(root, "case_open", {"title": args.title}, case_id=case_id)
 
-    if args.set_current:
-        state["current_case_id"] = case_id
-        save_state(root, state)
+        if args.set_current:
+            state["current_case_id"] = case_id
+            save_state(root, state)
 
     if args.json:
         print(dump_json(case))
@@ -501,13 +1753,7 @@ def cmd_case_open(args: argparse.Namespace) -> int:
 
 def cmd_case_list(args: argparse.Namespace) -> int:
     root = get_root(args.root)
-    load_state(root)  # ensure store
-    cases: list[dict[str, Any]] = []
-    for p in sorted(cases_dir(root).glob("*.json")):
-        try:
-            cases.append(read_json(p))
-        except Exception:
-            continue
+    cases = get_store(root).list_cases()
     if args.json:
         print(dump_json(cases))
         return 0
@@ -526,13 +1772,14 @@ def cmd_case_close(args: argparse.Namespace) -> int:
     case = load_case(root, args.case_id)
     case["status"] = "closed"
     case["updated_at"] = now_iso()
-    save_case(root, case)
-    update_todo(root, case_id=case["id"], title=case["title"], done=True)
-    record_event(root, "case_close", {}, case_id=case["id"])
+    with get_store(root).transaction():
+        save_case(root, case)
+        update_todo(root, case_id=case["id"], title=case["title"], done=True)
+        record_event(root, "case_close", {}, case_id=case["id"])
 
-    if state.get("current_case_id") == case["id"]:
-        state["current_case_id"] = None
-        save_state(root, state)
+        if state.get("current_case_id") == case["id"]:
+            state["current_case_id"] = None
+            save_state(root, state)
 
     if args.json:
         print(dump_json(case))
@@ -608,6 +1855,72 @@ def shlex_join(argv: list[str]) -> str:
     return " ".join(shlex.quote(a) for a in argv)
 
 
+def record_denial(
+    root: Path,
+    case: Optional[dict[str, Any]],
+    *,
+    dept: str,
+    kind: str,
+    command: list[str],
+    reason: str,
+    tags: Optional[dict[str, Any]] = None,
+) -> None:
+    data = {
+        "kind": kind,
+        "dept": dept,
+        "command_str": shlex_join(command),
+        "rescript": ((case or {}).get("last_rescript") or {}).get("category"),
+        "reason": reason,
+    }
+    data.update(tags or {})
+    record_event(root, "exec_denied", data, case_id=case["id"] if case else None)
+
+
+def authorize_exec(
+    root: Path,
+    *,
+    case_id: Optional[str],
+    dept: str,
+    kind: str,
+    force: bool,
+    command: list[str],
+) -> None:
+    if kind != "action" or force:
+        return
+    if not case_id:
+        record_denial(root, None, dept=dept, kind=kind, command=command, reason="no case selected")
+        raise SystemExit("No case selected (use `case open --set-current` or pass --case), or run with --force")
+    case = load_case(root, case_id)
+    ok, reason = can_execute(case, dept)
+    if not ok:
+        record_denial(root, case, dept=dept, kind=kind, command=command, reason=reason)
+        raise SystemExit(f"Not authorized by rescript: {reason} (use --force to override)")
+
+
+def exec_event(
+    *,
+    kind: str,
+    dept: str,
+    command: list[str],
+    exit_code: Optional[int],
+    duration_ms: int,
+    forced: bool,
+    captured: bool,
+    output_snippet: Optional[str],
+) -> dict[str, Any]:
+    return {
+        "kind": kind,
+        "dept": dept,
+        "command": command,
+        "command_str": shlex_join(command),
+        "exit_code": exit_code,
+        "duration_ms": duration_ms,
+        "forced": forced,
+        "captured": captured,
+        "output_snippet": output_snippet,
+    }
+
+
 def cmd_exec(args: argparse.Namespace) -> int:
     root = get_root(args.root)
     state = load_state(root)
@@ -617,23 +1930,20 @@ def cmd_exec(args: argparse.Namespace) -> int:
     if not args.command:
         raise SystemExit("Missing command (use: mingctl exec -- <command...>)")
 
-    if args.kind == "action" and not args.force:
-        if not case_id:
-            raise SystemExit("No case selected (use `case open --set-current` or pass --case), or run with --force")
-        case = load_case(root, case_id)
-        ok, reason = can_execute(case, dept)
-        if not ok:
-            raise SystemExit(f"Not authorized by rescript: {reason} (use --force to override)")
+    authorize_exec(root, case_id=case_id, dept=dept, kind=args.kind, force=bool(args.force), command=args.command)
+    if args.enqueue:
+        return ext_module().enqueue_exec(root, args, case_id=case_id)
 
     started = time.time()
     try:
         if args.capture:
-            proc = subprocess.run(
-                args.command,
-                cwd=root,
-                text=True,
-                capture_output=True,
-            )
+            with span("child"):
+                proc = subprocess.run(
+                    args.command,
+                    cwd=root,
+                    text=True,
+                    capture_output=True,
+                )
             stdout = proc.stdout or ""
             stderr = proc.stderr or ""
             sys.stdout.write(stdout)
@@ -643,7 +1953,8 @@ def cmd_exec(args: argparse.Namespace) -> int:
                 combined = combined[: args.max_capture_bytes] + "\n[...truncated...]\n"
             output_snippet = combined
         else:
-            proc = subprocess.run(args.command, cwd=root)
+            with span("child"):
+                proc = subprocess.run(args.command, cwd=root)
             output_snippet = None
     except FileNotFoundError:
         raise SystemExit(f"Command not found: {args.command[0]}")
@@ -653,17 +1964,16 @@ def cmd_exec(args: argparse.Namespace) -> int:
     record_event(
         root,
         "exec",
-        {
-            "kind": args.kind,
-            "dept": dept,
-            "command": args.command,
-            "command_str": shlex_join(args.command),
-            "exit_code": proc.returncode,
-            "duration_ms": elapsed_ms,
-            "forced": bool(args.force),
-            "captured": bool(args.capture),
-            "output_snippet": output_snippet,
-        },
+        exec_event(
+            kind=args.kind,
+            dept=dept,
+            command=args.command,
+            exit_code=proc.returncode,
+            duration_ms=elapsed_ms,
+            forced=bool(args.force),
+            captured=bool(args.capture),
+            output_snippet=output_snippet,
+        ),
         case_id=case_id,
     )
 
@@ -671,10 +1981,42 @@ def cmd_exec(args: argparse.Namespace) -> int:
 
 
 def tail_lines(path: Path, n: int) -> list[str]:
+    flush_archives()
     if n <= 0 or not path.exists():
         return []
-    lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    return lines[-n:]
+    with path.open("rb") as f:
+        f.seek(tail_offset(path, n))
+        return f.read().decode("utf-8", errors="replace").splitlines()
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        lock_fd(fd)
+        yield
+    finally:
+        unlock_fd(fd)
+        os.close(fd)
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(str(tmp), str(path))
+
+
+def write_json_atomic(path: Path, data: dict[str, Any]) -> None:
+    with span("json.write"):
+        write_text_atomic(path, json.dumps(data, ensure_ascii=False))
+
+
+def render_todo(cases: list[dict[str, Any]]) -> str:
+    lines = [TODO_HEADER]
+    for case in cases:
+        mark = "x" if case.get("status") == "closed" else " "
+        lines.append(f"- [{mark}] {case['id']} {case.get('title')}\n")
+    return "".join(lines)
 
 
 def cmd_prompt_morning(args: argparse.Namespace) -> int:
@@ -698,13 +2040,14 @@ def cmd_prompt_morning(args: argparse.Namespace) -> int:
 
     if (root / ".git").exists():
         try:
-            status = subprocess.run(
-                ["git", "status", "-sb"],
-                cwd=root,
-                text=True,
-                capture_output=True,
-                check=False,
-            )
+            with span("git"):
+                status = subprocess.run(
+                    ["git", "status", "-sb"],
+                    cwd=root,
+                    text=True,
+                    capture_output=True,
+                    check=False,
+                )
             out.append("## 吏部黄册（Git Status）")
             out.append("```")
             out.append((status.stdout or "").rstrip() or "(no output)")
@@ -715,7 +2058,7 @@ def cmd_prompt_morning(args: argparse.Namespace) -> int:
 
     out.append("## 近报（Last Archives）")
     out.append("```jsonl")
-    out.extend(tail_lines(archive_path(root), args.tail))
+    out.extend(get_store(root).tail_events(args.tail))
     out.append("```")
 
     print("\n".join(out))
@@ -797,61 +2140,6 @@ def cmd_prompt_new_emperor(args: argparse.Namespace) -> int:
     return 0
 
 
-def list_resources(root: Path) -> list[dict[str, Any]]:
-    candidates = [
-        ("ancestral-instructions", ["README.md", "README", "CONTRIBUTING.md", "CONTRIBUTING", "SECURITY.md", "SECURITY"]),
-        ("license", ["LICENSE", "LICENSE.md"]),
-    ]
-    resources: list[dict[str, Any]] = []
-    for name, filenames in candidates:
-        for fn in filenames:
-            p = root / fn
-            if p.exists() and p.is_file():
-                resources.append({"name": name, "path": str(p)})
-                break
-    if (root / ".git").exists():
-        resources.append({"name": "yellow-registers", "path": "git://log"})
-    return resources
-
-
-def cmd_resources_list(args: argparse.Namespace) -> int:
-    root = get_root(args.root)
-    resources = list_resources(root)
-    if args.json:
-        print(dump_json(resources))
-    else:
-        for r in resources:
-            print(f"- {r['name']}: {r['path']}")
-    return 0
-
-
-def cmd_resources_show(args: argparse.Namespace) -> int:
-    root = get_root(args.root)
-    resources = {r["name"]: r["path"] for r in list_resources(root)}
-    key = args.name
-    if key not in resources:
-        raise SystemExit(f"Unknown resource: {key}")
-
-    if resources[key].startswith("git://"):
-        if key == "yellow-registers":
-            proc = subprocess.run(
-                ["git", "log", "--oneline", f"-n{args.n}"],
-                cwd=root,
-                text=True,
-                capture_output=True,
-                check=False,
-            )
-            print(proc.stdout.rstrip())
-            return proc.returncode
-
-    p = Path(resources[key])
-    content = p.read_text(encoding="utf-8", errors="replace")
-    if len(content) > args.max_bytes:
-        content = content[: args.max_bytes] + "\n[...truncated...]\n"
-    print(content.rstrip())
-    return 0
-
-
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="mingctl", add_help=True)
     p.add_argument(
@@ -859,16 +2147,31 @@ def build_parser() -> argparse.ArgumentParser:
         help="Project root (defaults to MING_ROOT / script location / auto-detect; may appear before or after subcommand)",
     )
     p.add_argument("--json", action="store_true", help="JSON output where applicable")
+    p.add_argument(
+        "--profile",
+        metavar="MODES",
+        help="Time command phases: summary, trace, cprofile, chrome or all, comma-separated (bare --profile = summary; also MING_PROFILE)",
+    )
 
     sub = p.add_subparsers(dest="cmd", required=True)
 
     install = sub.add_parser("install", help="Install mingctl into project .great-ming/")
-    install.add_argument("--force", action="store_true", help="Overwrite existing installed script")
+    install.add_argument("--force", action="store_true", help="Rewrite the installed script even if its hash matches")
+    install.add_argument(
+        "--link",
+        choices=INSTALL_LINK_MODES,
+        help="Link to a shared copy in ~/.great-ming/bin instead of copying (upgrade once for all projects)",
+    )
     install.set_defaults(func=cmd_install)
 
     init = sub.add_parser("init", help="Initialize .great-ming/ store (no script copy)")
+    init.add_argument("--backend", choices=STORE_BACKENDS, default="files", help="Storage backend for a new store")
     init.set_defaults(func=cmd_init)
 
+    which_root = sub.add_parser("which-root", help="Show how the project root is resolved (and how long it took)")
+    which_root.add_argument("--refresh", action="store_true", help="Ignore the cached root and walk parents again")
+    which_root.set_defaults(func=cmd_which_root)
+
     route = sub.add_parser("route", help="Route an imperial order (通政司路由)")
     route.add_argument("text", help="User request / edict")
     route.add_argument("--record", action="store_true", help="Append to archives.ndjson")
@@ -924,9 +2227,136 @@ def build_parser() -> argparse.ArgumentParser:
     ex.add_argument("--force", action="store_true", help="Bypass rescript authorization checks")
     ex.add_argument("--capture", action="store_true", help="Capture output snippet into archives")
     ex.add_argument("--max-capture-bytes", type=int, default=20000, help="Max captured bytes")
+    ex.add_argument("--enqueue", action="store_true", help="Queue the command for `mingctl worker` instead of running it")
+    ex.add_argument("--urgent", action="store_true", help="With --enqueue: jump the queue (default: urgent if the case was routed urgent)")
     ex.add_argument("command", nargs=argparse.REMAINDER, help="Command after --, e.g. -- git status")
     ex.set_defaults(func=cmd_exec)
 
+    worker = sub.add_parser("worker", help="Run queued exec jobs (urgent first, limited per ministry)")
+    worker.add_argument("--limit", help="Per-ministry concurrency, e.g. war=2,works=1")
+    worker.add_argument("--default-limit", type=int, default=1, help="Concurrency for ministries not in --limit")
+    worker.add_argument(
+        "--preempt",
+        choices=JOB_PREEMPT_MODES,
+        default="none",
+        help="What urgent jobs do when their ministry is full: wait, pause (SIGSTOP) or renice normal jobs",
+    )
+    worker.add_argument("--poll", type=float, default=0.2, help="Seconds between queue scans")
+    worker.add_argument("--drain", action="store_true", help="Exit once the queue is empty and all jobs finished")
+    worker.set_defaults(func=ext_command("cmd_worker"))
+
+    jobs = sub.add_parser("jobs", help="Inspect the exec job queue")
+    jobs_sub = jobs.add_subparsers(dest="jobs_cmd", required=True)
+    jobs_list = jobs_sub.add_parser("list", help="List pending jobs (--all: also recently finished)")
+    jobs_list.add_argument("--all", action="store_true", help="Include finished jobs")
+    jobs_list.add_argument("--limit", type=int, default=20, help="Max finished jobs with --all")
+    jobs_list.set_defaults(func=ext_command("cmd_jobs_list"))
+    jobs_cancel = jobs_sub.add_parser("cancel", help="Cancel a queued job or stop a running one")
+    jobs_cancel.add_argument("job_id", help="Job id")
+    jobs_cancel.set_defaults(func=ext_command("cmd_jobs_cancel"))
+
+    pipeline = sub.add_parser("pipeline", help="Case pipeline: steps with dependencies, run in parallel")
+    pipeline_sub = pipeline.add_subparsers(dest="pipeline_cmd", required=True)
+    pipeline_add = pipeline_sub.add_parser(
+        "add",
+        help="Add or replace a step of the current case's pipeline",
+        usage="mingctl pipeline add <name> --dept <dept> [options] -- <command...>",
+    )
+    pipeline_add.add_argument("name", help="Step name, e.g. lint, build, test, deploy")
+    pipeline_add.add_argument("--dept", required=True, choices=DEPARTMENTS, help="Which ministry runs this step")
+    pipeline_add.add_argument("--kind", choices=("evidence", "action"), default="action", help="evidence=取证, action=奉旨施行")
+    pipeline_add.add_argument("--needs", help="Steps that must succeed first (comma-separated)")
+    pipeline_add.add_argument("--inputs", action="append", help="Input glob for the cache key (repeatable), e.g. 'src/**/*.ts'")
+    pipeline_add.add_argument("--outputs", action="append", help="Output glob; the step is skipped when cached (repeatable)")
+    pipeline_add.add_argument("--case", help="Case id (defaults to current_case_id)")
+    # The command comes after `--` (see main); a REMAINDER positional would swallow the options after `name`.
+    pipeline_add.set_defaults(func=ext_command("cmd_pipeline_add"), command=[])
+    pipeline_remove = pipeline_sub.add_parser("remove", help="Remove a step")
+    pipeline_remove.add_argument("name", help="Step name")
+    pipeline_remove.add_argument("--case", help="Case id (defaults to current_case_id)")
+    pipeline_remove.set_defaults(func=ext_command("cmd_pipeline_remove"))
+    pipeline_show = pipeline_sub.add_parser("show", help="Show the pipeline")
+    pipeline_show.add_argument("--case", help="Case id (defaults to current_case_id)")
+    pipeline_show.set_defaults(func=ext_command("cmd_pipeline_show"))
+    pipeline_run = pipeline_sub.add_parser("run", help="Run the pipeline (or the named steps and what they need)")
+    pipeline_run.add_argument("steps", nargs="*", help="Only these steps and their dependencies")
+    pipeline_run.add_argument("--case", help="Case id (defaults to current_case_id)")
+    pipeline_run.add_argument("--max-parallel", type=int, help="Max concurrent steps (default: CPU count)")
+    pipeline_run.add_argument("--no-cache", action="store_true", help="Run steps even if their outputs are cached")
+    pipeline_run.add_argument("--force", action="store_true", help="Bypass rescript authorization checks")
+    pipeline_run.add_argument("--capture", action="store_true", help="Capture output snippets into archives")
+    pipeline_run.add_argument("--max-capture-bytes", type=int, default=20000, help="Max captured bytes per step")
+    pipeline_run.set_defaults(func=ext_command("cmd_pipeline_run"))
+
+    archive = sub.add_parser("archive", help="Archive integrity (hash chain)")
+    archive_sub = archive.add_subparsers(dest="archive_cmd", required=True)
+    archive_chain = archive_sub.add_parser("chain", help="Get/set hash chaining of new events")
+    archive_chain.add_argument("value", nargs="?", choices=("on", "off"), help="Enable or disable chaining")
+    archive_chain.set_defaults(func=ext_command("cmd_archive_chain"))
+    archive_verify = archive_sub.add_parser("verify", help="Verify the hash chain since the last checkpoint")
+    archive_verify.add_argument("--full", action="store_true", help="Rehash from the start; without it only changes from the last verified checkpoint on are caught")
+    archive_verify.set_defaults(func=ext_command("cmd_archive_verify"))
+    archive_follow = archive_sub.add_parser("follow", help="Stream new archive events (tail -f); --json for raw NDJSON")
+    archive_follow.add_argument("-n", "--lines", type=int, default=0, help="Also print the last N events first")
+    archive_follow.add_argument("--case", help="Only events of this case")
+    archive_follow.add_argument("--type", help="Only these event types (comma-separated), e.g. exec,rescript")
+    archive_follow.add_argument("--dept", choices=DEPARTMENTS, help="Only events of this ministry")
+    archive_follow.add_argument("--interval", type=float, default=1.0, help="Max poll interval when inotify is unavailable")
+    archive_follow.set_defaults(func=ext_command("cmd_archive_follow"))
+
+    compact = sub.add_parser("compact", help="Apply retention policy to archives and closed cases")
+    compact.add_argument("--full-days", type=int, help="Keep exec output snippets this many days (default 30)")
+    compact.add_argument("--pack-closed-days", type=int, help="Pack closed cases idle this many days (default 90)")
+    compact.add_argument("--temp-budget-mb", type=int, help="Max temp space for the archive rewrite (default 256)")
+    compact.add_argument("--save-policy", action="store_true", help="Persist the effective policy in state.json")
+    compact.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    compact.set_defaults(func=ext_command("cmd_compact"))
+
+    search = sub.add_parser("search", help="Full-text search over cases, records, routes and captured output")
+    search.add_argument("query", help="Text to find (use --raw for FTS5 query syntax)")
+    search.add_argument("--case", help="Only events of this case")
+    search.add_argument("--type", help="Only events of this type, e.g. exec, record")
+    search.add_argument("--limit", type=int, default=20, help="Max results")
+    search.add_argument("--raw", action="store_true", help="Pass the query to FTS5 MATCH unchanged")
+    search.add_argument("--reindex", action="store_true", help="Rebuild the index from the archive")
+    search.set_defaults(func=ext_command("cmd_search"))
+
+    court = sub.add_parser("court", help="Aggregate view across registered projects (~/.great-ming/registry)")
+    court_sub = court.add_subparsers(dest="court_cmd", required=True)
+    court_status = court_sub.add_parser("status", help="Open cases, recent failures and exec stats of all projects")
+    court_status.add_argument("--failures", type=int, default=10, help="Number of recent failures to show")
+    court_status.add_argument("--workers", type=int, default=16, help="Thread pool size")
+    court_status.set_defaults(func=ext_command("cmd_court_status"))
+    court_search = court_sub.add_parser("search", help="Full-text search across projects with a search index")
+    court_search.add_argument("query", help="Text to find")
+    court_search.add_argument("--limit", type=int, default=20, help="Max results")
+    court_search.add_argument("--raw", action="store_true", help="Pass the query to FTS5 MATCH unchanged")
+    court_search.add_argument("--workers", type=int, default=16, help="Thread pool size")
+    court_search.set_defaults(func=ext_command("cmd_court_search"))
+    court_list = court_sub.add_parser("list", help="List registered projects")
+    court_list.set_defaults(func=ext_command("cmd_court_list"))
+    court_remove = court_sub.add_parser("remove", help="Unregister a project")
+    court_remove.add_argument("path", help="Project root")
+    court_remove.set_defaults(func=ext_command("cmd_court_remove"))
+
+    metrics = sub.add_parser("metrics", help="Monitoring counters in Prometheus text format (.great-ming/metrics.prom)")
+    metrics.set_defaults(func=ext_command("cmd_metrics"))
+
+    serve = sub.add_parser("serve", help="Serve /metrics over HTTP for Prometheus")
+    serve.add_argument("--host", default="127.0.0.1", help="Bind address")
+    serve.add_argument("--port", type=int, default=METRICS_DEFAULT_PORT, help=f"Port (default {METRICS_DEFAULT_PORT}, 0 picks one)")
+    serve.add_argument("--court", action="store_true", help="Serve all registered projects (~/.great-ming/registry)")
+    serve.add_argument("--workers", type=int, default=16, help="Thread pool size for --court")
+    serve.set_defaults(func=ext_command("cmd_serve"))
+
+    storage = sub.add_parser("storage", help="Storage backend (files / sqlite)")
+    storage_sub = storage.add_subparsers(dest="storage_cmd", required=True)
+    storage_status = storage_sub.add_parser("status", help="Show backend and store size")
+    storage_status.set_defaults(func=ext_command("cmd_storage_status"))
+    storage_migrate = storage_sub.add_parser("migrate", help="Move the store to another backend")
+    storage_migrate.add_argument("--to", required=True, choices=STORE_BACKENDS, help="Target backend")
+    storage_migrate.set_defaults(func=ext_command("cmd_storage_migrate"))
+
     prompt = sub.add_parser("prompt", help="Generate prompt outputs")
     prompt_sub = prompt.add_subparsers(dest="prompt_cmd", required=True)
     morning = prompt_sub.add_parser("morning-audience", help="Morning audience summary")
@@ -938,19 +2368,29 @@ def build_parser() -> argparse.ArgumentParser:
     resources = sub.add_parser("resources", help="List/show resources (祖训/黄册)")
     resources_sub = resources.add_subparsers(dest="res_cmd", required=True)
     res_list = resources_sub.add_parser("list", help="List known resources")
-    res_list.set_defaults(func=cmd_resources_list)
+    res_list.set_defaults(func=ext_command("cmd_resources_list"))
     res_show = resources_sub.add_parser("show", help="Show a resource")
     res_show.add_argument("name", help="Resource name, e.g. ancestral-instructions, yellow-registers")
     res_show.add_argument("-n", type=int, default=30, help="For yellow-registers: number of commits")
     res_show.add_argument("--max-bytes", type=int, default=20000, help="Max bytes for file resources")
-    res_show.set_defaults(func=cmd_resources_show)
+    res_show.add_argument("--offset", type=int, help="Start reading at this byte offset")
+    res_show.add_argument("--range", help="Byte range START:END (either side optional)")
+    res_show.add_argument("--section", help="Only the markdown section with this heading (and its subsections)")
+    res_show.add_argument("--sections", action="store_true", help="List markdown headings with their byte ranges")
+    res_show.add_argument("--grep", help="Only lines matching this regex, prefixed with their byte offset")
+    res_show.set_defaults(func=ext_command("cmd_resources_show"))
 
     return p
 
 
-def extract_global_flags(argv: list[str]) -> tuple[Optional[str], bool, list[str]]:
+def is_profile_modes(token: str) -> bool:
+    items = token.lower().split(",")
+    return all(item in PROFILE_MODES or item == "all" for item in items)
+
+
+def extract_global_flags(argv: list[str]) -> tuple[Optional[str], bool, Optional[str], list[str]]:
     """
-    Extract --root/--json anywhere before a standalone `--`.
+    Extract --root/--json/--profile anywhere before a standalone `--`.
 
     This keeps CLI ergonomics flexible, e.g.:
       mingctl install --root .
@@ -960,6 +2400,7 @@ def extract_global_flags(argv: list[str]) -> tuple[Optional[str], bool, list[str
 
     root: Optional[str] = None
     json_flag = False
+    profile: Optional[str] = None
     cleaned: list[str] = []
 
     i = 0
@@ -986,22 +2427,54 @@ def extract_global_flags(argv: list[str]) -> tuple[Optional[str], bool, list[str
             i += 1
             continue
 
+        if token.startswith("--profile="):
+            profile = token.split("=", 1)[1]
+            i += 1
+            continue
+
+        if token == "--profile":
+            # Bare --profile means summary; the next token is its value only if it names modes.
+            if i + 1 < len(argv) and is_profile_modes(argv[i + 1]):
+                profile = argv[i + 1]
+                i += 2
+            else:
+                profile = "summary"
+                i += 1
+            continue
+
         cleaned.append(token)
         i += 1
 
-    return root, json_flag, cleaned
+    return root, json_flag, profile, cleaned
 
 
 def main(argv: list[str]) -> int:
     parser = build_parser()
-    root, json_flag, cleaned = extract_global_flags(argv)
+    root, json_flag, profile, cleaned = extract_global_flags(argv)
+    # Everything after the first standalone `--` is the command to run.
+    tail: Optional[list[str]] = None
+    if "--" in cleaned:
+        split = cleaned.index("--")
+        cleaned, tail = cleaned[:split], cleaned[split + 1 :]
     args = parser.parse_args(cleaned)
     args.root = root
     args.json = json_flag
-    # argparse includes the leading `--` in REMAINDER; strip it.
-    if getattr(args, "command", None) and args.command and args.command[0] == "--":
-        args.command = args.command[1:]
-    return int(args.func(args))
+    if tail is not None:
+        if not hasattr(args, "command"):
+            parser.error(f"unrecognized arguments: -- {' '.join(tail)}")
+        args.command = [*args.command, "--", *tail] if args.command else tail
+
+    modes = parse_profile_modes(profile if profile is not None else os.environ.get(PROFILE_ENV))
+    if not modes:
+        return int(args.func(args))
+    command = " ".join([args.cmd, *(str(v) for k, v in vars(args).items() if k.endswith("_cmd") and v)])
+    profiler = start_profiler(modes, command)
+    exit_code: Optional[int] = None
+    try:
+        exit_code = int(args.func(args))
+        return exit_code
+    finally:
+        profiler.finish(exit_code)
 
 
 if __name__ == "__main__":
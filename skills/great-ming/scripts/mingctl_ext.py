@@ -0,0 +1,2946 @@
+"""
+Subsystems of mingctl.py that most calls never touch: the sqlite store and
+migration, the job queue and worker, pipelines, archive verification, follow and
+compaction, search, digests and metrics, the court, and resources.
+
+mingctl.py imports this module on first use (see ext_module()), so ordinary calls
+only compile the script itself, and this file gets a cached .pyc like any import.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from mingctl import (
+    ARCHIVE_BATCH_ENV,
+    ARCHIVE_FILENAME,
+    ARCHIVE_FLUSH_MS_ENV,
+    ARCHIVE_FSYNC_ENV,
+    CASES_DIRNAME,
+    CHAIN_GENESIS,
+    COMPACT_TMP_SUFFIX,
+    DEPARTMENTS,
+    DIGEST_RECENT_FAILURES,
+    FOLD_FLUSH_MS,
+    JOB_PRIORITIES,
+    JOB_RENICE,
+    MARKDOWN_HEADING_RE,
+    METRICS_DURATION_BUCKETS,
+    METRICS_TEXTFILE_DIR_ENV,
+    PACKED_CASES_FILENAME,
+    PIPELINE_FAILURE_TAIL,
+    PIPELINE_STEP_NAME_RE,
+    REGISTRY_FILENAME,
+    RETENTION_DEFAULTS,
+    SEARCH_TEXT_FIELDS,
+    SQLITE_STORE_FILENAME,
+    STATE_FILENAME,
+    TODO_FILENAME,
+    VERIFY_STATE_FILENAME,
+    EventListener,
+    FileStore,
+    Store,
+    archive_path,
+    authorize_exec,
+    can_execute,
+    cases_dir,
+    close_archives,
+    default_state,
+    digest_path,
+    dump_json,
+    ends_chain,
+    ensure_store,
+    env_flag,
+    env_int,
+    eprint,
+    exec_event,
+    fcntl,
+    file_lock,
+    flush_archives,
+    flushing,
+    get_root,
+    get_store,
+    hash_line,
+    install_exit_hooks,
+    jobs_dir,
+    load_case,
+    load_state,
+    lock_fd,
+    metrics_state_path,
+    metrics_text_path,
+    now_iso,
+    packed_cases_path,
+    pipeline_logs_dir,
+    read_json,
+    record_denial,
+    record_event,
+    register_store,
+    render_todo,
+    resource_cache_path,
+    save_case,
+    save_state,
+    search_index_path,
+    sections_cache_path,
+    shlex_join,
+    slugify,
+    span,
+    sqlite_store_path,
+    state_path,
+    store_dir,
+    todo_path,
+    unlock_fd,
+    user_dir,
+    verify_state_path,
+    write_json,
+    write_json_atomic,
+    write_text_atomic,
+)
+
+
+class SqliteStore(Store):
+    """
+    Single-file backend: state, cases and events in .great-ming/ming.sqlite3 (WAL mode).
+
+    Each call commits on its own unless wrapped in `transaction()`; outside one, events
+    follow the same group-commit policy as ArchiveWriter (MING_ARCHIVE_BATCH /
+    MING_ARCHIVE_FLUSH_MS / MING_ARCHIVE_FSYNC) and a batch is inserted with one
+    executemany per transaction. Cursors are event row ids.
+
+    The generation is a random token in `kv`, created with the database and replaced
+    whenever event rows are rewritten in place (compact), so derived indexes rebuild
+    just as they do after the files backend swaps archives.ndjson. todo.md is
+    re-rendered from the cases table whenever a case is opened, closed or packed.
+    """
+
+    name = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS cases (
+            id TEXT PRIMARY KEY, status TEXT, updated_at TEXT, body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cases_status ON cases (status, updated_at);
+        CREATE TABLE IF NOT EXISTS packed_cases (id TEXT PRIMARY KEY, body TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, type TEXT, case_id TEXT, line TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS events_case ON events (case_id, id);
+        CREATE INDEX IF NOT EXISTS events_type ON events (type, ts);
+    """
+
+    def __init__(self, root: Path, *, path: Optional[Path] = None) -> None:
+        super().__init__(root)
+        self.path = path or sqlite_store_path(root)
+        self._db: Any = None
+        self._depth = 0
+        self._committed: list[tuple[int, dict[str, Any]]] = []
+        self._pending: list[dict[str, Any]] = []
+        # Held for whole transactions so the flush timer never interleaves with them.
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            with span("ensure_store"):
+                import sqlite3
+
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # One store per root; `court` may open it from a worker thread.
+                db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+                db.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only effective on a new file
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=FULL" if env_flag(ARCHIVE_FSYNC_ENV) else "PRAGMA synchronous=NORMAL")
+                db.executescript(self.SCHEMA)
+                db.execute("INSERT OR IGNORE INTO kv (key, value) VALUES ('generation', ?)", (str(new_generation()),))
+                self._db = db
+        return self._db
+
+    def ensure(self) -> None:
+        self.db
+        if not todo_path(self.root).exists():
+            self.write_todo()
+
+    def write_todo(self) -> None:
+        write_text_atomic(todo_path(self.root), render_todo(self.list_cases()))
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            if self._depth == 0:
+                self.db.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.db.execute("ROLLBACK")
+                    self._committed.clear()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                with span("sqlite.commit"):
+                    self.db.execute("COMMIT")
+                entries, self._committed = self._committed, []
+                if entries and self.listeners:
+                    generation = self.generation()
+                    with span("archive.listeners"):
+                        for listener in self.listeners:
+                            listener(entries, entries[-1][0] + 1, generation)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            with flushing(), span("archive.flush"), self.transaction():
+                self._insert(pending)
+
+    def close(self) -> None:
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def load_state(self) -> dict[str, Any]:
+        row = self.db.execute("SELECT value FROM kv WHERE key = 'state'").fetchone()
+        if row is None:
+            state = default_state()
+            self.save_state(state)
+            return state
+        return json.loads(row[0])
+
+    def save_state(self, state: dict[str, Any]) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES ('state', ?)",
+            (json.dumps(state, ensure_ascii=False),),
+        )
+
+    def load_case(self, case_id: str) -> Optional[dict[str, Any]]:
+        row = self.db.execute("SELECT body FROM cases WHERE id = ?", (case_id,)).fetchone()
+        if row is None:
+            row = self.db.execute("SELECT body FROM packed_cases WHERE id = ?", (case_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_case(self, case: dict[str, Any]) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO cases (id, status, updated_at, body) VALUES (?, ?, ?, ?)",
+            (case["id"], case.get("status"), case.get("updated_at"), json.dumps(case, ensure_ascii=False)),
+        )
+
+    def list_cases(self) -> list[dict[str, Any]]:
+        return [json.loads(r[0]) for r in self.db.execute("SELECT body FROM cases ORDER BY id")]
+
+    def list_packed_cases(self) -> list[dict[str, Any]]:
+        return [json.loads(r[0]) for r in self.db.execute("SELECT body FROM packed_cases ORDER BY id")]
+
+    def update_todo(self, *, case_id: str, title: str, done: bool) -> None:
+        self.write_todo()
+
+    def append_event(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            if self._depth:
+                self._insert([record])  # the enclosing transaction is the batch
+                return
+            self._pending.append(record)
+            if len(self._pending) >= max(1, env_int(ARCHIVE_BATCH_ENV, 1)):
+                self.flush()
+            else:
+                flush_ms = env_int(ARCHIVE_FLUSH_MS_ENV, 0)
+                if flush_ms and self._timer is None:
+                    self._timer = threading.Timer(flush_ms / 1000.0, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        install_exit_hooks()
+
+    def _insert(self, records: list[dict[str, Any]]) -> None:
+        self.db.executemany(
+            "INSERT INTO events (ts, type, case_id, line) VALUES (?, ?, ?, ?)",
+            [(r.get("ts"), r.get("type"), r.get("case"), json.dumps(r, ensure_ascii=False)) for r in records],
+        )
+        # Inside our write transaction the new rows hold the highest, consecutive ids.
+        last = self.db.execute("SELECT max(id) FROM events").fetchone()[0]
+        first = last - len(records) + 1
+        self._committed.extend((first + i, r) for i, r in enumerate(records))
+
+    def insert_lines(self, lines: Iterable[bytes]) -> int:
+        rows = []
+        for line in lines:
+            text = line.decode("utf-8", errors="replace")
+            try:
+                rec = json.loads(text)
+            except ValueError:
+                rec = None
+            if not isinstance(rec, dict):
+                rec = {}
+            rows.append((rec.get("ts"), rec.get("type"), rec.get("case"), text))
+        self.db.executemany("INSERT INTO events (ts, type, case_id, line) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def tail_events(self, n: int) -> list[str]:
+        self.flush()
+        if n <= 0:
+            return []
+        rows = self.db.execute("SELECT line FROM events ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+        return [r[0] for r in reversed(rows)]
+
+    def tail_cursor(self, n: int) -> int:
+        self.flush()
+        if n <= 0:
+            row = self.db.execute("SELECT max(id) FROM events").fetchone()
+            return (row[0] or 0) + 1
+        row = self.db.execute("SELECT id FROM events ORDER BY id DESC LIMIT 1 OFFSET ?", (n - 1,)).fetchone()
+        return row[0] if row else 0
+
+    def iter_lines(self, start: int) -> Iterator[tuple[int, int, bytes]]:
+        self.flush()
+        cur = self.db.execute("SELECT id, line FROM events WHERE id >= ? ORDER BY id", (start,))
+        for event_id, line in cur:
+            yield event_id, event_id + 1, line.encode("utf-8")
+
+    def generation(self) -> int:
+        # Read every time: another process may have compacted since our last look.
+        return int(self.db.execute("SELECT value FROM kv WHERE key = 'generation'").fetchone()[0])
+
+    def bump_generation(self, generation: Optional[int] = None) -> None:
+        if generation is None:
+            generation = new_generation()
+        self.db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES ('generation', ?)", (str(generation),))
+
+    def compact_events(self, *, cutoff: str, budget_bytes: int, dry_run: bool) -> dict[str, Any]:
+        """
+        Drop old exec output snippets in batches sized to the temp budget.
+
+        Each batch commits and checkpoints the WAL, so the WAL never holds more than
+        about one batch of rewritten rows; freed pages are then returned incrementally.
+        """
+
+        self.flush()
+        stats: dict[str, Any] = {"events": 0, "snippets_dropped": 0, "bytes_before": self.path.stat().st_size}
+        stats["events"] = self.db.execute("SELECT count(*) FROM events").fetchone()[0]
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                "SELECT id, line FROM events WHERE type = 'exec' AND ts < ? AND id > ? ORDER BY id LIMIT 1000",
+                (cutoff, last_id),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            batch_bytes = 0
+            for event_id, line in rows:
+                rec = json.loads(line)
+                data = rec.get("data")
+                if not isinstance(data, dict) or data.get("output_snippet") is None:
+                    continue
+                if "prev" in rec:
+                    continue  # imported hash-chained line: rewriting it would break the chain
+
+                data["output_snippet"] = None
+                data["output_compacted"] = True
+                new_line = json.dumps(rec, ensure_ascii=False)
+                updates.append((new_line, event_id))
+                batch_bytes += len(new_line.encode("utf-8"))
+            if batch_bytes > budget_bytes:
+                raise SystemExit(f"Compaction exceeds temp budget ({budget_bytes} bytes); raise --temp-budget-mb")
+            stats["snippets_dropped"] += len(updates)
+            if dry_run or not updates:
+                continue
+            with self.transaction():
+                generation = new_generation()
+                carry_folds(self.root, generation, self.tail_cursor(0))  # row ids survive compaction
+                self.db.executemany("UPDATE events SET line = ? WHERE id = ?", updates)
+                self.bump_generation(generation)
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if not dry_run:
+            self.db.execute("PRAGMA incremental_vacuum")
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        stats["bytes_after"] = self.path.stat().st_size
+        return stats
+
+    def pack_closed_cases(self, *, cutoff: str, dry_run: bool) -> list[str]:
+        ids = [
+            r[0]
+            for r in self.db.execute(
+                "SELECT id FROM cases WHERE status = 'closed' AND updated_at < ? ORDER BY id", (cutoff,)
+            )
+        ]
+        if ids and not dry_run:
+            with self.transaction():
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO packed_cases (id, body) SELECT id, body FROM cases WHERE id = ?",
+                    [(i,) for i in ids],
+                )
+                self.db.executemany("DELETE FROM cases WHERE id = ?", [(i,) for i in ids])
+            self.write_todo()
+        return ids
+
+
+def new_generation() -> int:
+    return int.from_bytes(os.urandom(6), "big")
+
+
+def enqueue_exec(root: Path, args: argparse.Namespace, *, case_id: Optional[str]) -> int:
+    urgent = bool(args.urgent)
+    if case_id and not urgent:
+        case = get_store(root).load_case(case_id)
+        urgent = bool(case) and case.get("urgency") == "urgent"
+    ts = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    job = {
+        "id": f"{ts}-{args.dept}-{os.getpid()}",
+        "seq": time.time_ns(),
+        "status": "queued",
+        "priority": "urgent" if urgent else "normal",
+        "case": case_id,
+        "dept": args.dept,
+        "kind": args.kind,
+        "command": args.command,
+        "forced": bool(args.force),
+        "capture": bool(args.capture),
+        "max_capture_bytes": args.max_capture_bytes,
+        "enqueued_at": now_iso(),
+    }
+    JobQueue(root).add(job)
+    if args.json:
+        print(dump_json(job))
+    else:
+        print(f"[QUEUED] {job['id']} ({job['priority']}, {args.dept}): {shlex_join(args.command)}")
+    return 0
+
+
+def job_order(job: dict[str, Any]) -> tuple[int, int]:
+    priority = job.get("priority")
+    return (JOB_PRIORITIES.index(priority) if priority in JOB_PRIORITIES else len(JOB_PRIORITIES), int(job.get("seq") or 0))
+
+
+class JobQueue:
+    """
+    One JSON file per job under .great-ming/jobs/, moved to jobs/done/ when finished, so the
+    queue survives restarts and the worker only rescans pending work. State changes of
+    pending jobs happen under jobs/queue.lock.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.dir = jobs_dir(root)
+        self.done_dir = self.dir / "done"
+
+    def lock(self) -> Any:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        return file_lock(self.dir / "queue.lock")
+
+    def path(self, job_id: str) -> Path:
+        return self.dir / f"{job_id}.json"
+
+    def log_path(self, job_id: str) -> Path:
+        return self.dir / f"{job_id}.log"
+
+    def add(self, job: dict[str, Any]) -> None:
+        with self.lock():
+            # Ids are per second and pid, so a second enqueue from the same process would overwrite the first.
+            base, n = job["id"], 1
+            while self.path(job["id"]).exists() or (self.done_dir / f"{job['id']}.json").exists():
+                n += 1
+                job["id"] = f"{base}-{n}"
+            write_json_atomic(self.path(job["id"]), job)
+
+    def save(self, job: dict[str, Any]) -> None:
+        write_json_atomic(self.path(job["id"]), job)
+
+    def pending(self) -> list[dict[str, Any]]:
+        return sorted(self._read_dir(self.dir), key=job_order)
+
+    def finished(self) -> list[dict[str, Any]]:
+        return sorted(self._read_dir(self.done_dir), key=lambda j: int(j.get("seq") or 0))
+
+    def finish(self, job: dict[str, Any]) -> None:
+        self.done_dir.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.done_dir / f"{job['id']}.json", job)
+        if self.log_path(job["id"]).exists():
+            os.replace(str(self.log_path(job["id"])), str(self.done_dir / f"{job['id']}.log"))
+        self.path(job["id"]).unlink(missing_ok=True)
+
+    @staticmethod
+    def _read_dir(path: Path) -> list[dict[str, Any]]:
+        jobs = []
+        for job_file in path.glob("*.json"):
+            try:
+                jobs.append(read_json(job_file))
+            except (OSError, ValueError):
+                continue  # half-written by a crashed process; ignored until removed
+        return jobs
+
+
+@dataclass
+class RunningJob:
+    job: dict[str, Any]
+    proc: subprocess.Popen
+    log: Any
+    started: float
+    paused_at: Optional[float] = None
+    paused_ms: int = 0
+    reniced: bool = False
+    terminated: bool = False
+
+
+def parse_job_limits(raw: Optional[str]) -> dict[str, int]:
+    limits: dict[str, int] = {}
+    for item in (raw or "").split(","):
+        if not item.strip():
+            continue
+        dept, sep, value = item.partition("=")
+        dept = dept.strip()
+        if not sep or dept not in DEPARTMENTS or not value.strip().isdigit() or int(value) < 1:
+            raise SystemExit(f"Invalid --limit entry: {item!r} (expected e.g. war=2,works=1)")
+        limits[dept] = int(value)
+    return limits
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def signal_job(pid: int, signum: int) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(pid, signum)  # jobs run in their own session: pgid == pid
+        else:
+            os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+class Worker:
+    """
+    Runs queued exec jobs with a concurrency limit per ministry. Urgent jobs are dispatched
+    first; with `preempt` they may also pause (SIGSTOP) or renice running normal jobs of
+    the same ministry instead of waiting for a free slot.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        limits: dict[str, int],
+        default_limit: int,
+        preempt: str,
+        poll: float,
+        drain: bool,
+    ) -> None:
+        self.root = root
+        self.queue = JobQueue(root)
+        self.limits = limits
+        self.default_limit = max(1, default_limit)
+        self.preempt = preempt
+        self.poll = poll
+        self.drain = drain
+        self.running: dict[str, RunningJob] = {}
+        self.stopping = False
+        self.aborting = False
+
+    def limit(self, dept: str) -> int:
+        return self.limits.get(dept, self.default_limit)
+
+    def active(self, dept: str) -> list[RunningJob]:
+        return [r for r in self.running.values() if r.job["dept"] == dept and r.paused_at is None]
+
+    def run(self) -> int:
+        self.recover()
+        while True:
+            self.reap()
+            if self.aborting:
+                self.terminate_all()
+            waiting = [] if self.stopping else self.dispatch()
+            if self.stopping:
+                for r in self.running.values():
+                    if r.paused_at is not None:
+                        self.resume(r)
+            if not self.running and (self.stopping or (self.drain and not waiting)):
+                return 0
+            flush_folds(only_due=True)
+            time.sleep(self.poll)
+
+    def recover(self) -> None:
+        """
+        Jobs still marked running/paused belong to a worker that died: their exit status is
+        lost, so they are archived as interrupted rather than silently re-run.
+        """
+
+        with self.queue.lock():
+            for job in self.queue.pending():
+                if job.get("status") not in ("running", "paused"):
+                    continue
+                pid = job.get("pid")
+                alive = bool(pid) and pid_alive(int(pid))
+                if alive and job["status"] == "paused" and hasattr(signal, "SIGCONT"):
+                    signal_job(int(pid), signal.SIGCONT)
+                reason = "worker exited while the job was running"
+                if alive:
+                    reason += f"; process {pid} was left running"
+                payload = exec_event(
+                    kind=job["kind"],
+                    dept=job["dept"],
+                    command=job["command"],
+                    exit_code=None,
+                    duration_ms=0,
+                    forced=bool(job.get("forced")),
+                    captured=False,
+                    output_snippet=None,
+                )
+                payload.update({"job": job["id"], "priority": job.get("priority"), "interrupted": True})
+                record_event(self.root, "exec", payload, case_id=job.get("case"))
+                job.update({"status": "interrupted", "reason": reason, "finished_at": now_iso()})
+                self.queue.finish(job)
+                eprint(f"[INTERRUPTED] {job['id']}: {reason}")
+
+    def dispatch(self) -> list[dict[str, Any]]:
+        waiting: list[dict[str, Any]] = []
+        with self.queue.lock():
+            queued = [j for j in self.queue.pending() if j.get("status") == "queued"]
+            urgent_depts = {j["dept"] for j in queued if j.get("priority") == "urgent"}
+            urgent_depts.update(r.job["dept"] for r in self.running.values() if r.job.get("priority") == "urgent")
+            for r in list(self.running.values()):
+                dept = r.job["dept"]
+                if r.paused_at is not None and dept not in urgent_depts and len(self.active(dept)) < self.limit(dept):
+                    self.resume(r)
+            for job in queued:
+                if self.has_slot(job):
+                    self.start(job)
+                else:
+                    waiting.append(job)
+        return waiting
+
+    def has_slot(self, job: dict[str, Any]) -> bool:
+        dept = job["dept"]
+        active = self.active(dept)
+        if len(active) < self.limit(dept):
+            return True
+        if job.get("priority") != "urgent" or self.preempt == "none":
+            return False
+        normal = sorted((r for r in active if r.job.get("priority") != "urgent"), key=lambda r: r.started, reverse=True)
+        if not normal:
+            return False
+        if self.preempt == "pause":
+            self.pause(normal[0])
+            return True
+        # renice: normal jobs keep running at a lower priority; urgent jobs still share the limit.
+        if len(active) - len(normal) >= self.limit(dept):
+            return False
+        for r in normal:
+            self.renice(r)
+        return True
+
+    def start(self, job: dict[str, Any]) -> None:
+        try:
+            # The rescript may have changed since the job was queued (e.g. 留中/暂缓).
+            authorize_exec(
+                self.root,
+                case_id=job.get("case"),
+                dept=job["dept"],
+                kind=job["kind"],
+                force=bool(job.get("forced")),
+                command=job["command"],
+            )
+        except SystemExit as e:
+            job.update({"status": "denied", "reason": str(e), "finished_at": now_iso()})
+            self.queue.finish(job)
+            eprint(f"[DENIED] {job['id']}: {e}")
+            return
+
+        log = self.queue.log_path(job["id"]).open("wb")
+        try:
+            with span("child.spawn"):
+                proc = subprocess.Popen(
+                    job["command"],
+                    cwd=self.root,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                )
+        except OSError as e:
+            log.close()
+            job.update({"status": "failed", "reason": f"Command not found: {job['command'][0]} ({e})", "finished_at": now_iso()})
+            self.queue.finish(job)
+            eprint(f"[FAILED] {job['id']}: {job['reason']}")
+            return
+
+        job.update({"status": "running", "pid": proc.pid, "worker": os.getpid(), "started_at": now_iso()})
+        self.queue.save(job)
+        self.running[job["id"]] = RunningJob(job=job, proc=proc, log=log, started=time.time())
+        eprint(f"[START] {job['id']} ({job.get('priority')}, {job['dept']}): {shlex_join(job['command'])}")
+
+    def pause(self, r: RunningJob) -> None:
+        signal_job(r.proc.pid, signal.SIGSTOP)
+        r.paused_at = time.time()
+        r.job["status"] = "paused"
+        self.queue.save(r.job)
+        eprint(f"[PAUSE] {r.job['id']} (urgent work waiting in {r.job['dept']})")
+
+    def resume(self, r: RunningJob) -> None:
+        signal_job(r.proc.pid, signal.SIGCONT)
+        r.paused_ms += int((time.time() - (r.paused_at or time.time())) * 1000)
+        r.paused_at = None
+        r.job["status"] = "running"
+        self.queue.save(r.job)
+        eprint(f"[RESUME] {r.job['id']}")
+
+    def renice(self, r: RunningJob) -> None:
+        if r.reniced:
+            return
+        r.reniced = True
+        try:
+            # Lowering priority needs no privileges; it is not raised back afterwards.
+            os.setpriority(os.PRIO_PGRP, r.proc.pid, max(JOB_RENICE, os.getpriority(os.PRIO_PGRP, r.proc.pid)))
+        except OSError:
+            return
+        eprint(f"[RENICE] {r.job['id']} -> nice {JOB_RENICE}")
+
+    def reap(self) -> None:
+        for job_id, r in list(self.running.items()):
+            code = r.proc.poll()
+            if code is None:
+                continue
+            del self.running[job_id]
+            self.complete(r, code)
+
+    def complete(self, r: RunningJob, code: int) -> None:
+        r.log.close()
+        job = r.job
+        finished = time.time()
+        if r.paused_at is not None:
+            r.paused_ms += int((finished - r.paused_at) * 1000)
+        output_snippet = None
+        if job.get("capture"):
+            limit = int(job.get("max_capture_bytes") or 0)
+            with self.queue.log_path(job["id"]).open("rb") as f:
+                data = f.read(limit + 1)
+            output_snippet = data[:limit].decode("utf-8", "replace")
+            if len(data) > limit:
+                output_snippet += "\n[...truncated...]\n"
+
+        payload = exec_event(
+            kind=job["kind"],
+            dept=job["dept"],
+            command=job["command"],
+            exit_code=code,
+            duration_ms=int((finished - r.started) * 1000),
+            forced=bool(job.get("forced")),
+            captured=bool(job.get("capture")),
+            output_snippet=output_snippet,
+        )
+        payload.update(
+            {
+                "job": job["id"],
+                "priority": job.get("priority"),
+                "queued_ms": max(0, int((r.started - int(job.get("seq") or 0) / 1e9) * 1000)),
+                "paused_ms": r.paused_ms,
+            }
+        )
+        record_event(self.root, "exec", payload, case_id=job.get("case"))
+        job.update(
+            {
+                "status": "done" if code == 0 else "failed",
+                "exit_code": code,
+                "duration_ms": payload["duration_ms"],
+                "paused_ms": r.paused_ms,
+                "finished_at": now_iso(),
+            }
+        )
+        with self.queue.lock():
+            self.queue.finish(job)
+        eprint(f"[DONE] {job['id']} exit={code} ({payload['duration_ms']} ms)")
+
+    def terminate_all(self) -> None:
+        for r in self.running.values():
+            if r.terminated:
+                continue
+            r.terminated = True
+            if r.paused_at is not None:
+                signal_job(r.proc.pid, signal.SIGCONT)
+            signal_job(r.proc.pid, signal.SIGTERM)
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    ensure_store(root)
+    if args.preempt == "pause" and not hasattr(signal, "SIGSTOP"):
+        raise SystemExit("--preempt pause is not supported on this platform")
+    if args.preempt == "renice" and not hasattr(os, "setpriority"):
+        raise SystemExit("--preempt renice is not supported on this platform")
+
+    worker = Worker(
+        root,
+        limits=parse_job_limits(args.limit),
+        default_limit=args.default_limit,
+        preempt=args.preempt,
+        poll=max(0.01, args.poll),
+        drain=bool(args.drain),
+    )
+    jobs_dir(root).mkdir(parents=True, exist_ok=True)
+    lock = os.open(str(jobs_dir(root) / "worker.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SystemExit("Another worker is already running for this project")
+
+    def on_signal(signum: int, frame: Any) -> None:
+        if worker.stopping:
+            worker.aborting = True
+            eprint("[WORKER] terminating running jobs")
+            return
+        worker.stopping = True
+        eprint("[WORKER] stopping: waiting for running jobs (signal again to terminate them)")
+
+    for name in ("SIGINT", "SIGTERM"):
+        signal.signal(getattr(signal, name), on_signal)
+
+    eprint(f"[WORKER] {root} (default limit {worker.default_limit}, preempt {args.preempt})")
+    try:
+        return worker.run()
+    finally:
+        os.close(lock)
+
+
+def cmd_jobs_list(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    queue = JobQueue(root)
+    jobs = (queue.finished()[-args.limit :] if args.all else []) + queue.pending()
+    if args.json:
+        print(dump_json(jobs))
+        return 0
+    for job in jobs:
+        exit_code = f" exit={job['exit_code']}" if job.get("exit_code") is not None else ""
+        print(f"- {job['id']} [{job.get('status')}] {job.get('priority')} {job['dept']}{exit_code}: {shlex_join(job['command'])}")
+    if not jobs:
+        print("(no jobs)")
+    return 0
+
+
+def cmd_jobs_cancel(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    queue = JobQueue(root)
+    with queue.lock():
+        try:
+            job = read_json(queue.path(args.job_id))
+        except (OSError, ValueError):
+            raise SystemExit(f"Job not pending: {args.job_id}")
+        if job.get("status") == "queued":
+            job.update({"status": "cancelled", "finished_at": now_iso()})
+            queue.finish(job)
+            message = f"[OK] Cancelled {job['id']}"
+        else:
+            # Running jobs are stopped and the worker archives them with the signal's exit code.
+            if job.get("status") == "paused" and hasattr(signal, "SIGCONT"):
+                signal_job(int(job["pid"]), signal.SIGCONT)
+            signal_job(int(job["pid"]), signal.SIGTERM)
+            message = f"[OK] Sent SIGTERM to {job['id']} (pid {job['pid']})"
+    if args.json:
+        print(dump_json(job))
+    else:
+        print(message)
+    return 0
+
+
+def pipeline_case(root: Path, args: argparse.Namespace) -> dict[str, Any]:
+    case_id = args.case or load_state(root).get("current_case_id")
+    if not case_id:
+        raise SystemExit("No case selected (use `case open --set-current` or pass --case)")
+    return load_case(root, case_id)
+
+
+def split_names(raw: Optional[str]) -> list[str]:
+    return [n.strip() for n in (raw or "").split(",") if n.strip()]
+
+
+def cmd_pipeline_add(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    if not PIPELINE_STEP_NAME_RE.match(args.name):
+        raise SystemExit(f"Invalid step name: {args.name!r} (letters, digits, '.', '_', '-')")
+    if not args.command:
+        raise SystemExit("Missing command (use: mingctl pipeline add <name> --dept <dept> -- <command...>)")
+
+    with get_store(root).transaction():
+        case = pipeline_case(root, args)
+        steps = (case.get("pipeline") or {}).get("steps") or []
+        names = [s["name"] for s in steps]
+        # A step may only need steps defined before it, which keeps the graph acyclic.
+        earlier = names[: names.index(args.name)] if args.name in names else names
+        needs = split_names(args.needs)
+        unknown = [n for n in needs if n not in earlier]
+        if unknown:
+            raise SystemExit(f"Unknown step(s) in --needs: {', '.join(unknown)} (add the steps they name first)")
+
+        step = {
+            "name": args.name,
+            "dept": args.dept,
+            "kind": args.kind,
+            "command": args.command,
+            "needs": needs,
+            "inputs": args.inputs or [],
+            "outputs": args.outputs or [],
+        }
+        if args.name in names:
+            steps[names.index(args.name)] = step
+        else:
+            steps.append(step)
+        case["pipeline"] = {"steps": steps}
+        case["updated_at"] = now_iso()
+        save_case(root, case)
+        record_event(root, "pipeline_step", {"action": "set", **step}, case_id=case["id"])
+
+    if args.json:
+        print(dump_json(step))
+    else:
+        after = f" after {', '.join(needs)}" if needs else ""
+        print(f"[OK] Step {args.name} ({args.dept}, {args.kind}){after}: {shlex_join(args.command)}")
+    return 0
+
+
+def cmd_pipeline_remove(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    with get_store(root).transaction():
+        case = pipeline_case(root, args)
+        steps = (case.get("pipeline") or {}).get("steps") or []
+        if args.name not in [s["name"] for s in steps]:
+            raise SystemExit(f"Step not found: {args.name}")
+        dependents = [s["name"] for s in steps if args.name in s.get("needs", [])]
+        if dependents:
+            raise SystemExit(f"Step {args.name} is needed by: {', '.join(dependents)}")
+        case["pipeline"] = {"steps": [s for s in steps if s["name"] != args.name]}
+        case["updated_at"] = now_iso()
+        save_case(root, case)
+        record_event(root, "pipeline_step", {"action": "remove", "name": args.name}, case_id=case["id"])
+    print(f"[OK] Removed step {args.name}")
+    return 0
+
+
+def cmd_pipeline_show(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    case = pipeline_case(root, args)
+    steps = (case.get("pipeline") or {}).get("steps") or []
+    if args.json:
+        print(dump_json(steps))
+        return 0
+    for step in steps:
+        after = f" <- {', '.join(step['needs'])}" if step.get("needs") else ""
+        print(f"- {step['name']} ({step['dept']}, {step['kind']}){after}: {shlex_join(step['command'])}")
+    if not steps:
+        print("(no pipeline steps)")
+    return 0
+
+
+def select_steps(steps: list[dict[str, Any]], targets: list[str]) -> list[dict[str, Any]]:
+    by_name = {s["name"]: s for s in steps}
+    missing = [t for t in targets if t not in by_name]
+    if missing:
+        raise SystemExit(f"Step not found: {', '.join(missing)}")
+    if not targets:
+        return steps
+    wanted: set[str] = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name].get("needs", []))
+    return [s for s in steps if s["name"] in wanted]
+
+
+def step_cache_key(root: Path, step: dict[str, Any], upstream: list[str]) -> str:
+    """
+    Hash of the step definition, the contents of its input files and the keys of the
+    steps it needs, so a change upstream invalidates everything downstream.
+    """
+
+    h = hashlib.sha256()
+    h.update(json.dumps([step["dept"], step["kind"], step["command"], upstream], ensure_ascii=False).encode("utf-8"))
+    for pattern in step.get("inputs", []):
+        for path in sorted(root.glob(pattern)):
+            if not path.is_file():
+                continue
+            h.update(str(path.relative_to(root)).encode("utf-8") + b"\0")
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+def outputs_present(root: Path, step: dict[str, Any]) -> bool:
+    outputs = step.get("outputs") or []
+    return bool(outputs) and all(next(iter(root.glob(pattern)), None) is not None for pattern in outputs)
+
+
+def critical_path(steps: list[dict[str, Any]], timings: dict[str, dict[str, Any]]) -> tuple[list[str], int]:
+    """
+    Longest chain of `needs` by step duration: the part of the run more parallelism
+    cannot shorten.
+    """
+
+    best: dict[str, tuple[int, list[str]]] = {}
+    for step in steps:  # definition order is a topological order
+        name = step["name"]
+        if name not in timings:
+            continue
+        prior = max((best[n] for n in step.get("needs", []) if n in best), key=lambda b: b[0], default=(0, []))
+        best[name] = (prior[0] + int(timings[name].get("duration_ms") or 0), prior[1] + [name])
+    if not best:
+        return [], 0
+    total, path = max(best.values(), key=lambda b: b[0])
+    return path, total
+
+
+def read_log_tail(path: Path, n: int) -> list[str]:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace").splitlines()[-n:]
+    except OSError:
+        return []
+
+
+def run_pipeline(
+    root: Path,
+    case: dict[str, Any],
+    steps: list[dict[str, Any]],
+    *,
+    max_parallel: int,
+    use_cache: bool,
+    capture: bool,
+    max_capture_bytes: int,
+    forced: bool,
+) -> dict[str, Any]:
+    # Milliseconds too: back-to-back runs from one process must not share a run id (and logs).
+    now = datetime.now(timezone.utc)
+    run_id = f"{now.strftime('%Y%m%d-%H%M%S')}-{now.microsecond // 1000:03d}-{os.getpid()}"
+    logs = pipeline_logs_dir(root)
+    logs.mkdir(parents=True, exist_ok=True)
+    by_name = {s["name"]: s for s in steps}
+    pending = dict(by_name)
+    running: dict[str, tuple[subprocess.Popen, Any, float]] = {}
+    status: dict[str, str] = {}
+    timings: dict[str, dict[str, Any]] = {}
+    keys: dict[str, str] = {}
+    run_started = time.time()
+
+    def log_path(name: str) -> Path:
+        # Per run, so concurrent or repeated runs of a step never share a log.
+        return logs / f"{case['id']}.{run_id}.{name}.log"
+
+    def finish(name: str, code: Optional[int], started: float, *, error: Optional[str] = None) -> None:
+        step = by_name[name]
+        finished = time.time()
+        log_file = log_path(name)
+        output_snippet = None
+        if capture and error is None:
+            with log_file.open("rb") as f:
+                data = f.read(max_capture_bytes + 1)
+            output_snippet = data[:max_capture_bytes].decode("utf-8", "replace")
+            if len(data) > max_capture_bytes:
+                output_snippet += "\n[...truncated...]\n"
+        payload = exec_event(
+            kind=step["kind"],
+            dept=step["dept"],
+            command=step["command"],
+            exit_code=code,
+            duration_ms=int((finished - started) * 1000),
+            forced=forced,
+            captured=capture,
+            output_snippet=output_snippet,
+        )
+        payload.update({"pipeline": run_id, "step": name})
+        if error is not None:
+            payload["error"] = error
+        record_event(root, "exec", payload, case_id=case["id"])
+        status[name] = "ok" if code == 0 else "failed"
+        timings[name] = {
+            "status": status[name],
+            "start_ms": int((started - run_started) * 1000),
+            "duration_ms": payload["duration_ms"],
+            "exit_code": code,
+        }
+        if code == 0:
+            print(f"[OK] {name} ({payload['duration_ms']} ms)")
+        elif error is not None:
+            print(f"[FAIL] {name}: {error}")
+        else:
+            print(f"[FAIL] {name} exit={code} ({payload['duration_ms']} ms), log: {log_file}")
+            for line in read_log_tail(log_file, PIPELINE_FAILURE_TAIL):
+                eprint(f"    {line}")
+
+    while pending or running:
+        for name, (proc, log, started) in list(running.items()):
+            code = proc.poll()
+            if code is None:
+                continue
+            log.close()
+            del running[name]
+            finish(name, code, started)
+
+        for name, step in list(pending.items()):
+            needs = step.get("needs", [])
+            blocked = [n for n in needs if status.get(n) in ("failed", "skipped")]
+            if blocked:
+                del pending[name]
+                status[name] = "skipped"
+                print(f"[SKIP] {name} (needs {', '.join(blocked)})")
+                continue
+            if not all(status.get(n) in ("ok", "cached") for n in needs):
+                continue
+            if name not in keys:
+                keys[name] = step_cache_key(root, step, [keys[n] for n in needs])
+            if use_cache and step.get("cache_key") == keys[name] and outputs_present(root, step):
+                del pending[name]
+                status[name] = "cached"
+                timings[name] = {"status": "cached", "start_ms": int((time.time() - run_started) * 1000), "duration_ms": 0}
+                print(f"[CACHED] {name}")
+                continue
+            if len(running) >= max_parallel:
+                continue
+
+            del pending[name]
+            log = log_path(name).open("wb")
+            started = time.time()
+            try:
+                with span("child.spawn"):
+                    proc = subprocess.Popen(step["command"], cwd=root, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+            except OSError as e:
+                log.close()
+                finish(name, None, started, error=f"Command not found: {step['command'][0]} ({e})")
+                continue
+            running[name] = (proc, log, started)
+            print(f"[START] {name} ({step['dept']}): {shlex_join(step['command'])}")
+
+        if running:
+            time.sleep(0.01)
+
+    path, path_ms = critical_path(steps, timings)
+    failed = [n for n, st in status.items() if st in ("failed", "skipped")]
+    return {
+        "run": run_id,
+        "status": "failed" if failed else "ok",
+        "wall_ms": int((time.time() - run_started) * 1000),
+        "steps": {s["name"]: timings.get(s["name"], {"status": status.get(s["name"])}) for s in steps},
+        "critical_path": path,
+        "critical_path_ms": path_ms,
+        "cache_keys": {n: keys[n] for n, st in status.items() if st == "ok" and n in keys},
+    }
+
+
+def cmd_pipeline_run(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    case = pipeline_case(root, args)
+    steps = select_steps((case.get("pipeline") or {}).get("steps") or [], args.steps)
+    if not steps:
+        raise SystemExit("No pipeline steps (use `mingctl pipeline add`)")
+
+    if not args.force:
+        denied = []
+        for step in steps:
+            if step["kind"] != "action":
+                continue
+            ok, reason = can_execute(case, step["dept"])
+            if not ok:
+                denied.append(f"{step['name']} ({step['dept']}): {reason}")
+                record_denial(
+                    root, case, dept=step["dept"], kind=step["kind"], command=step["command"], reason=reason, tags={"step": step["name"]}
+                )
+        if denied:
+            raise SystemExit("Not authorized by rescript:\n  " + "\n  ".join(denied) + "\n(use --force to override)")
+
+    summary = run_pipeline(
+        root,
+        case,
+        steps,
+        max_parallel=max(1, args.max_parallel or os.cpu_count() or 1),
+        use_cache=not args.no_cache,
+        capture=bool(args.capture),
+        max_capture_bytes=args.max_capture_bytes,
+        forced=bool(args.force),
+    )
+    cache_keys = summary.pop("cache_keys")
+    with get_store(root).transaction():
+        record_event(root, "pipeline_run", summary, case_id=case["id"])
+        if cache_keys:
+            fresh = load_case(root, case["id"])
+            for step in (fresh.get("pipeline") or {}).get("steps") or []:
+                if step["name"] in cache_keys and step.get("outputs"):
+                    step["cache_key"] = cache_keys[step["name"]]
+            save_case(root, fresh)
+
+    if args.json:
+        print(dump_json(summary))
+    else:
+        path = " -> ".join(summary["critical_path"]) or "-"
+        print(f"[PIPELINE] {summary['status']} in {summary['wall_ms']} ms; critical path {path} ({summary['critical_path_ms']} ms)")
+    return 0 if summary["status"] == "ok" else 1
+
+
+def verify_archive(root: Path, *, full: bool = False) -> dict[str, Any]:
+    """
+    Check the archive hash chain, resuming after the last verified checkpoint.
+
+    Resuming re-hashes only the checkpoint line and checks the file still reaches
+    the end of the last verified run. Truncation and edits from the checkpoint on
+    surface; an edit earlier in the prefix is only found with `full`.
+    """
+
+    flush_archives()
+    path = archive_path(root)
+    anchor = None
+    if not full and verify_state_path(root).exists():
+        anchor = read_json(verify_state_path(root))
+
+    result: dict[str, Any] = {"ok": True, "from_offset": 0, "end_offset": 0, "checked": 0}
+
+    def broken(offset: int, reason: str) -> dict[str, Any]:
+        result.update({"ok": False, "broken_offset": offset, "reason": reason})
+        return result
+
+    with path.open("rb") as f:
+        prev_hash = CHAIN_GENESIS
+        prev_seq = 0
+        prev_start = 0
+        chained = False
+        offset = 0
+        if anchor:
+            result["from_offset"] = anchor["line_start"]
+            f.seek(anchor["line_start"])
+            line = f.readline()
+            if f.tell() != anchor["offset"] or not line.endswith(b"\n") or hash_line(line[:-1]) != anchor["hash"]:
+                return broken(anchor["line_start"], "verified checkpoint was modified or truncated")
+            size = os.fstat(f.fileno()).st_size
+            verified_end = anchor.get("verified_end", anchor["offset"])
+            if size < verified_end:
+                return broken(size, f"archive truncated below the verified end ({verified_end})")
+            prev_hash = anchor["hash"]
+            prev_seq = anchor["seq"]
+            prev_start = anchor["line_start"]
+            chained = True
+            offset = anchor["offset"]
+
+        last_checkpoint: Optional[dict[str, Any]] = None
+        for line in f:
+            line_start = offset
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                return broken(line_start, "incomplete trailing line")
+            body = line[:-1]
+            try:
+                rec = json.loads(body)
+            except ValueError:
+                return broken(line_start, "invalid JSON")
+            if "prev" in rec:
+                if rec["prev"] != prev_hash:
+                    # The line before no longer hashes to what its successor recorded.
+                    return broken(prev_start, f"line modified (prev hash mismatch at offset {line_start})")
+                if chained and rec.get("seq") != prev_seq + 1:
+                    return broken(line_start, f"seq gap (expected {prev_seq + 1}, got {rec.get('seq')})")
+                chained = True
+                prev_seq = rec.get("seq") or 0
+                result["checked"] += 1
+                if rec.get("type") == "checkpoint":
+                    last_checkpoint = {"line_start": line_start, "offset": offset, "hash": hash_line(body), "seq": prev_seq}
+                if ends_chain(rec):
+                    chained = False
+            elif chained:
+                return broken(line_start, "unchained event after chain start")
+            prev_hash = hash_line(body)
+            prev_start = line_start
+        result["end_offset"] = offset
+
+    checkpoint = last_checkpoint or anchor
+    if checkpoint:
+        write_json(verify_state_path(root), {**checkpoint, "verified_end": result["end_offset"]})
+        result["checkpoint_seq"] = checkpoint["seq"]
+    return result
+
+
+def require_file_store(root: Path, feature: str) -> None:
+    backend = get_store(root).name
+    if backend != "files":
+        raise SystemExit(f"`{feature}` works on the archives.ndjson file; this store uses the {backend} backend")
+
+
+def cmd_archive_chain(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    state = load_state(root)
+    require_file_store(root, "archive chain")
+    if args.value:
+        enabled = args.value == "on"
+        # The event itself switches every writer: chaining starts at the one that
+        # enables it and ends after the one that disables it. state.json only reports it.
+        record_event(root, "archive_chain", {"enabled": enabled}, case_id=None)
+        flush_archives()
+        state["archive_chain"] = enabled
+        save_state(root, state)
+    enabled = bool(state.get("archive_chain"))
+    if args.json:
+        print(dump_json({"archive_chain": enabled}))
+    else:
+        print("on" if enabled else "off")
+    return 0
+
+
+class ArchiveWatcher:
+    """
+    Blocks until the store directory changes: inotify on Linux, else adaptive stat polling.
+
+    The directory (not the file) is watched so a swapped-in archive is noticed too.
+    """
+
+    IN_MODIFY = 0x002
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IDLE_CHECK_SECONDS = 30.0
+
+    def __init__(self, directory: Path, *, min_interval: float = 0.1, max_interval: float = 1.0) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.woke = False
+        self.fd = self._inotify(directory)
+
+    def _inotify(self, directory: Path) -> Optional[int]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = self.IN_MODIFY | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+            if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.fd is not None else "poll"
+
+    def wait(self, *, changed: bool) -> None:
+        if self.fd is not None:
+            import select
+
+            # sqlite publishes a commit through its mmapped -shm, which raises no event: a
+            # wake-up that found nothing new may have come just before the commit, so look
+            # again shortly before blocking for long.
+            timeout = self.min_interval if self.woke and not changed else self.IDLE_CHECK_SECONDS
+            self.woke = bool(select.select([self.fd], [], [], timeout)[0])
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+            return
+        # Poll fast right after activity, back off towards max_interval while idle.
+        self.interval = self.min_interval if changed else min(self.interval * 2, self.max_interval)
+        time.sleep(self.interval)
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def event_matches(rec: dict[str, Any], *, case_id: Optional[str], types: set[str], dept: Optional[str]) -> bool:
+    if case_id and rec.get("case") != case_id:
+        return False
+    if types and rec.get("type") not in types:
+        return False
+    if dept:
+        data = rec.get("data") if isinstance(rec.get("data"), dict) else {}
+        if data.get("dept") != dept and not (rec.get("type") == "record" and data.get("kind") == dept):
+            return False
+    return True
+
+
+def format_event(rec: dict[str, Any]) -> str:
+    data = rec.get("data") if isinstance(rec.get("data"), dict) else {}
+    etype = rec.get("type")
+    if etype == "exec":
+        summary = f"[{data.get('dept')}/{data.get('kind')}] exit={data.get('exit_code')} {data.get('duration_ms')}ms $ {data.get('command_str')}"
+    elif etype == "record":
+        summary = f"[{data.get('kind')}] {data.get('message')}"
+    elif etype == "route":
+        summary = f"{data.get('document')}/{data.get('urgency')} {data.get('input')}"
+    elif etype == "rescript":
+        summary = f"{data.get('category')} {data.get('raw')}"
+    elif etype == "case_open":
+        summary = str(data.get("title"))
+    else:
+        summary = json.dumps(data, ensure_ascii=False)
+    if len(summary) > 200:
+        summary = summary[:200] + "..."
+    return f"{rec.get('ts')} {etype:<12} {rec.get('case') or '-'} {summary}"
+
+
+def event_key(rec: dict[str, Any]) -> tuple[Any, ...]:
+    return (rec.get("ts"), rec.get("type"), rec.get("case"), rec.get("seq"))
+
+
+def resume_offset_after_rotation(path: Path, lines_seen: int, last_key: Optional[tuple[Any, ...]]) -> int:
+    """
+    Find where to continue in a swapped-in archive.
+
+    `compact` rewrites events in place, so if the line we last printed sits at the same
+    position in the new file we continue after it; otherwise the file is a fresh
+    segment and is read from the start.
+    """
+
+    if not lines_seen or last_key is None:
+        return 0
+    offset = 0
+    with path.open("rb") as f:
+        for index, line in enumerate(f):
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if index == lines_seen - 1:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    return 0
+                return offset if isinstance(rec, dict) and event_key(rec) == last_key else 0
+    return 0
+
+
+def event_key_before(f: Any, offset: int) -> Optional[tuple[Any, ...]]:
+    """
+    Key of the event that ends at `offset`, so a follower that starts at the tail knows
+    its place in a swapped-in archive before it has printed anything.
+    """
+
+    window = 1 << 16
+    while offset > 0:
+        lo = max(0, offset - window)
+        f.seek(lo)
+        data = f.read(offset - lo)
+        cut = data.rfind(b"\n", 0, len(data) - 1)
+        if cut >= 0 or lo == 0:
+            try:
+                rec = json.loads(data[cut + 1 :])
+            except ValueError:
+                return None
+            return event_key(rec) if isinstance(rec, dict) else None
+        window *= 4
+    return None
+
+
+def emit_followed(line: bytes, rec: dict[str, Any], *, raw: bool) -> None:
+    if raw:
+        sys.stdout.write(line.decode("utf-8", errors="replace") + "\n")
+    else:
+        sys.stdout.write(format_event(rec) + "\n")
+    sys.stdout.flush()
+
+
+def follow_store_events(store: Store, args: argparse.Namespace, types: set[str], watcher: ArchiveWatcher) -> int:
+    # Cursor-based follow for backends without an append-only file (sqlite row ids).
+    cursor = store.tail_cursor(args.lines)
+    active = False
+    while True:
+        seen = False
+        for _pos, end, line in store.iter_lines(cursor):
+            cursor = end
+            seen = True
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and event_matches(rec, case_id=args.case, types=types, dept=args.dept):
+                emit_followed(line, rec, raw=args.json)
+        if seen:
+            active = True
+            continue
+        watcher.wait(changed=active)
+        active = False
+
+
+def cmd_archive_follow(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    load_state(root)  # ensure store
+    flush_archives()
+    path = archive_path(root)
+    types = {t for t in (args.type or "").split(",") if t}
+    watcher = ArchiveWatcher(store_dir(root), min_interval=args.interval / 4, max_interval=args.interval)
+
+    store = get_store(root)
+    if store.name != "files":
+        try:
+            return follow_store_events(store, args, types, watcher)
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            watcher.close()
+
+    f = path.open("rb")
+    start = store.tail_cursor(args.lines)
+    last_key = event_key_before(f, start)
+    f.seek(start)
+    buf = b""
+    active = False
+    try:
+        while True:
+            chunk = f.read()
+            buf += chunk
+            *complete, buf = buf.split(b"\n")
+            for line in complete:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(rec, dict):
+                    continue
+                last_key = event_key(rec)
+                if event_matches(rec, case_id=args.case, types=types, dept=args.dept):
+                    emit_followed(line, rec, raw=args.json)
+
+            try:
+                current = os.stat(str(path))
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(f.fileno())
+            if current is not None and (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+                # Rotated or compacted: finish the old file first, then switch over.
+                if opened.st_size > f.tell():
+                    continue
+                lines_seen = count_lines_before(f)
+                f.close()
+                f = path.open("rb")
+                f.seek(resume_offset_after_rotation(path, lines_seen, last_key))
+                buf = b""
+                continue
+            if current is not None and current.st_size < f.tell():
+                f.seek(0)  # truncated in place
+                buf = b""
+                continue
+            if chunk:
+                active = True
+                continue
+            watcher.wait(changed=active)
+            active = False
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        f.close()
+        watcher.close()
+
+
+def count_lines_before(f: Any) -> int:
+    pos = f.tell()
+    f.seek(0)
+    n = 0
+    remaining = pos
+    while remaining > 0:
+        block = f.read(min(1 << 20, remaining))
+        if not block:
+            break
+        n += block.count(b"\n")
+        remaining -= len(block)
+    f.seek(pos)
+    return n
+
+
+def cmd_archive_verify(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    load_state(root)  # ensure store
+    require_file_store(root, "archive verify")
+    result = verify_archive(root, full=args.full)
+    if args.json:
+        print(dump_json(result))
+    elif result["ok"]:
+        print(
+            f"[OK] Archive chain intact: checked {result['checked']} events "
+            f"from offset {result['from_offset']} to {result['end_offset']}"
+        )
+    else:
+        print(f"[BROKEN] offset {result['broken_offset']}: {result['reason']}")
+    return 0 if result["ok"] else 1
+
+
+def iso_days_ago(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def retention_policy(state: dict[str, Any], args: argparse.Namespace) -> dict[str, int]:
+    policy = {**RETENTION_DEFAULTS, **(state.get("retention") or {})}
+    for key in RETENTION_DEFAULTS:
+        value = getattr(args, key, None)
+        if value is not None:
+            policy[key] = value
+    return policy
+
+
+class ArchiveRewriter:
+    """
+    Streams rewritten archive lines into a temp file within a byte budget.
+
+    Chained lines are re-stamped with the hash of the line written before them, so the
+    output stays verifiable; unchanged lines are copied byte for byte. Every input line
+    is first checked against the old chain (as verify_archive does), including lines
+    appended after the up-front verify, so re-stamping never launders a broken link.
+    """
+
+    def __init__(self, out: Any, *, budget_bytes: int) -> None:
+        self.out = out
+        self.budget_bytes = budget_bytes
+        self.written = 0
+        self.prev_hash = CHAIN_GENESIS
+        self.last_checkpoint: Optional[dict[str, Any]] = None
+        # Old-chain state of the input read so far.
+        self.read = 0
+        self.orig_prev_start = 0
+        self.orig_prev = CHAIN_GENESIS
+        self.orig_seq = 0
+        self.chained = False
+
+    def check(self, original: bytes, rec: Optional[dict[str, Any]]) -> None:
+        line_start = self.read
+        self.read += len(original) + 1
+        if not isinstance(rec, dict):
+            if self.chained:
+                self.broken(line_start, "invalid JSON")
+        elif "prev" in rec:
+            if rec["prev"] != self.orig_prev:
+                self.broken(self.orig_prev_start, f"line modified (prev hash mismatch at offset {line_start})")
+            if self.chained and rec.get("seq") != self.orig_seq + 1:
+                self.broken(line_start, f"seq gap (expected {self.orig_seq + 1}, got {rec.get('seq')})")
+            self.chained = True
+            self.orig_seq = rec.get("seq") or 0
+            if ends_chain(rec):
+                self.chained = False
+        elif self.chained:
+            self.broken(line_start, "unchained event after chain start")
+        self.orig_prev = hash_line(original)
+        self.orig_prev_start = line_start
+
+    @staticmethod
+    def broken(offset: int, reason: str) -> None:
+        raise SystemExit(f"Archive chain broken at offset {offset}: {reason}; compaction aborted")
+
+    def write(self, body: bytes, rec: Optional[dict[str, Any]], *, original: Optional[bytes] = None) -> None:
+        self.check(body if original is None else original, rec)
+        if rec is not None and "prev" in rec and rec["prev"] != self.prev_hash:
+            rec["prev"] = self.prev_hash
+            if rec.get("type") == "checkpoint":
+                rec["data"]["head"] = self.prev_hash
+            body = json.dumps(rec, ensure_ascii=False).encode("utf-8")
+        line_start = self.written
+        self.written += len(body) + 1
+        if self.written > self.budget_bytes:
+            raise SystemExit(
+                f"Compaction exceeds temp budget ({self.budget_bytes} bytes); raise --temp-budget-mb or compact with fewer retention days"
+            )
+        if self.out is not None:
+            self.out.write(body + b"\n")
+        self.prev_hash = hash_line(body)
+        if rec is not None and "prev" in rec and rec.get("type") == "checkpoint":
+            self.last_checkpoint = {
+                "line_start": line_start,
+                "offset": self.written,
+                "hash": self.prev_hash,
+                "seq": rec.get("seq") or 0,
+            }
+
+
+def compact_archive(root: Path, *, cutoff: str, budget_bytes: int, dry_run: bool) -> dict[str, Any]:
+    """
+    Drop exec output snippets older than `cutoff` while other processes keep appending.
+
+    The bulk rewrite runs unlocked; only the copy of lines appended meanwhile and the
+    final rename happen under the archive lock. Writers holding the old file notice
+    the inode change on their next flush and reopen.
+    """
+
+    flush_archives()
+    path = archive_path(root)
+    stats: dict[str, Any] = {"events": 0, "snippets_dropped": 0, "bytes_before": path.stat().st_size}
+    tmp = path.with_name(path.name + COMPACT_TMP_SUFFIX)
+    out = None if dry_run else tmp.open("wb")
+    rewriter = ArchiveRewriter(out, budget_bytes=budget_bytes)
+    try:
+        with path.open("rb") as src:
+            inode = os.fstat(src.fileno()).st_ino
+            pos = 0
+            for line in src:
+                if not line.endswith(b"\n"):
+                    break  # partial append in flight; picked up under the lock
+                pos += len(line)
+                body = original = line[:-1]
+                try:
+                    rec = json.loads(body)
+                except ValueError:
+                    rewriter.write(body, None)
+                    continue
+                stats["events"] += 1
+                data = rec.get("data") if isinstance(rec, dict) else None
+                if (
+                    rec.get("type") == "exec"
+                    and isinstance(data, dict)
+                    and data.get("output_snippet") is not None
+                    and (rec.get("ts") or "") < cutoff
+                ):
+                    data["output_snippet"] = None
+                    data["output_compacted"] = True
+                    stats["snippets_dropped"] += 1
+                    body = json.dumps(rec, ensure_ascii=False).encode("utf-8")
+                rewriter.write(body, rec, original=original)
+
+            if dry_run:
+                stats["bytes_after"] = rewriter.written
+                return stats
+
+            fd = os.open(str(path), os.O_RDONLY)
+            lock_fd(fd)
+            try:
+                if os.fstat(fd).st_ino != inode:
+                    raise SystemExit("Archive was replaced during compaction (another compact running?)")
+                src.seek(pos)
+                for line in src:
+                    if not line.endswith(b"\n") and rewriter.chained:
+                        rewriter.broken(rewriter.read, "incomplete trailing line")
+                    body = line.rstrip(b"\n")
+                    try:
+                        rec = json.loads(body)
+                    except ValueError:
+                        rec = None
+                    stats["events"] += 1
+                    rewriter.write(body, rec)
+                out.flush()
+                os.fsync(out.fileno())
+                carry_folds(root, os.fstat(out.fileno()).st_ino, rewriter.written)
+                out.close()
+                os.replace(str(tmp), str(path))
+            finally:
+                unlock_fd(fd)
+                os.close(fd)
+    finally:
+        if out is not None and not out.closed:
+            out.close()
+        if tmp.exists():
+            tmp.unlink()
+
+    stats["bytes_after"] = rewriter.written
+    if rewriter.last_checkpoint is not None:
+        write_json(verify_state_path(root), {**rewriter.last_checkpoint, "verified_end": rewriter.written})
+    elif verify_state_path(root).exists():
+        verify_state_path(root).unlink()
+    return stats
+
+
+def pack_closed_cases(root: Path, *, cutoff: str, dry_run: bool) -> list[str]:
+    """
+    Move closed cases last updated before `cutoff` into cases.packed.ndjson.
+    """
+
+    packed: list[dict[str, Any]] = []
+    for p in sorted(cases_dir(root).glob("*.json")):
+        try:
+            case = read_json(p)
+        except Exception:
+            continue
+        if case.get("status") == "closed" and (case.get("updated_at") or "") < cutoff:
+            packed.append(case)
+    ids = [c["id"] for c in packed]
+    if dry_run or not packed:
+        return ids
+
+    with packed_cases_path(root).open("a", encoding="utf-8") as f:
+        for case in packed:
+            f.write(json.dumps(case, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    for case_id in ids:
+        (cases_dir(root) / f"{case_id}.json").unlink()
+
+    done_prefixes = tuple(f"- [x] {case_id} " for case_id in ids)
+    todo = todo_path(root).read_text(encoding="utf-8").splitlines(keepends=True)
+    todo_path(root).write_text("".join(line for line in todo if not line.startswith(done_prefixes)), encoding="utf-8")
+    return ids
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    state = load_state(root)
+    policy = retention_policy(state, args)
+    if args.save_policy:
+        state["retention"] = policy
+        save_state(root, state)
+
+    store = get_store(root)
+    if store.name == "files" and (state.get("archive_chain") or verify_state_path(root).exists()):
+        # Never launder a broken chain into a freshly re-stamped one.
+        verified = verify_archive(root)
+        if not verified["ok"]:
+            raise SystemExit(f"Archive chain broken at offset {verified['broken_offset']}: {verified['reason']}")
+
+    stats = store.compact_events(
+        cutoff=iso_days_ago(policy["full_days"]),
+        budget_bytes=policy["temp_budget_mb"] * 1024 * 1024,
+        dry_run=args.dry_run,
+    )
+    stats["packed_cases"] = store.pack_closed_cases(cutoff=iso_days_ago(policy["pack_closed_days"]), dry_run=args.dry_run)
+    stats["policy"] = policy
+    stats["dry_run"] = bool(args.dry_run)
+    if not args.dry_run:
+        record_event(
+            root,
+            "compact",
+            {**stats, "packed_cases": len(stats["packed_cases"])},
+            case_id=None,
+        )
+
+    if args.json:
+        print(dump_json(stats))
+    else:
+        prefix = "[DRY-RUN]" if args.dry_run else "[OK]"
+        print(
+            f"{prefix} archive {stats['bytes_before']} -> {stats['bytes_after']} bytes, "
+            f"{stats['snippets_dropped']} snippets dropped, {len(stats['packed_cases'])} closed cases packed"
+        )
+    return 0
+
+
+def event_text(rec: dict[str, Any]) -> str:
+    data = rec.get("data")
+    if not isinstance(data, dict):
+        return ""
+    return "\n".join(v for v in (data.get(k) for k in SEARCH_TEXT_FIELDS) if isinstance(v, str) and v)
+
+
+class SearchIndex:
+    """
+    FTS5 index over archive events, keyed by event cursor (byte offset in
+    archives.ndjson, or row id on the sqlite backend).
+
+    `meta` remembers how far (and in which store generation) has been indexed; anything
+    past that is caught up on the next batch or query, and a new generation (compact,
+    migration) triggers a rebuild so offsets always point into the current store.
+    """
+
+    def __init__(self, root: Path) -> None:
+        import sqlite3
+
+        self.root = root
+        self.db = sqlite3.connect(str(search_index_path(root)), timeout=30, isolation_level=None)
+        # The index is derived data: WAL without per-commit fsync keeps record-time updates cheap.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        tokenizer = "trigram" if sqlite3.sqlite_version_info >= (3, 34, 0) else "unicode61"
+        try:
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5("
+                "body, case_id UNINDEXED, ts UNINDEXED, type UNINDEXED, offset UNINDEXED, "
+                f"tokenize='{tokenizer}')"
+            )
+        except sqlite3.OperationalError as e:
+            raise SystemExit(f"SQLite FTS5 is not available in this Python build: {e}")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.tokenizer = tokenizer
+
+    @staticmethod
+    def listener(root: Path) -> Callable[[list[tuple[int, dict[str, Any]]], int, int], None]:
+        index: list[SearchIndex] = []
+
+        def on_flush(entries: list[tuple[int, dict[str, Any]]], end: int, generation: int) -> None:
+            import sqlite3
+
+            try:
+                if not index:
+                    index.append(SearchIndex(root))
+                index[0].add_batch(entries, end, generation)
+            except sqlite3.Error:
+                pass  # the next query catches up from the archive
+
+        return on_flush
+
+    def _meta(self) -> tuple[int, Optional[int]]:
+        rows = dict(self.db.execute("SELECT key, value FROM meta").fetchall())
+        generation = rows.get("generation")
+        return int(rows.get("indexed_offset") or 0), int(generation) if generation else None
+
+    def _set_meta(self, offset: int, generation: int) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("indexed_offset", str(offset)), ("generation", str(generation))],
+        )
+
+    def _insert(self, entries: list[tuple[int, dict[str, Any]]]) -> None:
+        rows = []
+        for offset, rec in entries:
+            text = event_text(rec)
+            if text:
+                rows.append((text, rec.get("case"), rec.get("ts"), rec.get("type"), offset))
+        if rows:
+            self.db.executemany("INSERT INTO docs (body, case_id, ts, type, offset) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def add_batch(self, entries: list[tuple[int, dict[str, Any]]], end: int, generation: int) -> None:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            offset, indexed_generation = self._meta()
+            if entries and indexed_generation == generation and offset == entries[0][0]:
+                self._insert(entries)
+                self._set_meta(end, generation)
+            elif indexed_generation != generation or offset < end:
+                self._catch_up()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def refresh(self, *, rebuild: bool = False) -> None:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if rebuild:
+                self.db.execute("DELETE FROM docs")
+                self.db.execute("DELETE FROM meta")
+            self._catch_up()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _catch_up(self) -> None:
+        store = get_store(self.root)
+        offset, indexed_generation = self._meta()
+        generation = store.generation()
+        if indexed_generation != generation:
+            self.db.execute("DELETE FROM docs")
+            offset = 0
+        batch: list[tuple[int, dict[str, Any]]] = []
+        for pos, end, rec in store.iter_events(offset):
+            batch.append((pos, rec))
+            offset = end
+            if len(batch) >= 1000:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+        self._set_meta(offset, generation)
+
+    def query(
+        self,
+        text: str,
+        *,
+        limit: int,
+        case_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        raw: bool = False,
+    ) -> list[dict[str, Any]]:
+        filters = ""
+        params: list[Any] = []
+        if case_id:
+            filters += " AND case_id = ?"
+            params.append(case_id)
+        if event_type:
+            filters += " AND type = ?"
+            params.append(event_type)
+
+        if raw or self.tokenizer != "trigram" or len(text) >= 3:
+            match = text if raw else '"' + text.replace('"', '""') + '"'
+            sql = (
+                "SELECT case_id, ts, offset, type, snippet(docs, 0, '[', ']', '...', 16) AS snip, rank "
+                f"FROM docs WHERE docs MATCH ?{filters} ORDER BY rank LIMIT ?"
+            )
+            rows = self.db.execute(sql, [match, *params, limit]).fetchall()
+        else:
+            # Trigram MATCH needs 3+ characters; short needles fall back to LIKE.
+            sql = (
+                "SELECT case_id, ts, offset, type, substr(body, 1, 120) AS snip, 0 "
+                f"FROM docs WHERE body LIKE ? ESCAPE '\\'{filters} ORDER BY ts DESC LIMIT ?"
+            )
+            like = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = self.db.execute(sql, [like, *params, limit]).fetchall()
+        return [
+            {"case": r[0], "ts": r[1], "offset": r[2], "type": r[3], "snippet": r[4], "score": round(-float(r[5]), 4)}
+            for r in rows
+        ]
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    load_state(root)  # ensure store
+    import sqlite3
+
+    index = SearchIndex(root)
+    try:
+        index.refresh(rebuild=args.reindex)
+        results = index.query(args.query, limit=args.limit, case_id=args.case, event_type=args.type, raw=args.raw)
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"Invalid search query: {e}")
+
+    if args.json:
+        print(dump_json(results))
+        return 0
+    for r in results:
+        print(f"- {r['ts']} {r['case'] or '-'} {r['type']} @{r['offset']}: {' '.join(r['snippet'].split())}")
+    if not results:
+        print("(no matches)")
+    return 0
+
+
+class EventFold(ABC):
+    """
+    JSON state folded from archive events, with the same cursor/generation bookkeeping
+    as SearchIndex: anything past the cursor is caught up from the store on the next
+    batch or refresh.
+
+    Listener batches are buffered per process (FoldBuffer) and written at most every
+    FOLD_FLUSH_MS and at exit, so hot append loops do not rewrite the file per flush.
+    Deferring is safe: a process that finds the file behind catches up from the store,
+    and batches the cursor already covers are skipped.
+    """
+
+    # A new generation (compact, migration) refolds the store from scratch; subclasses
+    # that must never go backwards keep their totals and are carried over to the new
+    # generation by carry_folds() while the switch blocks appends.
+    rebuild_on_new_generation = True
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = self.path_for(root)
+
+    @staticmethod
+    @abstractmethod
+    def path_for(root: Path) -> Path:
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def empty() -> dict[str, Any]:
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def fold(state: dict[str, Any], rec: dict[str, Any]) -> None:
+        ...
+
+    @classmethod
+    def listener(cls, root: Path) -> EventListener:
+        buffer = fold_buffer(cls, root)
+
+        def on_flush(entries: list[tuple[int, dict[str, Any]]], end: int, generation: int) -> None:
+            buffer.add(entries, end, generation)
+
+        return on_flush
+
+    def load(self) -> dict[str, Any]:
+        try:
+            state = read_json(self.path)
+        except (OSError, ValueError):
+            return self.empty()
+        return state if state.get("version") == 1 else self.empty()
+
+    def save(self, state: dict[str, Any]) -> None:
+        write_json_atomic(self.path, state)
+
+    def apply(self, batches: list[tuple[list[tuple[int, dict[str, Any]]], int, int]]) -> None:
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            state = self.load()
+            before = (state["cursor"], state["generation"])
+            for entries, end, generation in batches:
+                if not entries or (state["generation"] == generation and state["cursor"] >= end):
+                    continue
+                if state["generation"] == generation and state["cursor"] == entries[0][0]:
+                    for _pos, rec in entries:
+                        self.fold(state, rec)
+                    state["cursor"] = end
+                else:
+                    state = self._catch_up(state)
+            if (state["cursor"], state["generation"]) != before:
+                self.save(state)
+
+    def refresh(self) -> dict[str, Any]:
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            state = self.load()
+            before = (state["cursor"], state["generation"])
+            state = self._catch_up(state)
+            if (state["cursor"], state["generation"]) != before or not self.path.exists():
+                self.save(state)
+            return state
+
+    def _catch_up(self, state: dict[str, Any]) -> dict[str, Any]:
+        store = get_store(self.root)
+        generation = store.generation()
+        if state["generation"] != generation:
+            if state["generation"] is None or self.rebuild_on_new_generation:
+                state = self.empty()
+            else:
+                state["cursor"] = store.tail_cursor(0)  # not carried over (crash mid-switch)
+        for _pos, end, rec in store.iter_events(state["cursor"]):
+            self.fold(state, rec)
+            state["cursor"] = end
+        state["generation"] = generation
+        return state
+
+
+class FoldBuffer:
+    """
+    Listener batches of one EventFold that this process has not written yet.
+    """
+
+    def __init__(self, fold: EventFold) -> None:
+        self.fold = fold
+        self.batches: list[tuple[list[tuple[int, dict[str, Any]]], int, int]] = []
+        self.since = 0.0
+        self._lock = threading.RLock()
+
+    def add(self, entries: list[tuple[int, dict[str, Any]]], end: int, generation: int) -> None:
+        with self._lock:
+            if not self.batches:
+                self.since = time.monotonic()
+            self.batches.append((entries, end, generation))
+        if self.due():
+            self.flush()
+
+    def due(self) -> bool:
+        with self._lock:
+            return bool(self.batches) and (time.monotonic() - self.since) * 1000 >= FOLD_FLUSH_MS
+
+    def flush(self) -> None:
+        with self._lock:
+            batches, self.batches = self.batches, []
+        if not batches:
+            return
+        try:
+            with flushing():
+                self.fold.apply(batches)
+        except (OSError, ValueError):
+            pass  # the next refresh catches up from the store
+
+
+_FOLD_BUFFERS: dict[tuple[str, str], FoldBuffer] = {}
+
+
+def fold_buffer(cls: type, root: Path) -> FoldBuffer:
+    key = (cls.__name__, str(root))
+    buffer = _FOLD_BUFFERS.get(key)
+    if buffer is None:
+        buffer = _FOLD_BUFFERS[key] = FoldBuffer(cls(root))
+        install_exit_hooks()
+    return buffer
+
+
+def flush_folds(*, only_due: bool = False) -> None:
+    for buffer in list(_FOLD_BUFFERS.values()):
+        if not only_due or buffer.due():
+            buffer.flush()
+
+
+def carry_folds(root: Path, generation: int, start: int) -> None:
+    """
+    Move folds that never rebuild onto a new store generation starting at `start`.
+
+    Compaction and migration call this while appends are blocked and before the new
+    generation becomes visible: each fold first catches up on the old generation, so
+    nothing appended between the switch and the next fold is skipped.
+    """
+
+    flush_folds()
+    for cls in (Digest, Metrics):
+        if cls.rebuild_on_new_generation or not cls.path_for(root).exists():
+            continue
+        fold = cls(root)
+        with file_lock(fold.path.with_name(fold.path.name + ".lock")):
+            state = fold._catch_up(fold.load())
+            state["generation"], state["cursor"] = generation, start
+            fold.save(state)
+
+
+def enable_fold(root: Path, cls: type) -> dict[str, Any]:
+    store = get_store(root)
+    existed = cls.path_for(root).exists()
+    state = cls(root).refresh()
+    if not existed:
+        store.listeners.append(cls.listener(root))
+    return state
+
+
+class Digest(EventFold):
+    """
+    Small per-project summary folded from events: open cases, recent failures and exec
+    stats per ministry. Kept in .great-ming/digest.json so `court` reads it instead of
+    scanning archives.
+    """
+
+    @staticmethod
+    def path_for(root: Path) -> Path:
+        return digest_path(root)
+
+    @staticmethod
+    def empty() -> dict[str, Any]:
+        return {
+            "version": 1,
+            "cursor": 0,
+            "generation": None,
+            "events": 0,
+            "last_ts": None,
+            "open_cases": {},
+            "exec": {},
+            "recent_failures": [],
+        }
+
+    @staticmethod
+    def fold(digest: dict[str, Any], rec: dict[str, Any]) -> None:
+        digest["events"] += 1
+        digest["last_ts"] = rec.get("ts")
+        etype = rec.get("type")
+        data = rec.get("data") if isinstance(rec.get("data"), dict) else {}
+        if etype == "case_open" and rec.get("case"):
+            digest["open_cases"][rec["case"]] = data.get("title")
+        elif etype == "case_close":
+            digest["open_cases"].pop(rec.get("case"), None)
+        elif etype == "exec":
+            stats = digest["exec"].setdefault(data.get("dept") or "-", {"runs": 0, "failures": 0, "duration_ms": 0})
+            stats["runs"] += 1
+            stats["duration_ms"] += int(data.get("duration_ms") or 0)
+            if data.get("exit_code") not in (0, None):
+                stats["failures"] += 1
+                digest["recent_failures"].append(
+                    {
+                        "ts": rec.get("ts"),
+                        "case": rec.get("case"),
+                        "dept": data.get("dept"),
+                        "exit_code": data.get("exit_code"),
+                        "command_str": data.get("command_str"),
+                    }
+                )
+                del digest["recent_failures"][:-DIGEST_RECENT_FAILURES]
+
+
+# (state key, metric name, label names, help) of the counters kept by Metrics.
+METRIC_COUNTERS = (
+    ("events", "mingctl_events_total", ("type",), "Archive events recorded, by event type."),
+    ("exec", "mingctl_exec_total", ("dept", "kind", "status"), "Commands run through exec, the worker or pipelines."),
+    ("forced", "mingctl_exec_forced_total", ("dept",), "Commands run with --force."),
+    ("denied", "mingctl_exec_denied_total", ("dept", "rescript"), "Commands refused by the rescript gate."),
+    ("rescripts", "mingctl_rescripts_total", ("category",), "Recorded rescripts, by category."),
+    ("cases_opened", "mingctl_cases_opened_total", (), "Cases opened."),
+    ("cases_closed", "mingctl_cases_closed_total", (), "Cases closed."),
+    ("pipeline_runs", "mingctl_pipeline_runs_total", ("status",), "Pipeline runs, by result."),
+)
+
+
+def exec_status(exit_code: Any, error: Any = None) -> str:
+    if error:
+        return "failed"  # never started (pipeline step whose command was not found)
+    if exit_code is None:
+        return "unknown"
+    if exit_code == 0:
+        return "ok"
+    return "signaled" if isinstance(exit_code, int) and exit_code < 0 else "failed"
+
+
+class Metrics(EventFold):
+    """
+    Monitoring counters folded from events into .great-ming/metrics.json; every save
+    also rewrites metrics.prom (Prometheus text format). Counters never go backwards:
+    after compaction or migration the totals are kept and folding continues from the
+    new generation instead of refolding the store.
+    """
+
+    rebuild_on_new_generation = False
+
+    @staticmethod
+    def path_for(root: Path) -> Path:
+        return metrics_state_path(root)
+
+    @staticmethod
+    def empty() -> dict[str, Any]:
+        return {"version": 1, "cursor": 0, "generation": None, "counters": {}, "durations": {}}
+
+    @staticmethod
+    def fold(state: dict[str, Any], rec: dict[str, Any]) -> None:
+        counters = state["counters"]
+
+        def inc(key: str, *labels: Any) -> None:
+            series = counters.setdefault(key, {})
+            name = "\t".join(str(v) for v in labels)
+            series[name] = series.get(name, 0) + 1
+
+        etype = rec.get("type") or "-"
+        data = rec.get("data") if isinstance(rec.get("data"), dict) else {}
+        dept = data.get("dept") or "-"
+        inc("events", etype)
+        if etype == "exec":
+            inc("exec", dept, data.get("kind") or "-", exec_status(data.get("exit_code"), data.get("error")))
+            if data.get("forced"):
+                inc("forced", dept)
+            hist = state["durations"].setdefault(dept, {"buckets": [0] * len(METRICS_DURATION_BUCKETS), "sum": 0.0, "count": 0})
+            seconds = int(data.get("duration_ms") or 0) / 1000
+            for i, bound in enumerate(METRICS_DURATION_BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] = round(hist["sum"] + seconds, 3)
+            hist["count"] += 1
+        elif etype == "exec_denied":
+            inc("denied", dept, data.get("rescript") or "none")
+        elif etype == "rescript":
+            inc("rescripts", data.get("category") or "-")
+        elif etype == "case_open":
+            inc("cases_opened")
+        elif etype == "case_close":
+            inc("cases_closed")
+        elif etype == "pipeline_run":
+            inc("pipeline_runs", data.get("status") or "-")
+
+    def save(self, state: dict[str, Any]) -> None:
+        super().save(state)
+        text = render_metrics([(self.root, state)])
+        write_text_atomic(metrics_text_path(self.root), text)
+        textfile_dir = os.environ.get(METRICS_TEXTFILE_DIR_ENV)
+        if textfile_dir:
+            name = f"mingctl-{slugify(self.root.name, fallback='project')}-{hash_line(str(self.root).encode('utf-8'))[:8]}.prom"
+            write_text_atomic(Path(textfile_dir) / name, text)
+
+
+def prom_labels(labels: list[tuple[str, Any]]) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def render_metrics(projects: list[tuple[Path, dict[str, Any]]]) -> str:
+    """
+    Prometheus text exposition of one or more projects' Metrics state, each series
+    labelled with its project root.
+    """
+
+    lines = []
+    for key, name, label_names, help_text in METRIC_COUNTERS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for root, state in projects:
+            series = state["counters"].get(key, {})
+            if not label_names and not series:
+                series = {"": 0}
+            for values, count in sorted(series.items()):
+                labels = [("project", root), *zip(label_names, values.split("\t"))]
+                lines.append(f"{name}{prom_labels(labels)} {count}")
+
+    name = "mingctl_exec_duration_seconds"
+    lines += [f"# HELP {name} Command wall time, by ministry.", f"# TYPE {name} histogram"]
+    for root, state in projects:
+        for dept, hist in sorted(state["durations"].items()):
+            base = [("project", root), ("dept", dept)]
+            for bound, count in zip(METRICS_DURATION_BUCKETS, hist["buckets"]):
+                lines.append(f"{name}_bucket{prom_labels([*base, ('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{prom_labels([*base, ('le', '+Inf')])} {hist['count']}")
+            lines.append(f"{name}_sum{prom_labels(base)} {hist['sum']}")
+            lines.append(f"{name}_count{prom_labels(base)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def registry_path() -> Path:
+    return user_dir() / REGISTRY_FILENAME
+
+
+def read_registry() -> list[str]:
+    try:
+        lines = registry_path().read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return []
+    return list(dict.fromkeys(line.strip() for line in lines if line.strip()))
+
+
+def register_project(root: Path) -> None:
+    """
+    Add `root` to the user-level registry read by `court`, and start its digest.
+    """
+
+    enable_fold(root, Digest)
+    if str(root) in read_registry():
+        return
+    try:
+        registry_path().parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(registry_path().with_name(REGISTRY_FILENAME + ".lock")):
+            with registry_path().open("a", encoding="utf-8") as f:
+                f.write(f"{root}\n")
+    except OSError as e:
+        eprint(f"[WARN] Could not register project in {registry_path()}: {e}")
+
+
+def court_project_status(root_str: str) -> dict[str, Any]:
+    root = Path(root_str)
+    if not store_dir(root).is_dir():
+        return {"root": root_str, "ok": False, "error": "store missing"}
+    try:
+        digest = Digest(root).refresh()
+        state = load_state(root)
+    except (Exception, SystemExit) as e:  # one broken project must not sink the court
+        return {"root": root_str, "ok": False, "error": str(e)}
+    return {"root": root_str, "ok": True, "current_case_id": state.get("current_case_id"), **digest}
+
+
+def court_fan_out(fn: Callable[[str], dict[str, Any]], roots: list[str], workers: int) -> list[dict[str, Any]]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not roots:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(roots)))) as pool:
+        return list(pool.map(fn, roots))
+
+
+def cmd_court_status(args: argparse.Namespace) -> int:
+    started = time.perf_counter()
+    projects = court_fan_out(court_project_status, read_registry(), args.workers)
+    ok = [p for p in projects if p["ok"]]
+
+    open_cases = [
+        {"root": p["root"], "case": case_id, "title": title, "current": case_id == p.get("current_case_id")}
+        for p in ok
+        for case_id, title in p["open_cases"].items()
+    ]
+    failures = sorted(
+        ({"root": p["root"], **f} for p in ok for f in p["recent_failures"]),
+        key=lambda f: f.get("ts") or "",
+        reverse=True,
+    )[: args.failures]
+    exec_stats: dict[str, dict[str, int]] = {}
+    for p in ok:
+        for dept, stats in p["exec"].items():
+            total = exec_stats.setdefault(dept, {"runs": 0, "failures": 0, "duration_ms": 0})
+            for key in total:
+                total[key] += stats.get(key, 0)
+
+    report = {
+        "projects": len(projects),
+        "unavailable": [{"root": p["root"], "error": p["error"]} for p in projects if not p["ok"]],
+        "open_cases": open_cases,
+        "recent_failures": failures,
+        "exec_by_dept": exec_stats,
+        "per_project": [
+            {"root": p["root"], "events": p["events"], "last_ts": p["last_ts"], "open_cases": len(p["open_cases"])}
+            for p in ok
+        ],
+        "elapsed_ms": int((time.perf_counter() - started) * 1000),
+    }
+    if args.json:
+        print(dump_json(report))
+        return 0
+
+    out: list[str] = []
+    out.append(f"# 朝会（Court）：{len(projects)} projects, {report['elapsed_ms']}ms")
+    out.append("")
+    out.append("## 在办（Open Cases）")
+    out.extend(f"- {c['root']} {c['case']} {c['title']}{' (current)' if c['current'] else ''}" for c in open_cases)
+    out.append("")
+    out.append("## 近败（Recent Failures）")
+    out.extend(
+        f"- {f['ts']} {f['root']} [{f['dept']}] exit={f['exit_code']} $ {f['command_str']}" for f in failures
+    )
+    out.append("")
+    out.append("## 六部施行（Exec by Ministry）")
+    for dept, stats in sorted(exec_stats.items()):
+        avg = stats["duration_ms"] // stats["runs"] if stats["runs"] else 0
+        out.append(f"- {dept}: runs={stats['runs']} failures={stats['failures']} avg_ms={avg}")
+    if report["unavailable"]:
+        out.append("")
+        out.append("## 缺朝（Unavailable）")
+        out.extend(f"- {u['root']}: {u['error']}" for u in report["unavailable"])
+    print("\n".join(out))
+    return 0
+
+
+def cmd_court_search(args: argparse.Namespace) -> int:
+    def search_one(root_str: str) -> dict[str, Any]:
+        root = Path(root_str)
+        if not search_index_path(root).exists():
+            return {"root": root_str, "skipped": "no search index (run `mingctl search` there once)", "results": []}
+        try:
+            index = SearchIndex(root)
+            index.refresh()
+            return {"root": root_str, "results": index.query(args.query, limit=args.limit, raw=args.raw)}
+        except (Exception, SystemExit) as e:  # one broken project must not sink the court
+            return {"root": root_str, "skipped": str(e), "results": []}
+
+    per_project = court_fan_out(search_one, read_registry(), args.workers)
+    results = sorted(
+        ({"root": p["root"], **r} for p in per_project for r in p["results"]),
+        key=lambda r: r["score"],
+        reverse=True,
+    )[: args.limit]
+    skipped = [{"root": p["root"], "reason": p["skipped"]} for p in per_project if p.get("skipped")]
+    if args.json:
+        print(dump_json({"results": results, "skipped": skipped}))
+        return 0
+    for r in results:
+        print(f"- {r['root']} {r['ts']} {r['case'] or '-'} {r['type']} @{r['offset']}: {' '.join(r['snippet'].split())}")
+    if not results:
+        print("(no matches)")
+    unindexed = [sk for sk in skipped if sk["reason"].startswith("no search index")]
+    if unindexed:
+        eprint(f"[SKIP] {len(unindexed)} projects have no search index (run `mingctl search` in them once)")
+    for sk in skipped:
+        if sk not in unindexed:
+            eprint(f"[SKIP] {sk['root']}: {sk['reason']}")
+    return 0
+
+
+def cmd_court_list(args: argparse.Namespace) -> int:
+    roots = read_registry()
+    if args.json:
+        print(dump_json(roots))
+    else:
+        for r in roots:
+            print(f"- {r}{'' if store_dir(Path(r)).is_dir() else ' (missing)'}")
+    return 0
+
+
+def cmd_court_remove(args: argparse.Namespace) -> int:
+    target = str(Path(args.path).expanduser().resolve())
+    with file_lock(registry_path().with_name(REGISTRY_FILENAME + ".lock")):
+        roots = read_registry()
+        kept = [r for r in roots if r != target]
+        registry_path().write_text("".join(f"{r}\n" for r in kept), encoding="utf-8")
+    print(f"[OK] Removed {target}" if len(kept) != len(roots) else f"[SKIP] Not registered: {target}")
+    return 0
+
+
+def cmd_metrics(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    load_state(root)  # ensure store
+    state = enable_fold(root, Metrics)
+    if not metrics_text_path(root).exists():
+        Metrics(root).save(state)
+    if args.json:
+        print(dump_json({"root": str(root), "path": str(metrics_text_path(root)), **state}))
+    else:
+        sys.stdout.write(render_metrics([(root, state)]))
+    return 0
+
+
+def metrics_project_state(root_str: str) -> dict[str, Any]:
+    root = Path(root_str)
+    if not store_dir(root).is_dir():
+        return {"root": root_str, "ok": False, "error": "store missing"}
+    try:
+        return {"root": root_str, "ok": True, "metrics": enable_fold(root, Metrics)}
+    except (Exception, SystemExit) as e:  # one broken project must not sink the scrape
+        return {"root": root_str, "ok": False, "error": str(e)}
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    project = None
+    if not args.court:
+        project = str(get_root(args.root))
+        load_state(Path(project))  # ensure store
+
+    def scrape() -> bytes:
+        roots = read_registry() if project is None else [project]
+        projects = court_fan_out(metrics_project_state, roots, args.workers)
+        for p in projects:
+            if not p["ok"]:
+                eprint(f"[WARN] {p['root']}: {p['error']}")
+        return render_metrics([(Path(p["root"]), p["metrics"]) for p in projects if p["ok"]]).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = scrape()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *fmt_args: Any) -> None:
+            pass
+
+    server = HTTPServer((args.host, args.port), Handler)
+    scope = project or "registered projects"
+    eprint(f"[SERVE] http://{args.host}:{server.server_address[1]}/metrics ({scope})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def migrate_store(root: Path, target: str) -> dict[str, Any]:
+    """
+    Copy state, cases, packed cases and events into the other backend.
+
+    The new store is built beside the old one and switched in at the end; the old
+    files are kept under .great-ming/migrated-<backend>-<timestamp>/.
+    """
+
+    source = get_store(root)
+    if source.name == target:
+        raise SystemExit(f"Store already uses the {target} backend")
+    source.ensure()
+    state = load_state(root)
+    if state.get("archive_chain"):
+        # The hash chain is a property of archives.ndjson; close it so the imported
+        # prefix still verifies after a later migration back to files.
+        record_event(root, "archive_chain", {"enabled": False, "reason": f"migrate to {target}"}, case_id=None)
+        state["archive_chain"] = False
+        save_state(root, state)
+    flush_archives()
+    cases = source.list_cases()
+    packed = source.list_packed_cases()
+    backup = store_dir(root) / f"migrated-{source.name}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}"
+    events = 0
+
+    if target == "sqlite":
+        tmp = sqlite_store_path(root).with_name(SQLITE_STORE_FILENAME + ".tmp")
+        if tmp.exists():
+            tmp.unlink()
+        dst = SqliteStore(root, path=tmp)
+        with dst.transaction():
+            dst.bump_generation()
+            dst.save_state(state)
+            for case in cases:
+                dst.save_case(case)
+            dst.db.executemany(
+                "INSERT OR REPLACE INTO packed_cases (id, body) VALUES (?, ?)",
+                [(c["id"], json.dumps(c, ensure_ascii=False)) for c in packed],
+            )
+            batch: list[bytes] = []
+            for _pos, _end, line in source.iter_lines(0):
+                batch.append(line)
+                if len(batch) >= 10000:
+                    events += dst.insert_lines(batch)
+                    batch = []
+            events += dst.insert_lines(batch)
+        dst.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        carry_folds(root, dst.generation(), dst.tail_cursor(0))
+        dst.close()
+        close_archives()
+        backup.mkdir()
+        for name in (STATE_FILENAME, CASES_DIRNAME, ARCHIVE_FILENAME, PACKED_CASES_FILENAME, VERIFY_STATE_FILENAME):
+            if (store_dir(root) / name).exists():
+                os.replace(str(store_dir(root) / name), str(backup / name))
+        os.replace(str(tmp), str(sqlite_store_path(root)))
+        store = SqliteStore(root)
+        register_store(store)
+        store.write_todo()
+    else:
+        staging = store_dir(root) / "files.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+        (staging / CASES_DIRNAME).mkdir(parents=True)
+        write_json(staging / STATE_FILENAME, state)
+        for case in cases:
+            write_json(staging / CASES_DIRNAME / f"{case['id']}.json", case)
+        with (staging / PACKED_CASES_FILENAME).open("w", encoding="utf-8") as f:
+            for case in packed:
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+        with (staging / ARCHIVE_FILENAME).open("wb") as f:
+            for _pos, _end, line in source.iter_lines(0):
+                f.write(line + b"\n")
+                events += 1
+        (staging / TODO_FILENAME).write_text(render_todo(cases), encoding="utf-8")
+        st = os.stat(str(staging / ARCHIVE_FILENAME))
+        carry_folds(root, st.st_ino, st.st_size)
+        source.close()
+        backup.mkdir()
+        for suffix in ("", "-wal", "-shm"):
+            db_file = store_dir(root) / (SQLITE_STORE_FILENAME + suffix)
+            if db_file.exists():
+                os.replace(str(db_file), str(backup / db_file.name))
+        for child in staging.iterdir():
+            os.replace(str(child), str(store_dir(root) / child.name))
+        staging.rmdir()
+        register_store(FileStore(root))
+
+    return {"from": source.name, "to": target, "cases": len(cases), "packed_cases": len(packed), "events": events, "backup": str(backup)}
+
+
+def cmd_storage_status(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    store = get_store(root)
+    store.ensure()
+    cases = store.list_cases()
+    paths = [sqlite_store_path(root)] if store.name == "sqlite" else [state_path(root), archive_path(root), todo_path(root)]
+    info = {
+        "backend": store.name,
+        "store": str(store_dir(root)),
+        "cases": len(cases),
+        "open_cases": sum(1 for c in cases if c.get("status") == "open"),
+        "bytes": sum(p.stat().st_size for p in paths if p.exists()),
+    }
+    if args.json:
+        print(dump_json(info))
+    else:
+        print(f"[STORAGE] backend={info['backend']} cases={info['cases']} open={info['open_cases']} bytes={info['bytes']}")
+    return 0
+
+
+def cmd_storage_migrate(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    result = migrate_store(root, args.to)
+    record_event(root, "storage_migrate", result, case_id=None)
+    if args.json:
+        print(dump_json(result))
+    else:
+        print(
+            f"[OK] Migrated {result['from']} -> {result['to']}: {result['cases']} cases, "
+            f"{result['events']} events (old store kept in {result['backup']})"
+        )
+    return 0
+
+
+def load_resource_cache(path: Path) -> dict[str, Any]:
+    try:
+        return read_json(path)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_resource_cache(root: Path, path: Path, cache: dict[str, Any]) -> None:
+    # Only cache inside an existing store; `resources` must not create .great-ming/.
+    if not store_dir(root).is_dir():
+        return
+    try:
+        path.parent.mkdir(exist_ok=True)
+        write_json_atomic(path, cache)
+    except OSError:
+        pass
+
+
+def list_resources(root: Path) -> list[dict[str, Any]]:
+    """
+    Resources found in the project root. The result is cached keyed by the root directory's
+    mtime, which changes whenever a file is added, removed or renamed there.
+    """
+
+    try:
+        mtime_ns: Optional[int] = root.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    cached = load_resource_cache(resource_cache_path(root))
+    if mtime_ns is not None and cached.get("mtime_ns") == mtime_ns:
+        return cached["resources"]
+
+    candidates = [
+        ("ancestral-instructions", ["README.md", "README", "CONTRIBUTING.md", "CONTRIBUTING", "SECURITY.md", "SECURITY"]),
+        ("license", ["LICENSE", "LICENSE.md"]),
+    ]
+    resources: list[dict[str, Any]] = []
+    for name, filenames in candidates:
+        for fn in filenames:
+            p = root / fn
+            if p.exists() and p.is_file():
+                resources.append({"name": name, "path": str(p)})
+                break
+    if (root / ".git").exists():
+        resources.append({"name": "yellow-registers", "path": "git://log"})
+
+    save_resource_cache(root, resource_cache_path(root), {"mtime_ns": mtime_ns, "resources": resources})
+    return resources
+
+
+def cmd_resources_list(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    resources = list_resources(root)
+    if args.json:
+        print(dump_json(resources))
+    else:
+        for r in resources:
+            print(f"- {r['name']}: {r['path']}")
+    return 0
+
+
+def markdown_sections(path: Path) -> list[dict[str, Any]]:
+    """
+    Byte ranges of markdown headings (fenced code skipped). A section ends at the next
+    heading of the same or a higher level, so it includes its subsections.
+    """
+
+    sections: list[dict[str, Any]] = []
+    offset = 0
+    fence = False
+    with path.open("rb") as f:
+        for line in f:
+            if line.lstrip().startswith((b"```", b"~~~")):
+                fence = not fence
+            elif not fence and line.startswith(b"#"):
+                m = MARKDOWN_HEADING_RE.match(line)
+                if m:
+                    sections.append(
+                        {"heading": m.group(2).decode("utf-8", "replace"), "level": len(m.group(1)), "start": offset}
+                    )
+            offset += len(line)
+    for i, section in enumerate(sections):
+        section["end"] = next((s["start"] for s in sections[i + 1 :] if s["level"] <= section["level"]), offset)
+    return sections
+
+
+def cached_sections(root: Path, path: Path) -> list[dict[str, Any]]:
+    st = path.stat()
+    key = [str(path), st.st_mtime_ns, st.st_size]
+    cache_path = sections_cache_path(root, path)
+    cached = load_resource_cache(cache_path)
+    if cached.get("key") == key:
+        return cached["sections"]
+    sections = markdown_sections(path)
+    save_resource_cache(root, cache_path, {"key": key, "sections": sections})
+    return sections
+
+
+def find_section(sections: list[dict[str, Any]], wanted: str) -> dict[str, Any]:
+    folded = wanted.strip().casefold()
+    for section in sections:
+        if section["heading"].casefold() == folded:
+            return section
+    for section in sections:
+        if folded in section["heading"].casefold():
+            return section
+    raise SystemExit(f"Section not found: {wanted} (use --sections to list headings)")
+
+
+def parse_byte_range(raw: str) -> tuple[int, Optional[int]]:
+    start, sep, end = raw.partition(":")
+    try:
+        lo = int(start) if start else 0
+        hi = int(end) if end else None
+    except ValueError:
+        lo, hi, sep = -1, None, ""
+    if not sep or lo < 0 or (hi is not None and hi < lo):
+        raise SystemExit(f"Invalid --range: {raw!r} (expected START:END in bytes, either side optional)")
+    return lo, hi
+
+
+def read_utf8_bounded(path: Path, start: int, limit: int) -> tuple[str, int]:
+    """
+    Read at most `limit` bytes from `start` without splitting a UTF-8 character at either
+    end. Returns the text and the offset just past the bytes used.
+    """
+
+    with path.open("rb") as f:
+        f.seek(start)
+        data = f.read(limit + 1)
+    skip = 0
+    while skip < min(3, len(data)) and data[skip] & 0xC0 == 0x80:
+        skip += 1  # started inside a character
+    cut = min(limit, len(data))
+    if cut < len(data):
+        while cut > skip and data[cut] & 0xC0 == 0x80:
+            cut -= 1
+    return data[skip:cut].decode("utf-8", errors="replace"), start + cut
+
+
+def grep_resource(path: Path, pattern: str, start: int, end: Optional[int], max_bytes: int) -> tuple[list[str], bool]:
+    try:
+        regex = re.compile(pattern)
+    except re.error as e:
+        raise SystemExit(f"Invalid --grep pattern: {e}")
+    matches: list[str] = []
+    used = 0
+    with path.open("rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            if end is not None and offset >= end:
+                break
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if regex.search(line):
+                entry = f"@{offset}: {line}"
+                used += len(entry.encode("utf-8")) + 1
+                if used > max_bytes:
+                    return matches, True
+                matches.append(entry)
+            offset += len(raw)
+    return matches, False
+
+
+def cmd_resources_show(args: argparse.Namespace) -> int:
+    root = get_root(args.root)
+    resources = {r["name"]: r["path"] for r in list_resources(root)}
+    key = args.name
+    if key not in resources:
+        raise SystemExit(f"Unknown resource: {key}")
+
+    if resources[key].startswith("git://"):
+        if key == "yellow-registers":
+            with span("git"):
+                proc = subprocess.run(
+                    ["git", "log", "--oneline", f"-n{args.n}"],
+                    cwd=root,
+                    text=True,
+                    capture_output=True,
+                    check=False,
+                )
+            print(proc.stdout.rstrip())
+            return proc.returncode
+
+    p = Path(resources[key])
+    if args.sections:
+        sections = cached_sections(root, p)
+        if args.json:
+            print(dump_json(sections))
+        else:
+            for section in sections:
+                print(f"{'  ' * (section['level'] - 1)}- {section['heading']} [{section['start']}:{section['end']}]")
+        return 0
+
+    start, end = 0, None
+    if args.section:
+        section = find_section(cached_sections(root, p), args.section)
+        start, end = section["start"], section["end"]
+    if args.range:
+        if args.section:
+            raise SystemExit("--range cannot be combined with --section (use --offset)")
+        start, end = parse_byte_range(args.range)
+    if args.offset is not None:
+        start = max(start, args.offset)
+    size = p.stat().st_size
+    end = size if end is None else min(end, size)
+
+    if args.grep:
+        matches, truncated = grep_resource(p, args.grep, start, end, args.max_bytes)
+        for line in matches:
+            print(line)
+        if truncated:
+            print("[...truncated...]")
+        elif not matches:
+            print("(no matches)")
+        return 0
+
+    if start >= end:
+        return 0
+    content, stop = read_utf8_bounded(p, start, min(max(4, args.max_bytes), end - start))
+    print(content.rstrip())
+    if stop < end:
+        print(f"[...truncated; continue with --offset {stop}...]")
+    return 0
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+SCRIPTS = Path(__file__).resolve().parent.parent / "skills" / "great-ming" / "scripts"
+sys.path.insert(0, str(SCRIPTS))
+
+import mingctl  # noqa: E402
+
+ISOLATED_ENV = (
+    "MING_ROOT",
+    mingctl.ARCHIVE_BATCH_ENV,
+    mingctl.ARCHIVE_FLUSH_MS_ENV,
+    mingctl.ARCHIVE_FSYNC_ENV,
+    mingctl.ROOT_CACHE_DISABLE_ENV,
+    mingctl.PROFILE_ENV,
+    mingctl.PROFILE_DIR_ENV,
+    mingctl.METRICS_TEXTFILE_DIR_ENV,
+)
+
+
+def reset_mingctl() -> None:
+    """Drop per-process writers, stores and fold buffers so tests never share them."""
+    mingctl.close_archives()
+    for store in list(mingctl._STORES.values()):
+        store.close()
+    mingctl._STORES.clear()
+    ext = sys.modules.get(mingctl.EXT_MODULE_NAME)
+    if ext is not None:
+        ext._FOLD_BUFFERS.clear()
+
+
+@pytest.fixture
+def ext() -> Any:
+    return mingctl.ext_module()
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """An empty git checkout as cwd, with MING_HOME and the archive knobs isolated."""
+    for name in ISOLATED_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv(mingctl.USER_DIR_ENV, str(tmp_path / "home"))
+    monkeypatch.setenv(mingctl.SCRIPT_CHECK_DISABLE_ENV, "1")
+    root = tmp_path / "project"
+    (root / ".git").mkdir(parents=True)
+    monkeypatch.chdir(root)
+    reset_mingctl()
+    yield root.resolve()
+    reset_mingctl()
+
+
+@pytest.fixture
+def cli(project: Path) -> Callable[..., int]:
+    """Run a mingctl command in process against `project`."""
+
+    def run(*argv: str) -> int:
+        return mingctl.main(["--root", str(project), *argv])
+
+    return run
+
+
+def note(root: Path, message: str) -> None:
+    mingctl.record_event(root, "note", {"message": message}, case_id=None)
+
+
+def archive_lines(root: Path) -> list[bytes]:
+    return mingctl.archive_path(root).read_bytes().splitlines()
+
+
+def archive_records(root: Path) -> list[dict[str, Any]]:
+    mingctl.flush_archives()
+    path = mingctl.archive_path(root)
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def store_records(root: Path) -> list[dict[str, Any]]:
+    return [rec for _pos, _end, rec in mingctl.get_store(root).iter_events(0)]
+
+
+def exec_payload(command: list[str], *, output: str = "", exit_code: int = 0) -> dict[str, Any]:
+    return mingctl.exec_event(
+        kind="evidence",
+        dept="works",
+        command=command,
+        exit_code=exit_code,
+        duration_ms=5,
+        forced=False,
+        captured=True,
+        output_snippet=output,
+    )
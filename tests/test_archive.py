@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from conftest import archive_lines, archive_records, note
+
+import mingctl
+
+
+def test_group_commit_writes_full_batches_in_order(project, monkeypatch):
+    monkeypatch.setenv(mingctl.ARCHIVE_BATCH_ENV, "3")
+    mingctl.ensure_store(project)
+    for i in range(2):
+        note(project, f"n{i}")
+    assert archive_lines(project) == []
+
+    note(project, "n2")
+    assert len(archive_lines(project)) == 3
+
+    note(project, "n3")
+    mingctl.flush_archives()
+    assert [r["data"]["message"] for r in archive_records(project)] == ["n0", "n1", "n2", "n3"]
+
+
+def test_flush_timer_commits_a_partial_batch(project, monkeypatch):
+    monkeypatch.setenv(mingctl.ARCHIVE_BATCH_ENV, "100")
+    monkeypatch.setenv(mingctl.ARCHIVE_FLUSH_MS_ENV, "20")
+    mingctl.ensure_store(project)
+    note(project, "late")
+    writer = mingctl.get_archive_writer(project)
+    writer._timer.join(5)
+    assert len(archive_lines(project)) == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from conftest import store_records
+
+import mingctl
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+import bench  # noqa: E402
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_generated_store_has_the_requested_shape(project, tmp_path, backend):
+    root = tmp_path / "bench"
+    bench.generate_store(mingctl, root, backend=backend, cases=20, events=50, output_bytes=800)
+
+    store = mingctl.get_store(root)
+    cases = store.list_cases()
+    assert len(cases) == 20
+    assert sum(c["status"] == "closed" for c in cases) == 2
+    assert mingctl.todo_path(root).read_text(encoding="utf-8").count("- [ ] ") == 18
+    records = [r for r in store_records(root) if r["type"] != "init"]
+    assert len(records) == 50
+    execs = [r["data"] for r in records if r["type"] == "exec"]
+    assert len(execs) == 5
+    assert all(len(e["output_snippet"]) == 800 for e in execs)
+
+
+def test_compare_flags_regressions_by_direction(capsys):
+    baseline = {"results": {"startup_ms": 100.0, "append_batch1_per_s": 1000.0, "case_list_ms": 100.0}}
+    current = {"results": {"startup_ms": 130.0, "append_batch1_per_s": 700.0, "case_list_ms": 50.0}}
+
+    assert bench.compare(current, baseline, 0.25) == ["startup_ms", "append_batch1_per_s"]
+    flagged = [line.split()[0] for line in capsys.readouterr().out.splitlines() if line.endswith("REGRESSION")]
+    assert flagged == ["startup_ms", "append_batch1_per_s"]
+    assert bench.compare(current, baseline, 0.5) == []
+
+
+def test_run_writes_results_and_fails_on_regression(project, tmp_path):
+    out = tmp_path / "now.json"
+    argv = [sys.executable, str(BENCHMARKS / "bench.py"), "--cases", "5", "--events", "20", "--repeat", "1", "--seconds", "0.05"]
+    subprocess.run([*argv, "--only", "startup,parse,append", "--out", str(out)], check=True, capture_output=True)
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["params"]["cases"] == 5
+    assert set(report["results"]) == {
+        "startup_ms",
+        "route_parse_per_s",
+        "rescript_parse_per_s",
+        "append_batch1_per_s",
+        "append_batch64_per_s",
+    }
+
+    faster = tmp_path / "faster.json"
+    report["results"]["startup_ms"] = report["results"]["startup_ms"] / 100
+    faster.write_text(json.dumps(report), encoding="utf-8")
+    proc = subprocess.run([*argv, "--only", "startup", "--compare", str(faster)], capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert "regressed" in proc.stderr and "startup_ms" in proc.stderr
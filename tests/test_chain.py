@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+from conftest import SCRIPTS, archive_lines, archive_records, note
+
+import mingctl
+
+
+def test_verify_detects_a_modified_line(cli, project, ext):
+    cli("archive", "chain", "on")
+    for i in range(4):
+        note(project, f"n{i}")
+    mingctl.close_archives()
+    assert ext.verify_archive(project, full=True)["ok"]
+
+    lines = archive_lines(project)
+    lines[2] = lines[2].replace(b'"n1"', b'"nX"')
+    mingctl.archive_path(project).write_bytes(b"\n".join(lines) + b"\n")
+    result = ext.verify_archive(project, full=True)
+    assert not result["ok"]
+    assert "prev hash mismatch" in result["reason"]
+
+
+@pytest.fixture
+def verified(cli, project, ext, monkeypatch):
+    """A chained archive with a checkpoint every 4 events, verified once incrementally."""
+    monkeypatch.setattr(mingctl, "CHAIN_CHECKPOINT_EVERY", 4)
+    cli("archive", "chain", "on")
+    for i in range(10):
+        note(project, f"n{i}")
+    mingctl.close_archives()
+    assert ext.verify_archive(project)["checkpoint_seq"] > 8
+    return archive_lines(project)
+
+
+def test_incremental_verify_only_covers_changes_from_the_checkpoint_on(project, ext, verified):
+    lines = [l.replace(b'"n1"', b'"nX"') for l in verified]
+    mingctl.archive_path(project).write_bytes(b"\n".join(lines) + b"\n")
+
+    assert ext.verify_archive(project)["ok"]  # the edited line is before the checkpoint
+    result = ext.verify_archive(project, full=True)
+    assert not result["ok"] and "prev hash mismatch" in result["reason"]
+
+
+def test_incremental_verify_detects_truncation_after_the_checkpoint(project, ext, verified):
+    kept = b"\n".join(verified[:-1]) + b"\n"
+    mingctl.archive_path(project).write_bytes(kept)
+
+    result = ext.verify_archive(project)
+    assert not result["ok"]
+    assert result["broken_offset"] == len(kept)
+    assert "truncated below the verified end" in result["reason"]
+
+
+@pytest.fixture
+def elsewhere(project):
+    """Run a mingctl command in a separate process."""
+
+    def run(*argv):
+        env = {k: v for k, v in os.environ.items() if k != mingctl.ARCHIVE_BATCH_ENV}
+        subprocess.run([sys.executable, str(SCRIPTS / "mingctl.py"), "--root", str(project), *argv], env=env, check=True, capture_output=True)
+
+    return run
+
+
+def test_chain_toggled_by_another_process_applies_to_the_next_batch(cli, project, ext, elsewhere):
+    cli("init")
+    note(project, "before")  # this process's writer exists before the chain is turned on
+    mingctl.flush_archives()
+
+    elsewhere("archive", "chain", "on")
+    note(project, "chained")
+    mingctl.flush_archives()
+    assert ext.verify_archive(project, full=True)["ok"]
+
+    elsewhere("archive", "chain", "off")
+    note(project, "after")
+    mingctl.flush_archives()
+    assert ext.verify_archive(project, full=True)["ok"]
+
+    records = {r["data"].get("message"): r for r in archive_records(project) if r["type"] == "note"}
+    assert "prev" not in records["before"]
+    assert records["chained"]["seq"] == 2
+    assert "prev" not in records["after"]
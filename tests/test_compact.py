@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from conftest import archive_lines, archive_records, exec_payload, note
+
+import mingctl
+
+
+def test_compaction_drops_snippets_and_keeps_the_chain(cli, project, ext):
+    cli("archive", "chain", "on")
+    for i in range(3):
+        mingctl.record_event(project, "exec", exec_payload(["echo", str(i)], output=f"SECRET{i}"), case_id=None)
+    note(project, "tail")
+    mingctl.close_archives()
+
+    stats = ext.compact_archive(project, cutoff="9999", budget_bytes=1 << 30, dry_run=False)
+
+    assert stats["snippets_dropped"] == 3
+    assert b"SECRET" not in mingctl.archive_path(project).read_bytes()
+    assert ext.verify_archive(project, full=True)["ok"]
+    compacted = [r for r in archive_records(project) if r["type"] == "exec"]
+    assert all(r["data"]["output_compacted"] for r in compacted)
+
+
+def test_compaction_refuses_to_restamp_a_tampered_line(cli, project, ext):
+    cli("archive", "chain", "on")
+    for i in range(3):
+        mingctl.record_event(project, "exec", exec_payload(["echo", str(i)], output=f"out{i}"), case_id=None)
+    note(project, "tail")
+    mingctl.close_archives()
+    lines = archive_lines(project)
+    rec = json.loads(lines[1])
+    rec["data"]["command_str"] = "rm -rf /"
+    lines[1] = json.dumps(rec, ensure_ascii=False).encode("utf-8")
+    tampered = b"\n".join(lines) + b"\n"
+    mingctl.archive_path(project).write_bytes(tampered)
+
+    with pytest.raises(SystemExit, match="compaction aborted"):
+        ext.compact_archive(project, cutoff="9999", budget_bytes=1 << 30, dry_run=False)
+    assert mingctl.archive_path(project).read_bytes() == tampered
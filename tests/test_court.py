@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import shutil
+
+import pytest
+
+import mingctl
+
+
+@pytest.fixture
+def court(project, tmp_path, capsys):
+    """Registered projects: the healthy `project` plus one per way a member can break."""
+
+    def init(root, *argv):
+        (root / ".git").mkdir(parents=True, exist_ok=True)
+        mingctl.main(["--root", str(root), "init", *argv])
+
+    init(project)
+    mingctl.main(["--root", str(project), "case", "open", "healthy case"])
+    mingctl.record_event(project, "exec", {"dept": "works", "kind": "action", "exit_code": 1, "command_str": "make"}, case_id=None)
+    mingctl.main(["--root", str(project), "search", "make"])
+
+    gone = tmp_path / "gone"
+    init(gone)
+    shutil.rmtree(mingctl.store_dir(gone))
+
+    garbled = tmp_path / "garbled"
+    init(garbled)
+    mingctl.digest_path(garbled).write_text("{not json", encoding="utf-8")
+    mingctl.state_path(garbled).write_text("{not json", encoding="utf-8")
+
+    corrupt_db = tmp_path / "corrupt-db"
+    init(corrupt_db, "--backend", "sqlite")
+    mingctl.main(["--root", str(corrupt_db), "search", "x"])
+    mingctl.close_archives()
+    for store in list(mingctl._STORES.values()):
+        store.close()
+    mingctl._STORES.clear()
+    mingctl.sqlite_store_path(corrupt_db).write_bytes(b"not a database" * 100)
+    mingctl.search_index_path(corrupt_db).write_bytes(b"not a database" * 100)
+
+    capsys.readouterr()
+    return {"healthy": str(project), "broken": {str(gone), str(garbled.resolve()), str(corrupt_db.resolve())}}
+
+
+def court_json(capsys, *argv):
+    assert mingctl.main(["--json", "court", *argv]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+def test_status_reports_broken_members_without_losing_the_healthy_one(court, capsys):
+    report = court_json(capsys, "status")
+
+    assert report["projects"] == 4
+    assert {u["root"] for u in report["unavailable"]} == court["broken"]
+    assert [c["title"] for c in report["open_cases"]] == ["healthy case"]
+    assert [f["root"] for f in report["recent_failures"]] == [court["healthy"]]
+
+
+def test_search_skips_broken_members(court, capsys):
+    report = court_json(capsys, "search", "make")
+
+    assert {r["root"] for r in report["results"]} == {court["healthy"]}
+    assert {s["root"] for s in report["skipped"]} == court["broken"]
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+import os
+import selectors
+import subprocess
+import sys
+import time
+
+import pytest
+from conftest import SCRIPTS, note
+
+import mingctl
+
+
+@pytest.fixture
+def follow(project):
+    procs = []
+
+    def start(*argv):
+        env = {k: v for k, v in os.environ.items() if k != mingctl.ARCHIVE_BATCH_ENV}
+        proc = subprocess.Popen(
+            [sys.executable, str(SCRIPTS / "mingctl.py"), "--root", str(project), "archive", "follow", "--json", "--interval", "0.05", *argv],
+            stdout=subprocess.PIPE,
+            bufsize=0,  # unbuffered, so select() sees every line readline() has not consumed
+            env=env,
+        )
+        procs.append(proc)
+        return proc
+
+    yield start
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+
+
+def read_events(proc, count, timeout=10.0):
+    """The next `count` NDJSON events the follower prints, or fail after `timeout`."""
+    events = []
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    while len(events) < count:
+        left = deadline - time.monotonic()
+        assert left > 0 and sel.select(left), f"follower printed only {events}"
+        line = proc.stdout.readline()
+        assert line, f"follower exited with {proc.poll()}"
+        events.append(json.loads(line))
+    return events
+
+
+def record(root, *messages):
+    for message in messages:
+        note(root, message)
+    mingctl.flush_archives()
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_events_appended_after_start_are_delivered(cli, project, follow, backend):
+    cli("init", "--backend", backend)
+    record(project, "before")
+    proc = follow("--type", "note", "-n", "1")
+    assert [e["data"]["message"] for e in read_events(proc, 1)] == ["before"]  # started
+
+    record(project, "a", "b")
+    mingctl.record_event(project, "case_open", {"title": "filtered out"}, case_id=None)
+    record(project, "c")
+    assert [e["data"]["message"] for e in read_events(proc, 3)] == ["a", "b", "c"]
+
+
+def test_backlog_lines_are_printed_first(cli, project, follow):
+    cli("init")
+    record(project, "old1", "old2")
+    proc = follow("--type", "note", "-n", "1")
+    assert [e["data"]["message"] for e in read_events(proc, 1)] == ["old2"]
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_compaction_neither_replays_nor_skips_events(cli, project, follow, backend):
+    cli("init", "--backend", backend)
+    record(project, "x")
+    proc = follow("--type", "note", "-n", "1")
+    assert [e["data"]["message"] for e in read_events(proc, 1)] == ["x"]
+
+    mingctl.get_store(project).compact_events(cutoff="9999", budget_bytes=1 << 30, dry_run=False)
+    record(project, "after")
+    assert [e["data"]["message"] for e in read_events(proc, 1)] == ["after"]
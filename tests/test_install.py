@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from conftest import SCRIPTS
+
+import mingctl
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A copy of the scripts, so tests can edit the "source" an install came from."""
+    src = tmp_path / "src"
+    src.mkdir()
+    for path in mingctl.script_files(SCRIPTS / "mingctl.py"):
+        shutil.copy2(path, src / path.name)
+    return src / "mingctl.py"
+
+
+@pytest.fixture
+def run(project, tmp_path):
+    env = {k: v for k, v in os.environ.items() if not k.startswith("MING_")}
+    env[mingctl.USER_DIR_ENV] = str(tmp_path / "home")
+
+    def run(script, *argv):
+        return subprocess.run(
+            [sys.executable, str(script), "--root", str(project), *argv],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    return run
+
+
+def installed(root):
+    return mingctl.store_dir(root) / mingctl.INSTALLED_SCRIPT_NAME
+
+
+def test_install_copies_both_files_and_stamps_their_hash(run, project, source):
+    assert "[OK] Installed" in run(source, "install").stderr
+    dst = installed(project)
+    assert [p.read_bytes() for p in mingctl.script_files(dst)] == [p.read_bytes() for p in mingctl.script_files(source)]
+    stamp = mingctl.read_script_stamp(dst)
+    assert stamp["sha256"] == mingctl.script_sha256(dst) == mingctl.script_sha256(source)
+
+    assert "[SKIP] Up to date" in run(source, "install").stderr
+
+
+def test_link_install_points_both_files_at_the_shared_copy(run, project, source, tmp_path):
+    run(source, "install", "--link", "sym")
+    shared = tmp_path / "home" / "bin"
+    for dst in mingctl.script_files(installed(project)):
+        assert dst.is_symlink()
+        assert os.readlink(str(dst)) == str(shared / dst.name)
+
+
+def test_editing_the_module_marks_the_install_out_of_date(run, project, source):
+    run(source, "install")
+    ext = mingctl.script_files(source)[1]
+    stat = ext.stat()
+    os.utime(str(ext), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert "out of date" not in run(installed(project), "case", "list").stderr
+
+    ext.write_text(ext.read_text(encoding="utf-8") + "\n# edited\n", encoding="utf-8")
+    assert "out of date" in run(installed(project), "case", "list").stderr
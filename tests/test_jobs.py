@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import signal
+import sys
+
+import pytest
+from conftest import store_records
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(0.5)"]
+QUICK = [sys.executable, "-c", "pass"]
+
+
+def new_worker(ext, root, **kwargs):
+    options = {"limits": {"works": 1}, "default_limit": 1, "preempt": "pause", "poll": 0.02, "drain": True}
+    options.update(kwargs)
+    return ext.Worker(root, **options)
+
+
+def test_urgent_jobs_are_dispatched_first(ext):
+    jobs = [
+        {"id": "a", "priority": "normal", "seq": 1},
+        {"id": "b", "priority": "urgent", "seq": 3},
+        {"id": "c", "priority": "normal", "seq": 2},
+        {"id": "d", "priority": "urgent", "seq": 4},
+    ]
+    assert [j["id"] for j in sorted(jobs, key=ext.job_order)] == ["b", "d", "a", "c"]
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP/SIGCONT")
+def test_urgent_job_pauses_a_running_normal_job(cli, project, ext):
+    cli("init")
+    cli("exec", "--dept", "works", "--enqueue", "--", *SLEEP)
+    worker = new_worker(ext, project)
+    worker.dispatch()
+    (normal,) = worker.running.values()
+
+    cli("exec", "--dept", "works", "--enqueue", "--urgent", "--", *QUICK)
+    worker.dispatch()
+    assert normal.paused_at is not None
+    pending = {j["priority"]: j for j in ext.JobQueue(project).pending()}
+    assert pending["normal"]["status"] == "paused"
+    assert len(worker.running) == 2
+
+    assert worker.run() == 0
+    done = {j["priority"]: j for j in ext.JobQueue(project).finished()}
+    assert done["urgent"]["status"] == done["normal"]["status"] == "done"
+    execs = {r["data"]["priority"]: r["data"] for r in store_records(project) if r["type"] == "exec"}
+    assert execs["normal"]["paused_ms"] > 0
+    assert execs["urgent"]["exit_code"] == 0
+
+
+def test_worker_without_preemption_waits_for_a_slot(cli, project, ext):
+    cli("init")
+    cli("exec", "--dept", "works", "--enqueue", "--", *SLEEP)
+    worker = new_worker(ext, project, preempt="none")
+    worker.dispatch()
+    cli("exec", "--dept", "works", "--enqueue", "--urgent", "--", *QUICK)
+
+    waiting = worker.dispatch()
+    assert [j["priority"] for j in waiting] == ["urgent"]
+    assert worker.run() == 0
+    assert len(ext.JobQueue(project).finished()) == 2
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import pytest
+from conftest import exec_payload, note
+
+import mingctl
+
+
+def note_count(ext, root):
+    return ext.Metrics(root).refresh()["counters"]["events"].get("note", 0)
+
+
+def elsewhere(root, messages):
+    """Append as another process would: without this process's listeners folding them."""
+    store = mingctl.get_store(root)
+    listeners, store.listeners = store.listeners, []
+    try:
+        for message in messages:
+            note(root, message)
+        mingctl.flush_archives()
+    finally:
+        store.listeners = listeners
+
+
+def test_metrics_fold_exec_events_by_status(cli, project, ext, capsys):
+    cli("init")
+    mingctl.record_event(project, "exec", exec_payload(["make"]), case_id=None)
+    mingctl.record_event(project, "exec", exec_payload(["make"], exit_code=2), case_id=None)
+    cli("metrics")
+
+    assert "mingctl_exec_total{" in capsys.readouterr().out
+    assert ext.Metrics(project).refresh()["counters"]["exec"] == {"works\tevidence\tok": 1, "works\tevidence\tfailed": 1}
+    assert mingctl.metrics_text_path(project).exists()
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_compaction_keeps_totals_and_skips_nothing_appended_after_it(cli, project, ext, backend):
+    cli("init", "--backend", backend)
+    cli("metrics", "--json")
+    elsewhere(project, ["a", "b"])
+
+    mingctl.get_store(project).compact_events(cutoff="9999", budget_bytes=1 << 30, dry_run=False)
+    elsewhere(project, ["c", "d", "e"])
+
+    assert note_count(ext, project) == 5
+
+
+def test_migration_keeps_totals_and_skips_nothing_appended_after_it(cli, project, ext):
+    cli("init")
+    cli("metrics", "--json")
+    elsewhere(project, ["a", "b"])
+
+    cli("storage", "migrate", "--to", "sqlite")
+    elsewhere(project, ["c"])
+    assert note_count(ext, project) == 3
+
+    cli("storage", "migrate", "--to", "files")
+    elsewhere(project, ["d"])
+    assert note_count(ext, project) == 4
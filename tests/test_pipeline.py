@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import sys
+
+import pytest
+from conftest import store_records
+
+import mingctl
+
+PY = sys.executable
+
+
+@pytest.fixture
+def case(cli, project):
+    cli("init")
+    cli("case", "open", "--set-current", "pipeline case")
+    return mingctl.load_state(project)["current_case_id"]
+
+
+def add_step(cli, name, *command, needs=None, outputs=None):
+    argv = ["pipeline", "add", name, "--dept", "works", "--kind", "evidence"]
+    if needs:
+        argv += ["--needs", needs]
+    if outputs:
+        argv += ["--outputs", outputs]
+    return cli(*argv, "--", *command)
+
+
+def step_events(root):
+    return [r["data"] for r in store_records(root) if r["type"] == "exec" and "step" in r["data"]]
+
+
+def test_failed_step_skips_its_dependents(cli, project, case, capsys):
+    add_step(cli, "lint", PY, "-c", "raise SystemExit(3)")
+    add_step(cli, "test", PY, "-c", "pass", needs="lint")
+    add_step(cli, "docs", PY, "-c", "pass")
+
+    assert cli("pipeline", "run") == 1
+    out = capsys.readouterr().out
+    assert "[SKIP] test (needs lint)" in out
+    assert "[OK] docs" in out
+    assert {e["step"]: e["exit_code"] for e in step_events(project)} == {"lint": 3, "docs": 0}
+
+
+def test_step_with_present_outputs_is_cached_on_the_next_run(cli, project, case, capsys):
+    add_step(cli, "build", PY, "-c", "open('out.txt', 'w').write('x')", outputs="out.txt")
+    assert cli("pipeline", "run") == 0
+    assert "[OK] build" in capsys.readouterr().out
+
+    assert cli("pipeline", "run") == 0
+    assert "[CACHED] build" in capsys.readouterr().out
+    assert len(step_events(project)) == 1
+
+
+def test_step_that_cannot_start_is_recorded(cli, project, case, capsys):
+    add_step(cli, "ghost", "ming-no-such-binary-xyz")
+
+    assert cli("pipeline", "run") == 1
+    assert "[FAIL] ghost: Command not found" in capsys.readouterr().out
+    (event,) = step_events(project)
+    assert event["exit_code"] is None
+    assert "ming-no-such-binary-xyz" in event["error"]
+
+
+def test_each_run_writes_its_own_step_logs(cli, project, case):
+    add_step(cli, "say", PY, "-c", "print('hi')")
+    cli("pipeline", "run")
+    cli("pipeline", "run")
+
+    logs = sorted(mingctl.pipeline_logs_dir(project).glob(f"{case}.*.say.log"))
+    assert len(logs) == 2
+    assert all(p.read_text() == "hi\n" for p in logs)
+    assert len({e["pipeline"] for e in step_events(project)}) == 2
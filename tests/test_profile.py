@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import pstats
+
+import pytest
+from conftest import store_records
+
+import mingctl
+
+
+@pytest.fixture
+def out_dir(tmp_path, monkeypatch):
+    path = tmp_path / "profiles"
+    monkeypatch.setenv(mingctl.PROFILE_DIR_ENV, str(path))
+    return path
+
+
+def span_names(spans):
+    return {s["name"] for s in spans}
+
+
+def test_spans_are_a_shared_no_op_when_disabled(cli, capsys):
+    cli("init")
+    assert mingctl._PROFILER is None
+    assert mingctl.span("anything") is mingctl.span("else")
+    assert "[PROFILE]" not in capsys.readouterr().err
+
+
+def test_summary_line_goes_to_stderr(cli, capsys):
+    cli("init")
+    capsys.readouterr()
+    cli("--profile=summary", "case", "list")
+
+    (line,) = [l for l in capsys.readouterr().err.splitlines() if l.startswith("[PROFILE]")]
+    assert line.startswith("[PROFILE] case list ")
+    assert "| startup " in line and "| root " in line
+    assert mingctl._PROFILER is None
+
+
+def test_trace_mode_records_the_spans_in_the_archive(cli, project, monkeypatch):
+    cli("init")
+    monkeypatch.setenv(mingctl.PROFILE_ENV, "trace")
+    cli("case", "list")
+
+    (trace,) = [r["data"] for r in store_records(project) if r["type"] == "trace"]
+    assert trace["command"] == "case list"
+    assert trace["exit_code"] == 0
+    assert {"startup", "root"} <= span_names(trace["spans"])
+    assert trace["spans"][0]["name"] == "startup" and trace["spans"][0]["start_ms"] == 0
+
+
+def test_chrome_and_cprofile_modes_write_files(cli, out_dir, capsys):
+    cli("init")
+    cli("--profile=chrome,cprofile", "case", "list")
+
+    (chrome,) = out_dir.glob("*.trace.json")
+    events = json.loads(chrome.read_text(encoding="utf-8"))["traceEvents"]
+    assert events[0]["name"] == "case list"
+    assert {"startup", "root"} <= {e["name"] for e in events}
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+    (prof,) = out_dir.glob("*.prof")
+    assert pstats.Stats(str(prof)).total_calls > 0
+    assert capsys.readouterr().err.count("[PROFILE] wrote") == 2
+
+
+def test_all_enables_every_mode(capsys):
+    assert mingctl.parse_profile_modes("all") == set(mingctl.PROFILE_MODES)
+    assert mingctl.parse_profile_modes("1") == {"summary"}
+    assert mingctl.parse_profile_modes("off") == set()
+    assert mingctl.parse_profile_modes("trace,bogus") == {"trace"}
+    assert "Unknown profile mode: bogus" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "argv, profile, rest",
+    [
+        (["--profile", "trace", "init"], "trace", ["init"]),
+        (["--profile=trace", "init"], "trace", ["init"]),
+        (["--profile", "chrome,cprofile", "case", "list"], "chrome,cprofile", ["case", "list"]),
+        (["case", "list", "--profile", "all"], "all", ["case", "list"]),
+        (["--profile", "case", "list"], "summary", ["case", "list"]),
+        (["case", "list", "--profile"], "summary", ["case", "list"]),
+    ],
+)
+def test_profile_value_may_be_a_separate_token(argv, profile, rest):
+    assert mingctl.extract_global_flags(argv) == (None, False, profile, rest)
+
+
+def test_separate_profile_value_reaches_the_profiler(cli, project):
+    cli("init")
+    cli("--profile", "trace", "case", "list")
+    assert [r["data"]["command"] for r in store_records(project) if r["type"] == "trace"] == ["case list"]
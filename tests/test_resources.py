@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [("10:20", (10, 20)), (":20", (0, 20)), ("10:", (10, None)), (":", (0, None))],
+)
+def test_parse_byte_range(ext, raw, expected):
+    assert ext.parse_byte_range(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["10", "20:10", "-1:5", "a:b"])
+def test_parse_byte_range_rejects_bad_input(ext, raw):
+    with pytest.raises(SystemExit, match="Invalid --range"):
+        ext.parse_byte_range(raw)
+
+
+def test_bounded_read_never_splits_a_character(ext, tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_bytes("ab三省六部".encode("utf-8"))  # 2 ASCII bytes, then 3 bytes per character
+
+    text, end = ext.read_utf8_bounded(path, 0, 4)
+    assert (text, end) == ("ab", 2)
+    text, end = ext.read_utf8_bounded(path, 3, 6)  # starts inside 三
+    assert (text, end) == ("省", 8)
+    text, end = ext.read_utf8_bounded(path, end, 100)
+    assert (text, end) == ("六部", 14)
+
+
+def test_markdown_sections_nest_and_skip_fenced_code(ext, tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_text(
+        "# A\nintro\n## A.1\n```\n# not a heading\n```\n## A.2\ntext\n# B\nend\n",
+        encoding="utf-8",
+    )
+    data = path.read_bytes()
+
+    sections = {s["heading"]: s for s in ext.markdown_sections(path)}
+    assert list(sections) == ["A", "A.1", "A.2", "B"]
+    assert data[sections["A"]["start"] : sections["A"]["end"]].decode().endswith("text\n")
+    assert data[sections["A.1"]["start"] : sections["A.1"]["end"]].decode().startswith("## A.1\n```")
+    assert sections["A.2"]["end"] == sections["B"]["start"]
+    assert sections["B"]["end"] == len(data)
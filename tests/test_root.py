@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+
+import mingctl
+
+
+def test_walk_result_is_cached_per_cwd(project, monkeypatch):
+    nested = project / "src" / "pkg"
+    nested.mkdir(parents=True)
+    monkeypatch.chdir(nested)
+
+    root, info = mingctl.resolve_root(None)
+    assert (root, info["source"], info["marker"]) == (project, "walk", ".git")
+    root, info = mingctl.resolve_root(None)
+    assert (root, info["source"]) == (project, "cache")
+
+
+def test_a_hit_stats_the_marker_and_each_passed_directory_once(project, monkeypatch):
+    nested = project / "src" / "pkg"
+    nested.mkdir(parents=True)
+    monkeypatch.chdir(nested)
+    calls = []
+    real_stat = os.stat
+
+    def counting_stat(path, *args, **kwargs):
+        calls.append(str(path))
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", counting_stat)
+    mingctl.resolve_root(None)
+    walk_calls = len(calls)
+    del calls[:]
+
+    assert mingctl.resolve_root(None)[1]["source"] == "cache"
+    assert sorted(calls) == sorted([os.path.join(str(project), ".git"), str(nested), str(project / "src")])
+    assert len(calls) < walk_calls
+
+
+def test_marker_created_below_the_cached_root_invalidates_the_cache(project, monkeypatch):
+    nested = project / "src" / "pkg"
+    nested.mkdir(parents=True)
+    monkeypatch.chdir(nested)
+    mingctl.resolve_root(None)
+
+    (project / "src" / mingctl.STORE_DIRNAME).mkdir()
+    root, info = mingctl.resolve_root(None)
+    assert (root, info["source"]) == (project / "src", "walk")
+    assert info["cache_miss"] == f"directory changed since the walk: {project / 'src'}"
+
+    (nested / ".git").mkdir()
+    root, info = mingctl.resolve_root(None)
+    assert (root, info["source"]) == (nested, "walk")
+
+
+def test_replaced_root_is_a_cache_miss(project, tmp_path, monkeypatch):
+    sub = tmp_path / "other"
+    (sub / ".git").mkdir(parents=True)
+    monkeypatch.chdir(sub)
+    mingctl.resolve_root(None)
+
+    os.rename(str(sub), str(tmp_path / "moved"))
+    (sub / ".git").mkdir(parents=True)
+    monkeypatch.chdir(sub)
+    root, info = mingctl.resolve_root(None)
+    assert (root, info["source"]) == (sub.resolve(), "walk")
+    assert "dev/inode" in info["cache_miss"]
+
+
+def test_cache_can_be_disabled(project, monkeypatch):
+    monkeypatch.setenv(mingctl.ROOT_CACHE_DISABLE_ENV, "1")
+    mingctl.resolve_root(None)
+    assert mingctl.resolve_root(None)[1]["source"] == "walk"
+    assert not mingctl.root_cache_path().exists()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import pytest
+from conftest import exec_payload
+
+import mingctl
+
+
+def search(ext, root, text):
+    index = ext.SearchIndex(root)
+    index.refresh()
+    return index.query(text, limit=5)
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_compaction_removes_dropped_snippets_from_the_index(cli, project, ext, backend, capsys):
+    cli("init", "--backend", backend)
+    mingctl.record_event(project, "exec", exec_payload(["make"], output="KLMNOP987 failed"), case_id=None)
+    cli("search", "KLMNOP987")
+    assert "KLMNOP987" in capsys.readouterr().out
+    before = mingctl.get_store(project).generation()
+
+    stats = mingctl.get_store(project).compact_events(cutoff="9999", budget_bytes=1 << 30, dry_run=False)
+
+    assert stats["snippets_dropped"] == 1
+    assert mingctl.get_store(project).generation() != before
+    assert search(ext, project, "KLMNOP987") == []
+
+
+@pytest.mark.parametrize("backend", mingctl.STORE_BACKENDS)
+def test_query_catches_up_with_later_events(cli, project, ext, backend):
+    cli("init", "--backend", backend)
+    assert search(ext, project, "ZYXWV") == []
+    mingctl.record_event(project, "note", {"message": "ZYXWV first"}, case_id=None)
+    mingctl.close_archives()
+
+    assert [h["type"] for h in search(ext, project, "ZYXWV")] == ["note"]
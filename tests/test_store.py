@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+from conftest import store_records
+
+import mingctl
+
+
+def event_rows(root):
+    with sqlite3.connect(str(mingctl.sqlite_store_path(root))) as db:
+        return db.execute("SELECT count(*) FROM events").fetchone()[0]
+
+
+def test_backends_must_implement_the_whole_interface(project):
+    class Partial(mingctl.Store):
+        name = "partial"
+
+        def ensure(self) -> None:
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial(project)
+
+
+def test_sqlite_store_round_trips_state_and_cases(cli, project, ext):
+    cli("init", "--backend", "sqlite")
+    cli("case", "open", "--set-current", "repair login")
+    store = mingctl.get_store(project)
+    assert isinstance(store, ext.SqliteStore)
+
+    case_id = mingctl.load_state(project)["current_case_id"]
+    assert store.load_case(case_id)["title"] == "repair login"
+    assert case_id in mingctl.todo_path(project).read_text(encoding="utf-8")
+
+
+def test_sqlite_appends_follow_the_group_commit_policy(cli, project, monkeypatch):
+    cli("init", "--backend", "sqlite")
+    mingctl.close_archives()
+    monkeypatch.setenv(mingctl.ARCHIVE_BATCH_ENV, "3")
+    for i in range(2):
+        mingctl.record_event(project, "note", {"message": str(i)}, case_id=None)
+    assert event_rows(project) == 1  # only the init event
+
+    mingctl.record_event(project, "note", {"message": "2"}, case_id=None)
+    assert event_rows(project) == 4
+
+
+def test_migration_round_trip_keeps_cases_events_and_todo(cli, project, ext):
+    cli("init")
+    cli("case", "open", "--set-current", "first")
+    cli("record", "note", "hello")
+    case_id = mingctl.load_state(project)["current_case_id"]
+    events = [(r["type"], r["data"].get("message")) for r in store_records(project)]
+
+    cli("storage", "migrate", "--to", "sqlite")
+    assert isinstance(mingctl.get_store(project), ext.SqliteStore)
+    assert not mingctl.archive_path(project).exists()
+    assert case_id in mingctl.todo_path(project).read_text(encoding="utf-8")
+    migrated = [(r["type"], r["data"].get("message")) for r in store_records(project)]
+    assert migrated[: len(events)] == events
+
+    cli("storage", "migrate", "--to", "files")
+    assert isinstance(mingctl.get_store(project), mingctl.FileStore)
+    assert mingctl.load_case(project, case_id)["title"] == "first"
+    assert [(r["type"], r["data"].get("message")) for r in store_records(project)][: len(migrated)] == migrated
+    assert case_id in mingctl.todo_path(project).read_text(encoding="utf-8")